@@ -0,0 +1,192 @@
+import asyncio
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import model_format
+from pread_reader import get_default_pool, pread_exact, read_header
+
+# Asynchroniczny czytnik plików .model (z indeksem, metafirst, ZIP_STORED - jak
+# pread_reader.read_header) dla usług opartych o asyncio.
+# Wszystkie odczyty to os.pread wykonywane w ograniczonej puli wątków I/O
+# na deskryptorze z procesowej puli FdPool (pread_reader.py),
+# więc pętla zdarzeń nigdy nie jest blokowana, a jeden czytnik może być
+# współdzielony przez wiele zadań (brak wspólnego wskaźnika pozycji pliku).
+#
+# Przeciwciśnienie: liczba jednoczesnych zleceń I/O na pętlę jest ograniczona
+# semaforem (MAX_IN_FLIGHT), a iterator archiwum czyta kolejny fragment dopiero,
+# gdy konsument go pobierze (plus co najwyżej `readahead` fragmentów zapasu).
+# Anulowanie: przerwane zadanie zwalnia miejsce w semaforze od razu; trwający
+# już w wątku pojedynczy pread kończy się, a jego wynik jest odrzucany.
+# Deskryptor wraca do FdPool dopiero, gdy skończą się wszystkie odczyty w
+# wątkach (także readahead anulowanego iteratora) - close() w trakcie odczytu
+# odkłada zwolnienie, więc wątek nigdy nie czyta z oddanego (i potem
+# ponownie użytego) numeru deskryptora.
+
+IO_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+MAX_IN_FLIGHT = 256
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+_executor = None
+_executor_lock = threading.Lock()
+_limiters = weakref.WeakKeyDictionary()
+
+
+def get_io_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=IO_WORKERS, thread_name_prefix="model-io"
+            )
+        return _executor
+
+
+def _get_limiter(loop):
+    limiter = _limiters.get(loop)
+    if limiter is None:
+        limiter = asyncio.Semaphore(MAX_IN_FLIGHT)
+        _limiters[loop] = limiter
+    return limiter
+
+
+class AsyncModelReader:
+    def __init__(self, path, executor=None, pool=None):
+        self.path = path
+        self._executor = executor
+        self._pool = pool or get_default_pool()
+        self._pooled = None
+        # Wpis puli -> liczba odczytów w wątkach; wpis -> odłożone zwolnienia
+        self._users = {}
+        self._deferred = {}
+        self._users_lock = threading.Lock()
+        self._closed = False
+        self._index = None
+        self._index_lock = asyncio.Lock()
+        self._open_lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        async with _get_limiter(loop):
+            return await loop.run_in_executor(
+                self._executor or get_io_executor(), func, *args
+            )
+
+    async def open(self):
+        async with self._open_lock:
+            if self._closed:
+                raise ValueError(f"Czytnik '{self.path}' został zamknięty.")
+            if self._pooled is None:
+                pooled = await self._run(self._pool.acquire, self.path)
+                if self._closed:
+                    # close() w trakcie pobierania deskryptora - oddaj go od razu
+                    self._pool.release(pooled)
+                    raise ValueError(f"Czytnik '{self.path}' został zamknięty.")
+                self._pooled = pooled
+        return self
+
+    async def close(self):
+        # Zamknięty czytnik nie otwiera się ponownie - kolejne odczyty to ValueError
+        self._closed = True
+        with self._users_lock:
+            pooled, self._pooled = self._pooled, None
+            if pooled is None:
+                return
+            if self._users.get(pooled):
+                self._deferred[pooled] = self._deferred.get(pooled, 0) + 1
+                return
+        self._pool.release(pooled)
+
+    def _hold(self, pooled):
+        with self._users_lock:
+            self._users[pooled] = self._users.get(pooled, 0) + 1
+
+    def _unhold(self, pooled):
+        # Wywoływane z wątku I/O po zakończeniu (albo anulowaniu) zlecenia
+        with self._users_lock:
+            users = self._users[pooled] - 1
+            if users:
+                self._users[pooled] = users
+                return
+            del self._users[pooled]
+            releases = self._deferred.pop(pooled, 0)
+        for _ in range(releases):
+            self._pool.release(pooled)
+
+    async def _run_on_fd(self, func, *args):
+        # func(fd, *args) w puli wątków na deskryptorze trzymanym do końca wątku
+        await self.open()
+        pooled = self._pooled
+        if pooled is None:
+            raise ValueError(f"Czytnik '{self.path}' został zamknięty.")
+        self._hold(pooled)
+        submitted = False
+        try:
+            async with _get_limiter(asyncio.get_running_loop()):
+                future = (self._executor or get_io_executor()).submit(
+                    func, pooled.fd, *args
+                )
+                submitted = True
+                future.add_done_callback(lambda _: self._unhold(pooled))
+                return await asyncio.wrap_future(future)
+        finally:
+            if not submitted:
+                self._unhold(pooled)
+
+    async def pread(self, size, offset):
+        return await self._run_on_fd(pread_exact, size, offset)
+
+    async def index(self):
+        if self._index is not None:
+            return self._index
+        async with self._index_lock:
+            if self._index is None:
+                # Sygnatura, indeks i fstat jednym zleceniem w wątku I/O
+                self._index, _ = await self._run_on_fd(read_header, self.path)
+        return self._index
+
+    async def read_section(self, name, budget=None):
+        offset, size = model_format.section_bounds(await self.index(), name)
+        model_format.check_read_budget(size, f"Sekcja '{name}'", budget)
+        data = await self.pread(size, offset)
+        if len(data) != size:
+            raise model_format.ModelFormatError(
+                f"Błąd odczytu sekcji '{name}': oczekiwano {size}, odczytano {len(data)}."
+            )
+        return data
+
+    async def iter_section(self, name, chunk_size=STREAM_CHUNK_SIZE, readahead=1):
+        offset, size = model_format.section_bounds(await self.index(), name)
+        end = offset + size
+        pending = []
+        position = offset
+        try:
+            while position < end or pending:
+                while position < end and len(pending) <= readahead:
+                    length = min(chunk_size, end - position)
+                    pending.append(
+                        (length, asyncio.ensure_future(self.pread(length, position)))
+                    )
+                    position += length
+                length, task = pending.pop(0)
+                chunk = await task
+                if len(chunk) != length:
+                    raise model_format.ModelFormatError(
+                        f"Nieoczekiwany koniec sekcji '{name}'."
+                    )
+                yield chunk
+        finally:
+            for _, task in pending:
+                task.cancel()
+
+    async def iter_archive(self, chunk_size=STREAM_CHUNK_SIZE, readahead=1):
+        async for chunk in self.iter_section("archive", chunk_size, readahead):
+            yield chunk
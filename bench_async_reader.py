@@ -0,0 +1,107 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import model_format
+from async_model_reader import AsyncModelReader
+from bench_model_server import generate_corpus
+from model_stats import percentile
+
+# Benchmark AsyncModelReader: N (domyślnie 10 000) jednoczesnych odczytów
+# sekcji z korpusu .model w jednej pętli zdarzeń, w porównaniu z odczytem
+# synchronicznym (open/seek/read) wykonywanym sekwencyjnie.
+
+
+async def run_async(paths, reads, section, seed):
+    rng = random.Random(seed)
+    readers = {path: AsyncModelReader(path) for path in paths}
+    latencies = []
+
+    async def one_read(reader):
+        start = time.perf_counter()
+        data = await reader.read_section(section)
+        latencies.append(time.perf_counter() - start)
+        return len(data)
+
+    started = time.perf_counter()
+    sizes = await asyncio.gather(
+        *(one_read(readers[rng.choice(paths)]) for _ in range(reads))
+    )
+    elapsed = time.perf_counter() - started
+    for reader in readers.values():
+        await reader.close()
+    latencies.sort()
+    return {
+        "reads": reads,
+        "elapsed_s": round(elapsed, 3),
+        "reads_per_s": round(reads / elapsed, 1),
+        "mb_per_s": round(sum(sizes) / elapsed / 1e6, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def run_sync(paths, reads, section, seed):
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    total = 0
+    for _ in range(reads):
+        with open(rng.choice(paths), "rb") as f:
+            index_data, _ = model_format.read_index(f)
+            offset, size = model_format.section_bounds(index_data, section)
+            f.seek(offset)
+            total += len(f.read(size))
+    elapsed = time.perf_counter() - started
+    return {
+        "reads": reads,
+        "elapsed_s": round(elapsed, 3),
+        "reads_per_s": round(reads / elapsed, 1),
+        "mb_per_s": round(total / elapsed / 1e6, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark AsyncModelReader")
+    parser.add_argument("--corpus", help="Katalog z plikami .model (domyślnie syntetyczny)")
+    parser.add_argument("--models", type=int, default=200)
+    parser.add_argument("--archive-size", type=int, default=256 * 1024)
+    parser.add_argument("--reads", type=int, default=10_000)
+    parser.add_argument("--section", default="info")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    tmp_dir = None
+    corpus = args.corpus
+    if corpus is None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        corpus = tmp_dir.name
+        generate_corpus(corpus, args.models, args.archive_size)
+    try:
+        paths = sorted(
+            os.path.join(corpus, name)
+            for name in os.listdir(corpus)
+            if name.endswith(".model")
+        )
+        if not paths:
+            print("Brak plików .model w korpusie.", file=sys.stderr)
+            return 1
+        result = {
+            "models": len(paths),
+            "section": args.section,
+            "async": asyncio.run(run_async(paths, args.reads, args.section, args.seed)),
+            "sync_sequential": run_sync(paths, args.reads, args.section, args.seed),
+        }
+    finally:
+        if tmp_dir is not None:
+            tmp_dir.cleanup()
+    print(json.dumps(result, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,509 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import re
+import resource
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+import zlib
+
+import model_backends
+import model_verify
+from model_stats import percentile
+
+# Benchmark wariantów .model (indeksowany, ZIP, HDF5) przez wspólny interfejs
+# model_backends. Dla każdego rozmiaru korpusu, rodzaju archiwum i backendu mierzy:
+#   create    - zapis pliku przez writer backendu,
+#   verify    - pełna weryfikacja model_verify.verify_model,
+#   load_info - open_model() + odczyt info.json,
+# podając opóźnienia p50/p99, przepustowość i szczytowe RSS operacji.
+# Korpus syntetyczny, powtarzalny dla danego --seed: small/medium/large
+# (large ma kilka GB - tylko na życzenie) z archiwum ZIP (stored/deflated) lub RAR.
+# Wyniki zapisuje --save; --baseline porównuje bieżący przebieg z zapisanym
+# i kończy się kodem 1, gdy któraś metryka pogorszyła się ponad --threshold.
+# Same pliki też można porównać: --baseline A.json --current B.json
+# --startup dodaje czas startu komend model_cli.py (info/verify/pack) w osobnych
+# procesach z -X importtime: opóźnienie, łączny czas importów i najdroższe moduły.
+
+CORPUS_PROFILES = {
+    "small": {"archive_size": 1024 * 1024, "repeats": 20},
+    "medium": {"archive_size": 64 * 1024 * 1024, "repeats": 5},
+    "large": {"archive_size": 3 * 1024 * 1024 * 1024, "repeats": 1},
+}
+DEFAULT_PROFILES = ("small", "medium")
+PAYLOADS = ("zip-stored", "zip-deflated", "rar")
+OPERATIONS = ("create", "verify", "load_info")
+STARTUP_COMMANDS = ("info", "verify", "pack")
+STARTUP_REPEATS = 10
+TOP_IMPORTS = 10
+MODEL_CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_cli.py")
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s*\|\s*(\d+)\s*\|( *)(\S+)")
+PAYLOAD_BLOCK_SIZE = 4 * 1024 * 1024
+PREVIEW_SIZE = 256 * 1024
+DEFAULT_THRESHOLD = 0.10
+# Przyrost RSS poniżej tej wartości to szum alokatora, nie regresja
+RSS_NOISE_BYTES = 4 * 1024 * 1024
+
+RAR_MARKER = b"Rar!\x1a\x07\x00"
+RAR_BLOCK_HEADER = struct.Struct("<HBHH")  # HEAD_CRC, HEAD_TYPE, HEAD_FLAGS, HEAD_SIZE
+RAR_FILE_FIELDS = struct.Struct("<IIBIIBBHI")
+RAR_MAIN_HEAD, RAR_FILE_HEAD, RAR_END_HEAD = 0x73, 0x74, 0x7B
+RAR_LONG_BLOCK, RAR_LARGE_FILE, RAR_SKIP_IF_UNKNOWN = 0x8000, 0x0100, 0x4000
+RAR_METHOD_STORE = 0x30
+
+
+def payload_block(seed):
+    # Blok o kompresowalności ok. 50%: połowa losowa, połowa powtarzalny tekst
+    rng = random.Random(seed)
+    half = PAYLOAD_BLOCK_SIZE // 2
+    words = [
+        bytes(rng.choices(b"abcdefghijklmnopqrstuvwxyz", k=rng.randint(3, 9)))
+        for _ in range(64)
+    ]
+    text = bytearray()
+    while len(text) < half:
+        text += rng.choice(words) + b" "
+    return rng.randbytes(half) + bytes(text[:half])
+
+
+def iter_payload(size, seed):
+    # Dane archiwum generowane kawałkami - multi-GB korpus nie podbija RSS
+    block = payload_block(seed)
+    position = 0
+    while position < size:
+        chunk = block[: min(len(block), size - position)]
+        # Numer bloku na początku, żeby kolejne bloki nie były identyczne
+        yield struct.pack("<Q", position) + chunk[8:] if len(chunk) > 8 else chunk
+        position += len(chunk)
+
+
+def rar_block(head_type, flags, body):
+    header_size = RAR_BLOCK_HEADER.size + len(body)
+    head = struct.pack("<BHH", head_type, flags, header_size) + body
+    return struct.pack("<H", zlib.crc32(head) & 0xFFFF) + head
+
+
+def rar_file_header(name, size, crc):
+    flags = RAR_LONG_BLOCK
+    low, high = size & 0xFFFFFFFF, size >> 32
+    # PACK_SIZE, UNP_SIZE, HOST_OS (Unix), FILE_CRC, FTIME, UNP_VER, METHOD, NAME_SIZE, ATTR
+    body = RAR_FILE_FIELDS.pack(
+        low, low, 3, crc, 0x21, 29, RAR_METHOD_STORE, len(name), 0o100644
+    )
+    if high:
+        flags |= RAR_LARGE_FILE
+        body += struct.pack("<II", high, high)
+    return rar_block(RAR_FILE_HEAD, flags, body + name)
+
+
+def write_rar_payload(path, member_name, size, seed):
+    # Archiwum RAR 4.x z jednym członkiem zapisanym metodą "store" - wystarcza
+    # rarfile do odczytu listy członków i sum CRC
+    name = member_name.encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(RAR_MARKER)
+        f.write(rar_block(RAR_MAIN_HEAD, 0, bytes(6)))
+        header_pos = f.tell()
+        f.write(rar_file_header(name, size, 0))
+        crc = 0
+        for chunk in iter_payload(size, seed):
+            f.write(chunk)
+            crc = zlib.crc32(chunk, crc)
+        f.write(rar_block(RAR_END_HEAD, RAR_SKIP_IF_UNKNOWN, b""))
+        f.seek(header_pos)
+        f.write(rar_file_header(name, size, crc))
+
+
+def write_zip_payload(path, member_name, size, seed, compression):
+    with zipfile.ZipFile(path, "w", compression) as zf:
+        zinfo = zipfile.ZipInfo(member_name)
+        zinfo.compress_type = compression
+        zinfo.file_size = size
+        with zf.open(zinfo, "w", force_zip64=size >= zipfile.ZIP64_LIMIT) as member:
+            for chunk in iter_payload(size, seed):
+                member.write(chunk)
+
+
+def make_corpus(directory, profile, payload, archive_size, seed=0):
+    # Wejścia dla writerów; gotowy korpus w katalogu jest używany ponownie
+    corpus_dir = os.path.join(directory, f"{profile}_{payload}_{archive_size}_{seed}")
+    os.makedirs(corpus_dir, exist_ok=True)
+    preview_path = os.path.join(corpus_dir, "preview.jpg")
+    info_path = os.path.join(corpus_dir, "info.json")
+    extension = "rar" if payload == "rar" else "zip"
+    archive_path = os.path.join(corpus_dir, f"archive.{extension}")
+    done_marker = os.path.join(corpus_dir, ".complete")
+    if not os.path.exists(done_marker):
+        rng = random.Random(seed)
+        with open(preview_path, "wb") as f:
+            f.write(b"\xff\xd8\xff\xe0" + rng.randbytes(PREVIEW_SIZE) + b"\xff\xd9")
+        with open(info_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "nazwa_modelu": f"bench_{profile}",
+                    "wersja": "1.0",
+                    "opis": "Syntetyczny model do benchmarku",
+                    "rozmiar_archiwum": archive_size,
+                },
+                f,
+                ensure_ascii=False,
+            )
+        if payload == "rar":
+            write_rar_payload(archive_path, "payload.bin", archive_size, seed)
+        else:
+            compression = (
+                zipfile.ZIP_DEFLATED if payload == "zip-deflated" else zipfile.ZIP_STORED
+            )
+            write_zip_payload(archive_path, "payload.bin", archive_size, seed, compression)
+        open(done_marker, "w").close()
+    return model_backends.FileSetSource(preview_path, info_path, archive_path)
+
+
+def current_rss_bytes():
+    with open("/proc/self/status", "r") as f:
+        return int(re.search(r"VmRSS:\s+(\d+)", f.read()).group(1)) * 1024
+
+
+def reset_peak_rss():
+    # Linux: zapis "5" do clear_refs zeruje VmHWM, więc szczyt mierzymy per operację.
+    # Gdzie indziej zostaje ru_maxrss całego procesu (zwraca False).
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_bytes():
+    try:
+        with open("/proc/self/status", "r") as f:
+            return int(re.search(r"VmHWM:\s+(\d+)", f.read()).group(1)) * 1024
+    except (OSError, AttributeError):
+        # ru_maxrss: KiB na Linuksie, bajty na macOS
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == "darwin" else rss * 1024
+
+
+def measure(func):
+    # Zwraca (wynik, czas w s, przyrost szczytowego RSS ponad stan sprzed operacji)
+    reset_peak_rss()
+    try:
+        baseline = current_rss_bytes()
+    except OSError:
+        baseline = peak_rss_bytes()
+    start = time.perf_counter()
+    value = func()
+    elapsed = time.perf_counter() - start
+    return value, elapsed, max(0, peak_rss_bytes() - baseline)
+
+
+def summarize(latencies, total_bytes, peak_rss=0):
+    latencies = sorted(latencies)
+    elapsed = sum(latencies)
+    return {
+        "ops": len(latencies),
+        "ops_per_s": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "mb_per_s": round(total_bytes / elapsed / 1e6, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "peak_rss_bytes": peak_rss,
+    }
+
+
+def bench_backend(name, source, directory, repeats):
+    writer = model_backends.WRITERS[name]
+    path = os.path.join(directory, f"bench_{name}.model")
+    samples = {op: ([], 0, 0) for op in OPERATIONS}
+    failures = []
+
+    def add(op, elapsed, size, rss):
+        latencies, total, peak = samples[op]
+        latencies.append(elapsed)
+        samples[op] = (latencies, total + size, max(peak, rss))
+
+    def load_info():
+        with model_backends.open_model(path) as model:
+            return len(model.read_section("info"))
+
+    try:
+        for _ in range(repeats):
+            written, elapsed, rss = measure(lambda: writer(path, source))
+            add("create", elapsed, written, rss)
+            report, elapsed, rss = measure(lambda: model_verify.verify_model(path))
+            add("verify", elapsed, report["bytes_read"], rss)
+            if not report["ok"] and report["errors"] not in failures:
+                failures.append(report["errors"])
+            size, elapsed, rss = measure(load_info)
+            add("load_info", elapsed, size, rss)
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+    result = {op: summarize(*samples[op]) for op in OPERATIONS}
+    if failures:
+        result["verify_errors"] = failures[0]
+    return result
+
+
+def run(profiles, payloads, backends, corpus_dir, seed, repeats=None, archive_size=None):
+    results = {}
+    for profile in profiles:
+        settings = dict(CORPUS_PROFILES[profile])
+        if archive_size is not None:
+            settings["archive_size"] = archive_size
+        for payload in payloads:
+            source = make_corpus(corpus_dir, profile, payload, settings["archive_size"], seed)
+            for name in backends:
+                key = f"{profile}/{payload}/{name}"
+                try:
+                    results[key] = bench_backend(
+                        name, source, corpus_dir, repeats or settings["repeats"]
+                    )
+                except ImportError as e:
+                    results[key] = {"skipped": f"brak zależności: {e}"}
+                print(f"{key}: gotowe", file=sys.stderr)
+    return results
+
+
+def parse_importtime(stderr_text):
+    # Zwraca (suma czasów własnych importów w ms, moduły najwyższego poziomu
+    # posortowane po czasie łącznym)
+    total_us = 0
+    top_level = []
+    for line in stderr_text.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        total_us += int(self_us)
+        if len(indent) == 1:
+            top_level.append((int(cumulative_us), module))
+    top_level.sort(reverse=True)
+    return total_us / 1000, [
+        {"module": module, "cumulative_ms": round(us / 1000, 3)}
+        for us, module in top_level[:TOP_IMPORTS]
+    ]
+
+
+def run_startup(command_args, repeats):
+    latencies, import_ms, peak_rss, top_imports = [], [], 0, []
+    for _ in range(repeats):
+        with tempfile.TemporaryFile() as stderr_file:
+            start = time.perf_counter()
+            process = subprocess.Popen(
+                [sys.executable, "-X", "importtime", MODEL_CLI] + command_args,
+                stdout=subprocess.DEVNULL,
+                stderr=stderr_file,
+            )
+            # wait4 zwraca zużycie zasobów właśnie tego procesu (ru_maxrss)
+            _, status, usage = os.wait4(process.pid, 0)
+            latencies.append(time.perf_counter() - start)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            if process.returncode != 0:
+                raise RuntimeError(
+                    f"model_cli.py {command_args[0]} zakończone kodem {process.returncode}"
+                )
+            stderr_file.seek(0)
+            total, top_imports = parse_importtime(
+                stderr_file.read().decode("utf-8", "replace")
+            )
+        import_ms.append(total)
+        rss = usage.ru_maxrss
+        peak_rss = max(peak_rss, rss if sys.platform == "darwin" else rss * 1024)
+    result = summarize(latencies, 0, peak_rss)
+    import_ms.sort()
+    result["import_ms"] = round(percentile(import_ms, 50), 3)
+    result["top_imports"] = top_imports
+    return result
+
+
+def bench_startup(corpus_dir, seed, repeats=None):
+    # Czas startu krótkotrwałych wywołań model_cli.py na małym modelu
+    source = make_corpus(
+        corpus_dir, "small", "zip-stored", CORPUS_PROFILES["small"]["archive_size"], seed
+    )
+    model_path = os.path.join(corpus_dir, "startup.model")
+    packed_path = os.path.join(corpus_dir, "startup_pack.model")
+    model_backends.write_indexed(model_path, source)
+    commands = {
+        "info": ["info", model_path],
+        "verify": ["verify", model_path],
+        "pack": [
+            "pack",
+            source.paths["preview"],
+            source.paths["info"],
+            source.paths["archive"],
+            "-o",
+            packed_path,
+        ],
+    }
+    results = {}
+    try:
+        for command in STARTUP_COMMANDS:
+            key = f"startup/{command}"
+            results[key] = {
+                "startup": run_startup(commands[command], repeats or STARTUP_REPEATS)
+            }
+            print(f"{key}: gotowe", file=sys.stderr)
+    finally:
+        for path in (model_path, packed_path):
+            if os.path.exists(path):
+                os.remove(path)
+    return results
+
+
+def environment_info():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    # Regresja: wolniejsze p50, mniejsza przepustowość albo wyższy szczyt RSS
+    # o więcej niż threshold (ułamek) względem zapisanej linii bazowej
+    regressions = []
+    compared = 0
+    for key, before_ops in baseline["results"].items():
+        after_ops = current["results"].get(key)
+        if after_ops is None or "skipped" in before_ops or "skipped" in after_ops:
+            continue
+        for op in OPERATIONS + ("startup",):
+            before, after = before_ops.get(op), after_ops.get(op)
+            if not before or not after:
+                continue
+            compared += 1
+            checks = (
+                ("p50_ms", after["p50_ms"] > before["p50_ms"] * (1 + threshold)),
+                ("mb_per_s", after["mb_per_s"] < before["mb_per_s"] * (1 - threshold)),
+                (
+                    "peak_rss_bytes",
+                    after["peak_rss_bytes"] - before["peak_rss_bytes"] > RSS_NOISE_BYTES
+                    and after["peak_rss_bytes"] > before["peak_rss_bytes"] * (1 + threshold),
+                ),
+            )
+            if "import_ms" in before and "import_ms" in after:
+                checks += (
+                    ("import_ms", after["import_ms"] > before["import_ms"] * (1 + threshold)),
+                )
+            for metric, regressed in checks:
+                if regressed:
+                    regressions.append(
+                        {
+                            "case": f"{key}/{op}",
+                            "metric": metric,
+                            "baseline": before[metric],
+                            "current": after[metric],
+                        }
+                    )
+    return {"threshold": threshold, "compared": compared, "regressions": regressions}
+
+
+def load_results(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def split_list(value):
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark backendów .model")
+    parser.add_argument(
+        "--profiles",
+        default=",".join(DEFAULT_PROFILES),
+        help=f"Rozmiary korpusu: {', '.join(CORPUS_PROFILES)}",
+    )
+    parser.add_argument("--payloads", default=",".join(PAYLOADS))
+    parser.add_argument(
+        "--backends", default=",".join(sorted(model_backends.WRITERS))
+    )
+    parser.add_argument("--archive-size", type=int, help="Nadpisuje rozmiar archiwum profili")
+    parser.add_argument("--repeats", type=int, help="Nadpisuje liczbę powtórzeń profili")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--corpus-dir", help="Katalog korpusu (zachowywany między przebiegami; domyślnie tymczasowy)"
+    )
+    parser.add_argument("--save", help="Zapisz wyniki jako linię bazową JSON")
+    parser.add_argument("--baseline", help="Porównaj z zapisaną linią bazową")
+    parser.add_argument(
+        "--current", help="Zamiast uruchamiać benchmark, porównaj ten plik z --baseline"
+    )
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument(
+        "--startup", action="store_true", help="Zmierz też czas startu komend model_cli.py"
+    )
+    args = parser.parse_args(argv)
+
+    if args.current:
+        if not args.baseline:
+            parser.error("--current wymaga --baseline")
+        current = load_results(args.current)
+    else:
+        profiles = split_list(args.profiles)
+        unknown = [p for p in profiles if p not in CORPUS_PROFILES]
+        if unknown:
+            parser.error(f"Nieznane profile: {', '.join(unknown)}")
+        payloads = split_list(args.payloads)
+        unknown = [p for p in payloads if p not in PAYLOADS]
+        if unknown:
+            parser.error(f"Nieznane archiwa: {', '.join(unknown)}")
+        backends = split_list(args.backends)
+
+        def bench_all(corpus_dir):
+            results = run(
+                profiles,
+                payloads,
+                backends,
+                corpus_dir,
+                args.seed,
+                args.repeats,
+                args.archive_size,
+            )
+            if args.startup:
+                results.update(bench_startup(corpus_dir, args.seed, args.repeats))
+            return results
+
+        if args.corpus_dir:
+            os.makedirs(args.corpus_dir, exist_ok=True)
+            results = bench_all(args.corpus_dir)
+        else:
+            with tempfile.TemporaryDirectory() as tmp:
+                results = bench_all(tmp)
+        current = {
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "environment": environment_info(),
+            "config": {
+                "profiles": profiles,
+                "payloads": payloads,
+                "seed": args.seed,
+                "repeats": args.repeats,
+                "archive_size": args.archive_size,
+                "startup": args.startup,
+            },
+            "results": results,
+        }
+        if args.save:
+            with open(args.save, "w", encoding="utf-8") as f:
+                json.dump(current, f, indent=4, ensure_ascii=False)
+
+    if not args.baseline:
+        print(json.dumps(current["results"], indent=4, ensure_ascii=False))
+        return 0
+    report = compare(load_results(args.baseline), current, args.threshold)
+    print(json.dumps(report, indent=4, ensure_ascii=False))
+    return 1 if report["regressions"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
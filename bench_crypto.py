@@ -0,0 +1,196 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import model_backends
+import model_crypto
+import model_keys
+
+# Przepustowość odczytu szyfrowanego wariantu ZIP (model_crypto) względem
+# zwykłego ZIP_STORED (model_backends.ZipModel), na tym samym korpusie:
+#   plain        - ZipModel.iter_section("archive")
+#   aead-1       - odszyfrowanie fragment po fragmencie w jednym wątku
+#   aead-N       - odszyfrowanie równoległe w puli wątków (N = --workers)
+#   metadata     - preview + info.json (bez dotykania archiwum)
+#   random-range - losowe zakresy archiwum przez read_range
+#   batch        - otwarcie + info.json dla --batch-files małych plików z jednej
+#                  grupy soli: scrypt przy każdym pliku vs model_keys.KeyRing
+# Klucz jest wyprowadzany raz (scrypt) i nie wchodzi do pomiaru odczytu.
+
+
+def make_inputs(directory, archive_size, preview_size, seed):
+    rng = random.Random(seed)
+    paths = {
+        "preview": os.path.join(directory, "preview.jpg"),
+        "info": os.path.join(directory, "info.json"),
+        "archive": os.path.join(directory, "archive.zip"),
+    }
+    with open(paths["preview"], "wb") as f:
+        f.write(b"\xff\xd8\xff\xe0" + rng.randbytes(preview_size) + b"\xff\xd9")
+    with open(paths["info"], "w", encoding="utf-8") as f:
+        json.dump({"nazwa_modelu": "bench", "wersja": "1.0"}, f)
+    with open(paths["archive"], "wb") as f:
+        remaining = archive_size
+        while remaining:
+            block = rng.randbytes(min(remaining, 4 * 1024 * 1024))
+            f.write(block)
+            remaining -= len(block)
+    return model_backends.FileSetSource(paths["preview"], paths["info"], paths["archive"])
+
+
+def timed(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        size = fn()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return size, samples[len(samples) // 2]
+
+
+def result(size, seconds):
+    return {
+        "bytes": size,
+        "ms": round(seconds * 1000, 3),
+        "mb_per_s": round(size / seconds / 1e6, 1) if seconds else None,
+    }
+
+
+def drain(chunks):
+    return sum(len(chunk) for chunk in chunks)
+
+
+def bench_batch(directory, source, count):
+    kdf = model_crypto.new_kdf_params()
+    master_key = model_crypto.derive_master_key("bench", kdf)
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"batch_{i:05d}.model")
+        model_crypto.write_encrypted_zip(path, source, master_key=master_key, kdf=kdf)
+        paths.append(path)
+
+    def open_all(open_model):
+        start = time.perf_counter()
+        for path in paths:
+            with open_model(path) as model:
+                model.read_section("info")
+        return round((time.perf_counter() - start) / count * 1000, 3)
+
+    keyring = model_keys.KeyRing(model_keys.KeyCache(None), password="bench")
+    report = {
+        "files": count,
+        "per_file_kdf_ms": open_all(
+            lambda path: model_crypto.EncryptedZipModel(path, password="bench")
+        ),
+        "keyring_ms": open_all(keyring.open),
+    }
+    report["kdf_runs"] = keyring.kdf_runs
+    keyring.wipe()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Odczyt szyfrowanych (AEAD) i zwykłych plików .model ZIP."
+    )
+    parser.add_argument("--archive-size", type=int, default=256 * 1024 * 1024)
+    parser.add_argument("--preview-size", type=int, default=512 * 1024)
+    parser.add_argument("--chunk-size", type=int, default=model_crypto.CHUNK_SIZE)
+    parser.add_argument("--cipher", default=model_crypto.DEFAULT_CIPHER)
+    parser.add_argument("--workers", type=int, default=model_crypto.DEFAULT_WORKERS)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--ranges", type=int, default=200, help="Liczba losowych zakresów")
+    parser.add_argument("--range-size", type=int, default=64 * 1024)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-files", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    try:
+        model_crypto.require_crypto()
+    except model_crypto.ModelCryptoError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    report = {"cipher": args.cipher, "chunk_size": args.chunk_size, "workers": args.workers}
+    with tempfile.TemporaryDirectory() as tmp:
+        source = make_inputs(tmp, args.archive_size, args.preview_size, args.seed)
+        plain_path = os.path.join(tmp, "plain.model")
+        encrypted_path = os.path.join(tmp, "encrypted.model")
+        model_backends.write_zip(plain_path, source)
+
+        kdf = model_crypto.new_kdf_params()
+        start = time.perf_counter()
+        master_key = model_crypto.derive_master_key("bench", kdf)
+        report["kdf_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        start = time.perf_counter()
+        model_crypto.write_encrypted_zip(
+            encrypted_path,
+            source,
+            master_key=master_key,
+            kdf=kdf,
+            cipher=args.cipher,
+            chunk_size=args.chunk_size,
+            workers=args.workers,
+        )
+        report["encrypt"] = result(args.archive_size, time.perf_counter() - start)
+
+        with model_backends.ZipModel(plain_path) as plain, model_crypto.EncryptedZipModel(
+            encrypted_path, master_key=master_key
+        ) as encrypted:
+            report["plain"] = result(
+                *timed(lambda: drain(plain.iter_section("archive")), args.repeats)
+            )
+            report["aead-1"] = result(
+                *timed(
+                    lambda: drain(encrypted.iter_chunks("archive", workers=1)),
+                    args.repeats,
+                )
+            )
+            if args.workers > 1:
+                report[f"aead-{args.workers}"] = result(
+                    *timed(
+                        lambda: drain(
+                            encrypted.iter_chunks("archive", workers=args.workers)
+                        ),
+                        args.repeats,
+                    )
+                )
+            report["metadata"] = result(
+                *timed(
+                    lambda: len(encrypted.read_section("preview"))
+                    + len(encrypted.read_section("info")),
+                    args.repeats,
+                )
+            )
+
+            rng = random.Random(args.seed)
+            limit = max(1, args.archive_size - args.range_size)
+            offsets = [rng.randrange(limit) for _ in range(args.ranges)]
+            report["random-range"] = result(
+                *timed(
+                    lambda: sum(
+                        len(encrypted.read_range("archive", offset, args.range_size))
+                        for offset in offsets
+                    ),
+                    args.repeats,
+                )
+            )
+
+        if args.batch_files > 0:
+            small = make_inputs(tmp, 64 * 1024, 16 * 1024, args.seed)
+            report["batch"] = bench_batch(tmp, small, args.batch_files)
+
+    plain_ms = report["plain"]["ms"]
+    for key in ("aead-1", f"aead-{args.workers}"):
+        if plain_ms and key in report:
+            report[key]["slowdown"] = round(report[key]["ms"] / plain_ms, 2)
+    print(json.dumps(report, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
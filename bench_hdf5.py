@@ -0,0 +1,120 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import model_backends
+import model_hdf5
+from model_stats import percentile
+
+# Rozmiar fragmentu i filtr datasetów HDF5 (model_hdf5) a odczyt sekcji
+# archiwum: dla każdej kombinacji zapis pliku, potem
+#   sequential - cała sekcja przez DatasetReader blokami --read-size
+#   random     - --random-reads odczytów --random-size z losowych pozycji
+#                (opóźnienie p50/p99 na odczyt)
+# Plik jest otwierany na nowo przed każdym pomiarem, więc pamięć podręczna
+# fragmentów (rdcc) nie przenosi się między pomiarami; pamięć podręczna
+# systemu plików - tak (pomiar dotyczy kosztu HDF5/filtrów, nie dysku).
+
+
+def make_inputs(directory, archive_size, seed):
+    # Dane w połowie kompresowalne, żeby filtry miały co robić
+    rng = random.Random(seed)
+    paths = {
+        "preview": os.path.join(directory, "preview.jpg"),
+        "info": os.path.join(directory, "info.json"),
+        "archive": os.path.join(directory, "archive.zip"),
+    }
+    with open(paths["preview"], "wb") as f:
+        f.write(b"\xff\xd8\xff\xe0" + rng.randbytes(64 * 1024) + b"\xff\xd9")
+    with open(paths["info"], "w", encoding="utf-8") as f:
+        json.dump({"nazwa_modelu": "bench", "wersja": "1.0"}, f)
+    with open(paths["archive"], "wb") as f:
+        remaining = archive_size
+        while remaining:
+            block = min(remaining, 1024 * 1024)
+            f.write(rng.randbytes(block // 2) + bytes(block - block // 2))
+            remaining -= block
+    return model_backends.FileSetSource(paths["preview"], paths["info"], paths["archive"])
+
+
+def bench_combination(path, source, chunk_size, compression, args):
+    start = time.perf_counter()
+    model_backends.write_hdf5(path, source, chunk_size, compression)
+    write_s = time.perf_counter() - start
+    archive_size = source.section_size("archive")
+
+    with model_backends.Hdf5Model(path) as model:
+        with model.open_section("archive") as reader:
+            start = time.perf_counter()
+            while reader.read(args.read_size):
+                pass
+            sequential_s = time.perf_counter() - start
+
+    rng = random.Random(args.seed)
+    limit = max(1, archive_size - args.random_size)
+    offsets = [rng.randrange(limit) for _ in range(args.random_reads)]
+    latencies = []
+    with model_backends.Hdf5Model(path) as model:
+        with model.open_section("archive") as reader:
+            for offset in offsets:
+                start = time.perf_counter()
+                reader.seek(offset)
+                reader.read(args.random_size)
+                latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        "file_bytes": os.path.getsize(path),
+        "write_mb_per_s": round(archive_size / write_s / 1e6, 1),
+        "sequential_mb_per_s": round(archive_size / sequential_s / 1e6, 1),
+        "random_p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "random_p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Rozmiar fragmentu i filtr HDF5 a odczyt sekwencyjny i losowy."
+    )
+    parser.add_argument("--archive-size", type=int, default=64 * 1024 * 1024)
+    parser.add_argument(
+        "--chunk-sizes",
+        default="65536,262144,1048576,4194304",
+        help="Rozmiary fragmentów w bajtach, po przecinku",
+    )
+    parser.add_argument(
+        "--compressions",
+        default="none,gzip,lzf,zstd",
+        help="Filtry po przecinku (zstd pomijany bez hdf5plugin)",
+    )
+    parser.add_argument("--read-size", type=int, default=1024 * 1024)
+    parser.add_argument("--random-reads", type=int, default=500)
+    parser.add_argument("--random-size", type=int, default=4096)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    compressions = [c.strip() for c in args.compressions.split(",") if c.strip()]
+    if "zstd" in compressions and not model_hdf5.load_plugins():
+        print("Brak hdf5plugin - pomijam zstd.", file=sys.stderr)
+        compressions.remove("zstd")
+    chunk_sizes = [int(v) for v in args.chunk_sizes.split(",") if v.strip()]
+
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        source = make_inputs(tmp, args.archive_size, args.seed)
+        for compression in compressions:
+            for chunk_size in chunk_sizes:
+                path = os.path.join(tmp, f"{compression}_{chunk_size}.model")
+                report[f"{compression}/{chunk_size // 1024}KiB"] = bench_combination(
+                    path, source, chunk_size, compression, args
+                )
+                os.remove(path)
+    print(json.dumps(report, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
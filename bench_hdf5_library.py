@@ -0,0 +1,213 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+import model_backends
+import model_hdf5
+from model_stats import percentile
+
+# Biblioteka modeli HDF5 (model_hdf5.ModelLibrary) pod współbieżnym dostępem:
+# jeden proces pisarza dopisuje --models modeli w trybie SWMR, --readers
+# procesów czytelników otwiera bibliotekę raz i w pętli robi refresh(),
+# a każdy nowy model czyta w całości i porównuje skróty sekcji z oczekiwanymi
+# (treść modelu i jest deterministyczna: random.Random(seed + i)).
+# Kod wyjścia 1 przy jakiejkolwiek niezgodności albo brakującym modelu -
+# skrypt służy też jako lokalny test współbieżności.
+# Na koniec porównanie: otwarcie + info.json z osobnych plików .model HDF5
+# vs z jednej otwartej biblioteki.
+
+
+def model_payload(seed, index, archive_size):
+    rng = random.Random(seed + index)
+    preview = b"\xff\xd8\xff\xe0" + rng.randbytes(4096) + b"\xff\xd9"
+    info = json.dumps({"nazwa_modelu": f"model_{index:05d}", "wersja": "1.0"}).encode("utf-8")
+    archive = rng.randbytes(archive_size // 2) + bytes(archive_size - archive_size // 2)
+    return {"preview": preview, "info": info, "archive": archive}
+
+
+def payload_digests(payload):
+    return {name: hashlib.sha256(data).hexdigest() for name, data in payload.items()}
+
+
+def write_source(directory, payload):
+    paths = []
+    for name, filename in (
+        ("preview", "preview.jpg"),
+        ("info", "info.json"),
+        ("archive", "archive.zip"),
+    ):
+        path = os.path.join(directory, filename)
+        with open(path, "wb") as f:
+            f.write(payload[name])
+        paths.append(path)
+    return model_backends.FileSetSource(*paths)
+
+
+def writer_process(path, args, ready, done):
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            with model_hdf5.ModelLibrary(
+                path, "a", chunk_size=args.chunk_size, compression=args.compression
+            ) as library:
+                ready.set()
+                for i in range(args.models):
+                    source = write_source(tmp, model_payload(args.seed, i, args.archive_size))
+                    library.add_model(source)
+                    if args.interval:
+                        time.sleep(args.interval)
+    finally:
+        # Również po błędzie - czytelnicy nie mogą czekać w nieskończoność
+        ready.set()
+        done.set()
+
+
+def reader_process(path, args, ready, done, results):
+    try:
+        results.put(read_library(path, args, ready, done))
+    except Exception as e:
+        results.put({"pid": os.getpid(), "error": f"{type(e).__name__}: {e}"})
+
+
+def read_library(path, args, ready, done):
+    ready.wait()
+    expected = {}
+    seen = set()
+    mismatches = []
+    refreshes = 0
+    with model_hdf5.ModelLibrary(path) as library:
+        while True:
+            finished = done.is_set()
+            library.refresh()
+            refreshes += 1
+            for name in library.names():
+                if name in seen:
+                    continue
+                index = int(name.rsplit("_", 1)[1])
+                if index not in expected:
+                    expected[index] = payload_digests(
+                        model_payload(args.seed, index, args.archive_size)
+                    )
+                with library.open_model(name) as model:
+                    for section, digest in expected[index].items():
+                        data = model.read_section(section)
+                        if hashlib.sha256(data).hexdigest() != digest:
+                            mismatches.append(f"{name}/{section}")
+                seen.add(name)
+            if finished:
+                break
+            time.sleep(args.poll)
+    return {
+        "pid": os.getpid(),
+        "models": len(seen),
+        "missing": args.models - len(seen),
+        "refreshes": refreshes,
+        "mismatches": mismatches,
+    }
+
+
+def run_concurrent(path, args):
+    context = multiprocessing.get_context("spawn")
+    ready = context.Event()
+    done = context.Event()
+    results = context.Queue()
+    readers = [
+        context.Process(target=reader_process, args=(path, args, ready, done, results))
+        for _ in range(args.readers)
+    ]
+    writer = context.Process(target=writer_process, args=(path, args, ready, done))
+    start = time.perf_counter()
+    writer.start()
+    for reader in readers:
+        reader.start()
+    writer.join()
+    reports = [results.get(timeout=args.timeout) for _ in readers]
+    for reader in readers:
+        reader.join()
+    return {
+        "seconds": round(time.perf_counter() - start, 3),
+        "writer_exitcode": writer.exitcode,
+        "readers": reports,
+    }
+
+
+def bench_open(directory, args):
+    # Ten sam zestaw modeli jako osobne pliki i jako jedna biblioteka
+    count = min(args.models, args.open_files)
+    library_path = os.path.join(directory, "open_library.h5")
+    paths = []
+    with model_hdf5.ModelLibrary(library_path, "a", chunk_size=args.chunk_size) as library:
+        for i in range(count):
+            source = write_source(directory, model_payload(args.seed, i, args.archive_size))
+            path = os.path.join(directory, f"single_{i:05d}.model")
+            model_backends.write_hdf5(path, source, args.chunk_size)
+            library.add_model(source)
+            paths.append(path)
+
+    latencies = []
+    for path in paths:
+        start = time.perf_counter()
+        with model_backends.Hdf5Model(path) as model:
+            model.read_section("info")
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    report = {
+        "files": count,
+        "per_file_p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "per_file_p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+    latencies = []
+    start = time.perf_counter()
+    with model_hdf5.ModelLibrary(library_path) as library:
+        report["library_open_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        for i in range(count):
+            start = time.perf_counter()
+            with library.open_model(f"model_{i:05d}") as model:
+                model.read_section("info")
+            latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    report["library_p50_ms"] = round(percentile(latencies, 50) * 1000, 3)
+    report["library_p99_ms"] = round(percentile(latencies, 99) * 1000, 3)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Biblioteka modeli HDF5: pisarz SWMR i współbieżni czytelnicy."
+    )
+    parser.add_argument("--models", type=int, default=200)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--archive-size", type=int, default=256 * 1024)
+    parser.add_argument("--chunk-size", type=int, default=model_hdf5.DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--compression", default="none", choices=model_hdf5.COMPRESSIONS)
+    parser.add_argument("--interval", type=float, default=0.0, help="Przerwa pisarza [s]")
+    parser.add_argument("--poll", type=float, default=0.01, help="Przerwa czytelnika [s]")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--open-files", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report = {"concurrent": run_concurrent(os.path.join(tmp, "library.h5"), args)}
+        if args.open_files > 0:
+            report["open"] = bench_open(tmp, args)
+    print(json.dumps(report, indent=4))
+
+    concurrent = report["concurrent"]
+    failed = concurrent["writer_exitcode"] != 0 or any(
+        r.get("error") or r["missing"] or r["mismatches"] for r in concurrent["readers"]
+    )
+    if failed:
+        print("Niezgodność biblioteki pod współbieżnym dostępem.", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import model_logging
+from model_stats import percentile
+
+# Narzut logowania na jeden plik .model w wątku wołającym - te same wywołania
+# i ten sam poziom (--level), różni się tylko konfiguracja handlerów:
+#   old - dawna konfiguracja create_model.py: synchroniczny FileHandler + StreamHandler,
+#   new - model_logging: QueueHandler + QueueListener (zapis w osobnym wątku).
+# Wzorzec wywołań odpowiada odczytowi indeksu i weryfikacji jednego pliku.
+
+HEADER_DUMP_SIZE = 512
+
+
+def log_file(logger, path, header, index_data):
+    logger.info("Wczytywanie pliku: %s", path)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Pierwsze %d bajtów pliku (hex): %s\n(tekst): %s",
+            len(header),
+            header.hex(),
+            header.decode("utf-8", errors="replace"),
+        )
+        logger.debug("Ostateczny indeks JSON: %s", json.dumps(index_data, indent=4))
+    logger.info("Długość indeksu JSON: %d", len(header))
+    for name, entry in index_data.items():
+        logger.debug("Sekcja %s: offset=%d, size=%d", name, entry["offset"], entry["size"])
+    logger.info("Weryfikacja pliku %s zakończona pomyślnie", path)
+
+
+def run(logger, files, header, index_data):
+    latencies = []
+    for i in range(files):
+        path = f"/data/modele/model_{i:06d}.model"
+        start = time.perf_counter()
+        log_file(logger, path, header, index_data)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        "files": files,
+        "mean_us": round(sum(latencies) / files * 1e6, 2),
+        "p50_us": round(percentile(latencies, 50) * 1e6, 2),
+        "p99_us": round(percentile(latencies, 99) * 1e6, 2),
+    }
+
+
+def bench_old(directory, files, header, index_data, console, level):
+    logger = logging.getLogger("bench_logging.old")
+    logger.propagate = False
+    logger.setLevel(level.upper())
+    formatter = logging.Formatter(model_logging.LOG_FORMAT)
+    handlers = [logging.FileHandler(os.path.join(directory, "old.log"), encoding="utf-8")]
+    if console:
+        handlers.append(logging.StreamHandler(sys.stdout))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+        logger.addHandler(handler)
+    try:
+        return run(logger, files, header, index_data)
+    finally:
+        for handler in handlers:
+            logger.removeHandler(handler)
+            handler.close()
+
+
+def bench_new(directory, files, header, index_data, console, level):
+    model_logging.setup_logging(
+        os.path.join(directory, "new.log"), level=level, console=console
+    )
+    try:
+        return run(logging.getLogger("bench_logging.new"), files, header, index_data)
+    finally:
+        model_logging.shutdown_logging()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Narzut logowania na jeden plik .model.")
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--level", default="INFO", help="Poziom logowania obu wariantów")
+    parser.add_argument(
+        "--console", action="store_true", help="Logi także na stdout (jak w create_model.py)"
+    )
+    args = parser.parse_args(argv)
+
+    header = os.urandom(HEADER_DUMP_SIZE)
+    index_data = {
+        "preview": {"offset": 300, "size": 65536},
+        "info": {"offset": 65836, "size": 512},
+        "archive": {"filename": "model.zip", "offset": 66348, "size": 1 << 30},
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        old = bench_old(directory, args.files, header, index_data, args.console, args.level)
+        new = bench_new(directory, args.files, header, index_data, args.console, args.level)
+    report = {
+        "old": old,
+        "new": new,
+        "speedup_mean": round(old["mean_us"] / new["mean_us"], 1) if new["mean_us"] else None,
+    }
+    print(json.dumps(report, indent=4, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import model_backends
+import model_format
+
+# Odczyt samych metadanych (indeks + info.json) dla układów "indexed" i
+# "metafirst" na symulowanym dysku sieciowym: każde wywołanie read na pliku
+# kosztuje stałe opóźnienie (round trip) plus czas transferu przy zadanej
+# przepustowości. Zlicza odczyty i bajty na model.
+#   indexed   - jak loadAndDisplayInfoFromModel: prefiks, indeks, seek do info.json
+#   metafirst - jeden odczyt bloku METAFIRST_BLOCK_SIZE z początku pliku
+
+
+class ThrottledRaw(io.RawIOBase):
+    # Surowy plik z opóźnieniem na każde readinto (seek jest lokalny, bez kosztu)
+    def __init__(self, path, latency_s, bandwidth):
+        super().__init__()
+        self._f = open(path, "rb", buffering=0)
+        self.latency_s = latency_s
+        self.bandwidth = bandwidth
+        self.reads = 0
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        return self._f.seek(pos, whence)
+
+    def tell(self):
+        return self._f.tell()
+
+    def fileno(self):
+        return self._f.fileno()
+
+    def readinto(self, buffer):
+        count = self._f.readinto(buffer)
+        self.reads += 1
+        self.bytes_read += count
+        delay = self.latency_s + (count / self.bandwidth if self.bandwidth else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+        return count
+
+    def close(self):
+        self._f.close()
+        super().close()
+
+
+def read_metadata_indexed(f, file_size):
+    index_data, _ = model_format.read_index(f)
+    return model_format.read_section_bounded(f, index_data, "info", file_size)
+
+
+def read_metadata_metafirst(f, file_size):
+    return model_format.read_metafirst(f, file_size).info_bytes
+
+
+READERS = {
+    "indexed": read_metadata_indexed,
+    "metafirst": read_metadata_metafirst,
+}
+
+
+def make_corpus(directory, layout, count, preview_size, seed=0):
+    rng = random.Random(seed)
+    preview_path = os.path.join(directory, "preview.jpg")
+    info_path = os.path.join(directory, "info.json")
+    archive_path = os.path.join(directory, "archive.zip")
+    with open(preview_path, "wb") as f:
+        f.write(b"\xff\xd8\xff\xe0" + rng.randbytes(preview_size) + b"\xff\xd9")
+    with open(archive_path, "wb") as f:
+        f.write(rng.randbytes(64 * 1024))
+    writer = model_backends.WRITERS[layout]
+    paths = []
+    for i in range(count):
+        with open(info_path, "w", encoding="utf-8") as f:
+            json.dump({"nazwa_modelu": f"model_{i:05d}", "wersja": "1.0"}, f)
+        path = os.path.join(directory, f"{layout}_{i:05d}.model")
+        writer(path, model_backends.FileSetSource(preview_path, info_path, archive_path))
+        paths.append(path)
+    return paths
+
+
+def bench_layout(layout, paths, latency_s, bandwidth):
+    reader = READERS[layout]
+    reads = total_bytes = 0
+    start = time.perf_counter()
+    for path in paths:
+        raw = ThrottledRaw(path, latency_s, bandwidth)
+        with io.BufferedReader(raw) as f:
+            info_bytes = reader(f, os.fstat(raw.fileno()).st_size)
+            json.loads(info_bytes)
+        reads += raw.reads
+        total_bytes += raw.bytes_read
+    elapsed = time.perf_counter() - start
+    return {
+        "models": len(paths),
+        "ms_per_model": round(elapsed / len(paths) * 1000, 3),
+        "reads_per_model": round(reads / len(paths), 2),
+        "bytes_per_model": round(total_bytes / len(paths)),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Odczyt metadanych .model na dysku o symulowanym opóźnieniu."
+    )
+    parser.add_argument("--models", type=int, default=200)
+    parser.add_argument("--preview-size", type=int, default=2 * 1024 * 1024)
+    parser.add_argument(
+        "--latencies-ms", default="0,1,5", help="Opóźnienia na odczyt (ms), po przecinku"
+    )
+    parser.add_argument(
+        "--bandwidth-mb",
+        type=float,
+        default=100.0,
+        help="Przepustowość w MB/s (0 = bez limitu)",
+    )
+    args = parser.parse_args(argv)
+
+    latencies = [float(v) for v in args.latencies_ms.split(",") if v.strip()]
+    bandwidth = args.bandwidth_mb * 1e6
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        corpora = {
+            layout: make_corpus(tmp, layout, args.models, args.preview_size)
+            for layout in READERS
+        }
+        for latency_ms in latencies:
+            results = {
+                layout: bench_layout(layout, paths, latency_ms / 1000, bandwidth)
+                for layout, paths in corpora.items()
+            }
+            indexed, metafirst = results["indexed"], results["metafirst"]
+            if metafirst["ms_per_model"]:
+                results["speedup"] = round(
+                    indexed["ms_per_model"] / metafirst["ms_per_model"], 2
+                )
+            report[f"{latency_ms:g}ms"] = results
+    print(json.dumps(report, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
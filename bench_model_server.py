@@ -0,0 +1,179 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+import model_format
+from model_stats import percentile
+
+# Test obciążeniowy serwera model_server.py: N równoległych połączeń keep-alive
+# odpytuje sekcje modeli z lokalnego korpusu; raport: żądania/s i opóźnienia p50/p99.
+
+
+def generate_corpus(root, count, archive_size, seed=0):
+    rng = random.Random(seed)
+    os.makedirs(root, exist_ok=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        preview_path = os.path.join(tmp, "preview.jpg")
+        info_path = os.path.join(tmp, "info.json")
+        archive_path = os.path.join(tmp, "archive.zip")
+        for i in range(count):
+            with open(preview_path, "wb") as f:
+                f.write(b"\xff\xd8\xff\xe0" + rng.randbytes(16 * 1024) + b"\xff\xd9")
+            with open(info_path, "w", encoding="utf-8") as f:
+                json.dump({"nazwa_modelu": f"model_{i:05d}", "wersja": "1.0"}, f)
+            with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_STORED) as zf:
+                zf.writestr("payload.bin", rng.randbytes(archive_size))
+            model_format.write_model_file(
+                os.path.join(root, f"model_{i:05d}.model"),
+                preview_path,
+                info_path,
+                archive_path,
+            )
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    content_length = 0
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            content_length = int(value.strip())
+    if content_length:
+        await reader.readexactly(content_length)
+    return status, content_length
+
+
+async def client_worker(host, port, paths, deadline, latencies, counters, range_header):
+    reader, writer = await asyncio.open_connection(host, port)
+    rng = random.Random()
+    try:
+        while time.perf_counter() < deadline:
+            path = rng.choice(paths)
+            request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\n"
+            if range_header:
+                request += f"Range: {range_header}\r\n"
+            writer.write((request + "\r\n").encode("latin-1"))
+            start = time.perf_counter()
+            status, body_len = await read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            counters["bytes"] += body_len
+            if status >= 400:
+                counters["errors"] += 1
+    finally:
+        writer.close()
+
+
+async def run_load(host, port, paths, concurrency, duration, range_header):
+    latencies = []
+    counters = {"bytes": 0, "errors": 0}
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(
+            client_worker(
+                host, port, paths, deadline, latencies, counters, range_header
+            )
+            for _ in range(concurrency)
+        )
+    )
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": counters["errors"],
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(len(latencies) / elapsed, 1),
+        "mb_per_s": round(counters["bytes"] / elapsed / 1e6, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Test obciążeniowy model_server.py")
+    parser.add_argument("--corpus", help="Katalog z plikami .model (domyślnie syntetyczny)")
+    parser.add_argument("--models", type=int, default=50)
+    parser.add_argument("--archive-size", type=int, default=1024 * 1024)
+    parser.add_argument("--host", help="Adres działającego serwera (bez uruchamiania własnego)")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument(
+        "--sections", default="preview,info", help="Sekcje do odpytywania, np. info,archive"
+    )
+    parser.add_argument("--range", dest="range_header", help="Nagłówek Range, np. bytes=0-65535")
+    args = parser.parse_args(argv)
+
+    tmp_dir = None
+    corpus = args.corpus
+    if corpus is None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        corpus = tmp_dir.name
+        generate_corpus(corpus, args.models, args.archive_size)
+
+    model_ids = sorted(
+        name[: -len(".model")] for name in os.listdir(corpus) if name.endswith(".model")
+    )
+    sections = [s.strip() for s in args.sections.split(",") if s.strip()]
+    paths = [f"/models/{m}/{s}" for m in model_ids for s in sections]
+    if not paths:
+        print("Brak plików .model w korpusie.", file=sys.stderr)
+        return 1
+
+    server_proc = None
+    host, port = args.host or "127.0.0.1", args.port
+    if args.host is None:
+        port = port or free_port()
+        server_proc = subprocess.Popen(
+            [
+                sys.executable,
+                os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_server.py"),
+                corpus,
+                "--port",
+                str(port),
+                "--log-level",
+                "WARNING",
+            ],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        server_proc.stdout.readline()  # "LISTENING <port>"
+    try:
+        result = asyncio.run(
+            run_load(host, port, paths, args.concurrency, args.duration, args.range_header)
+        )
+    finally:
+        if server_proc is not None:
+            server_proc.terminate()
+            server_proc.wait()
+        if tmp_dir is not None:
+            tmp_dir.cleanup()
+    result.update(
+        {
+            "models": len(model_ids),
+            "sections": sections,
+            "concurrency": args.concurrency,
+            "range": args.range_header,
+        }
+    )
+    print(json.dumps(result, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import zipfile
+
+import model_backends
+import model_pack
+
+# Tworzenie pliku .model z katalogu źródłowego:
+#   two-pass - dotychczasowy tryb: archiwum .zip (zipfile, deflate, jeden
+#              wątek) do pliku, potem model_backends.write_zip kopiuje je do .model
+#   pack-1   - model_pack.pack_directory w jednym wątku
+#   pack-N   - model_pack.pack_directory z N wątkami kompresji (--workers)
+# Korpus: pliki tekstowe (kompresowalne), losowe .bin i "zdjęcia" .jpg.
+
+
+def make_tree(directory, files, file_size, seed):
+    rng = random.Random(seed)
+    words = [rng.randbytes(6).hex() for _ in range(512)]
+    for i in range(files):
+        sub = os.path.join(directory, f"d{i % 8}")
+        os.makedirs(sub, exist_ok=True)
+        kind = i % 3
+        if kind == 0:
+            name = f"f{i}.txt"
+            text = " ".join(rng.choice(words) for _ in range(file_size // 13 + 1))
+            data = text.encode("ascii")[:file_size]
+        elif kind == 1:
+            name = f"f{i}.bin"
+            data = rng.randbytes(file_size)
+        else:
+            name = f"f{i}.jpg"
+            data = b"\xff\xd8\xff\xe0" + rng.randbytes(file_size - 6) + b"\xff\xd9"
+        with open(os.path.join(sub, name), "wb") as f:
+            f.write(data)
+
+
+def two_pass(tmp, preview, info, folder, output):
+    archive = os.path.join(tmp, model_pack.archive_name(folder))
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as z:
+        for path, arcname in model_pack.collect_files(folder):
+            z.write(path, arcname)
+    model_backends.write_zip(output, model_backends.FileSetSource(preview, info, archive))
+    os.remove(archive)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Plik .model z katalogu: dwa przebiegi vs model_pack."
+    )
+    parser.add_argument("--files", type=int, default=300)
+    parser.add_argument("--file-size", type=int, default=1024 * 1024)
+    parser.add_argument("--workers", type=int, default=model_pack.DEFAULT_WORKERS)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    report = {"files": args.files, "file_size": args.file_size, "workers": args.workers}
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, "source")
+        make_tree(folder, args.files, args.file_size, args.seed)
+        preview = os.path.join(tmp, "preview.jpg")
+        info = os.path.join(tmp, "info.json")
+        with open(preview, "wb") as f:
+            f.write(b"\xff\xd8\xff\xe0" + bytes(1024) + b"\xff\xd9")
+        with open(info, "w", encoding="utf-8") as f:
+            json.dump({"nazwa_modelu": "bench", "wersja": "1.0"}, f)
+        output = os.path.join(tmp, "out.model")
+        total = args.files * args.file_size
+
+        runs = [("two-pass", lambda: two_pass(tmp, preview, info, folder, output))]
+        for workers in sorted({1, args.workers}):
+            runs.append(
+                (
+                    f"pack-{workers}",
+                    lambda workers=workers: model_pack.pack_directory(
+                        output, preview, info, folder, workers=workers
+                    ),
+                )
+            )
+        for name, run in runs:
+            start = time.perf_counter()
+            run()
+            seconds = time.perf_counter() - start
+            report[name] = {
+                "s": round(seconds, 3),
+                "mb_per_s": round(total / seconds / 1e6, 1),
+                "model_bytes": os.path.getsize(output),
+            }
+            os.remove(output)
+    print(json.dumps(report, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,361 @@
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import build_cache
+import model_atomic
+import model_backends
+import model_format
+import model_pack
+from verify_batch import load_completed
+
+# Przyrostowe budowanie partii plików .model (jak make): manifest JSONL, jeden
+# wiersz na wynik {"output", "preview", "info", "archive"[, "format"]} - ścieżki
+# względne liczone od katalogu manifestu; "archive" może być plikiem albo
+# katalogiem (archiwum ZIP budowane w locie przez model_pack).
+# Wynik, którego wejścia i opcje formatu się nie zmieniły (build_cache), jest
+# pomijany bez czytania wejść - wystarcza stat. Z --hash zapisujemy też hash
+# treści wejść: liczony przy budowaniu (w tym samym odczycie, który zapisuje
+# sekcję), a przy kolejnych przebiegach tylko dla wejść o zmienionym stat.
+# Dziennik JSONL (--journal) dostaje wiersz po każdym udanym wyniku; przerwana
+# partia wznawia od miejsca przerwania (nieudane są budowane ponownie), a
+# ukończona bez błędów usuwa dziennik.
+# Plik wynikowy powstaje atomowo (model_atomic): plik tymczasowy obok wyniku
+# z rezerwacją miejsca, fsync, os.replace. Z --fsync-batch N procesy robocze
+# zostawiają gotowe pliki tymczasowe, a proces główny zatwierdza je grupami po
+# N (fsync wszystkich, podmiany, jeden fsync katalogu) - dopiero wtedy wynik
+# trafia do build_cache i dziennika.
+
+logger = logging.getLogger(__name__)
+
+
+class HashingSource(model_backends.ModelHandle):
+    # Źródło sekcji, które przy odczycie liczy hash wskazanych sekcji
+    def __init__(self, source, sections):
+        self._source = source
+        self._sections = set(sections)
+        self.archive_filename = source.archive_filename
+        self.hashes = {}
+
+    def section_size(self, name):
+        return self._source.section_size(name)
+
+    def iter_section(self, name, chunk_size=model_backends.CHUNK_SIZE):
+        if name not in self._sections:
+            yield from self._source.iter_section(name, chunk_size)
+            return
+        hasher = hashlib.blake2b(digest_size=16)
+        for chunk in self._source.iter_section(name, chunk_size):
+            hasher.update(chunk)
+            yield chunk
+        self.hashes[name] = hasher.hexdigest()
+
+
+def load_manifest(manifest_path, default_format):
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    targets = []
+    with open(manifest_path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                target = {
+                    key: os.path.normpath(os.path.join(base, entry[key]))
+                    for key in ("output", "preview", "info", "archive")
+                }
+            except (ValueError, KeyError, TypeError) as e:
+                raise model_format.ModelFormatError(
+                    f"{manifest_path}:{line_no}: niepoprawny wpis manifestu ({e})."
+                )
+            target["format"] = entry.get("format", default_format)
+            targets.append(target)
+    return targets
+
+
+def target_options(target, chunk_size, level):
+    options = {"format": target["format"], "chunk_size": chunk_size}
+    if os.path.isdir(target["archive"]):
+        options["archive"] = "folder"
+        options["level"] = level
+    return options
+
+
+def plan_target(target, record, options, use_hash):
+    # Zwraca (odciski wejść, powód przebudowania albo None)
+    inputs = {}
+    reasons = []
+    if record is None:
+        reasons.append("new")
+    elif record.options != options:
+        reasons.append("options")
+    for name in model_format.SECTION_NAMES:
+        old = record.inputs.get(name) if record is not None else None
+        inputs[name], changed = build_cache.compare_input(target[name], old, use_hash)
+        if changed and record is not None:
+            reasons.append(name)
+    if record is not None and build_cache.output_stat(target["output"]) != tuple(
+        record.output_stat
+    ):
+        reasons.append("output")
+    return inputs, ",".join(reasons) or None
+
+
+def write_target(target, path, options, unhashed, batch=None):
+    # Zwraca (zapisane bajty, hashe policzone przy zapisie)
+    if options.get("archive") == "folder":
+        if options["format"] != "zip":
+            raise model_format.ModelFormatError(
+                f"Archiwum z katalogu tylko w formacie zip, nie {options['format']}."
+            )
+        model_pack.pack_directory(
+            path,
+            target["preview"],
+            target["info"],
+            target["archive"],
+            level=options["level"],
+            block_size=options["chunk_size"],
+            batch=batch,
+        )
+        written = os.path.getsize(batch.pending[-1][0] if batch else path)
+        return written, {}
+    source = HashingSource(
+        model_backends.FileSetSource(target["preview"], target["info"], target["archive"]),
+        unhashed,
+    )
+    written = model_backends.write_model(
+        path, options["format"], source, options["chunk_size"], batch
+    )
+    return written, source.hashes
+
+
+def build_target(target, record, options, use_hash, defer_sync=False):
+    # defer_sync - wynik zostaje w pliku tymczasowym (result["pending"]),
+    # fsync i podmianę robi proces główny (build_all, --fsync-batch)
+    start = time.perf_counter()
+    output = target["output"]
+    result = {"path": output, "bytes": 0}
+    batch = model_atomic.SyncBatch(max_files=None) if defer_sync else None
+    try:
+        inputs, reason = plan_target(target, record, options, use_hash)
+        result["inputs"] = inputs
+        if reason is None:
+            result["action"] = "skipped"
+            result["output_stat"] = list(record.output_stat)
+            result["updated"] = inputs != record.inputs
+            return result
+        result["reason"] = reason
+        unhashed = [
+            name
+            for name in model_format.SECTION_NAMES
+            if use_hash and any(entry["hash"] is None for entry in inputs[name].values())
+        ]
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        result["bytes"], hashes = write_target(target, output, options, unhashed, batch)
+        for name in unhashed:
+            for rel_path, entry in inputs[name].items():
+                if entry["hash"] is not None:
+                    continue
+                if name in hashes:
+                    entry["hash"] = hashes[name]
+                else:
+                    # Archiwum z katalogu - model_pack nie zwraca hashy plików
+                    full = os.path.join(target[name], rel_path) if rel_path else target[name]
+                    entry["hash"] = build_cache.file_hash(full)
+        # rename nie zmienia rozmiaru ani mtime - stat pliku tymczasowego wystarcza
+        written_path = batch.pending[0][0] if batch else output
+        result["output_stat"] = list(build_cache.output_stat(written_path))
+        if batch:
+            result["pending"] = batch.pending
+        result["action"] = "built"
+    except Exception as e:
+        result["action"] = "failed"
+        result["error"] = f"{type(e).__name__}: {e}"
+        if batch:
+            batch.discard()
+    finally:
+        result["elapsed_s"] = round(time.perf_counter() - start, 6)
+    return result
+
+
+def build_all(
+    targets, cache, journal_path, options_for, use_hash=False, workers=None, fsync_batch=None
+):
+    completed = load_completed(journal_path)
+    pending = [t for t in targets if t["output"] not in completed]
+    summary = {
+        "targets": len(targets),
+        "resumed_skipped": len(targets) - len(pending),
+        "built": 0,
+        "skipped": 0,
+        "failed": 0,
+        "bytes": 0,
+    }
+    start = time.perf_counter()
+    max_in_flight = (workers or os.cpu_count() or 1) * 4
+    interrupted = False
+    batch = model_atomic.SyncBatch(max_files=fsync_batch) if fsync_batch else None
+
+    # Pula poza blokiem with - jak verify_batch: po Ctrl-C nie czekamy na budowanie
+    own_children = set(multiprocessing.active_children())
+    pool = ProcessPoolExecutor(max_workers=workers)
+    with open(journal_path, "a", encoding="utf-8") as journal:
+        queue = iter(pending)
+        in_flight = {}
+
+        def record(result, options):
+            if result["action"] == "built" or result.get("updated"):
+                cache.store(result["path"], options, result["inputs"], result["output_stat"])
+            entry = {
+                k: v for k, v in result.items() if k not in ("inputs", "updated", "pending")
+            }
+            journal.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+        try:
+            while True:
+                while len(in_flight) < max_in_flight:
+                    target = next(queue, None)
+                    if target is None:
+                        break
+                    options = options_for(target)
+                    future = pool.submit(
+                        build_target,
+                        target,
+                        cache.get(target["output"]),
+                        options,
+                        use_hash,
+                        batch is not None,
+                    )
+                    in_flight[future] = options
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    options = in_flight.pop(future)
+                    result = future.result()
+                    action = result["action"]
+                    summary[action] += 1
+                    if action == "built":
+                        summary["bytes"] += result["bytes"]
+                        logger.info(
+                            "Zbudowano %s (%s, %d B, %.3f s)",
+                            result["path"],
+                            result["reason"],
+                            result["bytes"],
+                            result["elapsed_s"],
+                        )
+                    elif action == "failed":
+                        # Bez wpisu w dzienniku - wznowienie spróbuje ponownie
+                        logger.error(
+                            "Nie udało się zbudować %s: %s", result["path"], result["error"]
+                        )
+                        continue
+                    if action == "built" and batch is not None:
+                        # Do rekordu i dziennika dopiero po zatwierdzeniu grupy
+                        (tmp_path, output), = result["pending"]
+                        batch.add(
+                            tmp_path,
+                            output,
+                            result["bytes"],
+                            lambda result=result, options=options: record(result, options),
+                        )
+                        continue
+                    record(result, options)
+                journal.flush()
+        except KeyboardInterrupt:
+            interrupted = True
+            logger.warning("Przerwano - kolejne uruchomienie wznowi partię z dziennika.")
+            for future in in_flight:
+                future.cancel()
+        finally:
+            pool.shutdown(wait=not interrupted, cancel_futures=interrupted)
+            if interrupted:
+                for process in set(multiprocessing.active_children()) - own_children:
+                    process.terminate()
+            # Gotowe pliki tymczasowe są kompletne - zatwierdzamy je także po przerwaniu
+            if batch is not None:
+                batch.flush()
+                journal.flush()
+
+    elapsed = time.perf_counter() - start
+    summary["elapsed_s"] = round(elapsed, 3)
+    summary["mb_per_s"] = round(summary["bytes"] / elapsed / 1e6, 2) if elapsed else 0.0
+    summary["interrupted"] = interrupted
+    if not interrupted and not summary["failed"]:
+        os.remove(journal_path)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Przyrostowe budowanie plików .model z manifestu JSONL."
+    )
+    parser.add_argument("manifest", help="Manifest JSONL: output, preview, info, archive")
+    parser.add_argument("--format", default="zip", choices=sorted(model_backends.WRITERS))
+    parser.add_argument("--chunk-size", type=int, default=model_backends.CHUNK_SIZE)
+    parser.add_argument(
+        "--level", type=int, default=model_pack.DEFAULT_LEVEL, help="Deflate dla katalogów"
+    )
+    parser.add_argument(
+        "--hash",
+        action="store_true",
+        help="Zapisuj hash treści wejść (zmiana samego mtime nie wymusi budowania)",
+    )
+    parser.add_argument("--cache", help="Baza SQLite odcisków (domyślnie obok manifestu)")
+    parser.add_argument("--journal", help="Dziennik partii JSONL (domyślnie obok manifestu)")
+    parser.add_argument(
+        "--restart", action="store_true", help="Zignoruj dziennik przerwanej partii"
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--fsync-batch",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Zatwierdzaj wyniki (fsync + podmiana) grupami po N plików",
+    )
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        level=args.log_level.upper(),
+        format="%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s",
+    )
+
+    base = os.path.splitext(os.path.abspath(args.manifest))[0]
+    cache_path = args.cache or base + ".build_cache.sqlite"
+    journal_path = args.journal or base + ".journal.jsonl"
+    if args.restart and os.path.exists(journal_path):
+        os.remove(journal_path)
+    try:
+        targets = load_manifest(args.manifest, args.format)
+    except (OSError, model_format.ModelFormatError) as e:
+        logger.error("Nie można wczytać manifestu: %s", e)
+        return 2
+
+    cache = build_cache.BuildCache(cache_path)
+    try:
+        summary = build_all(
+            targets,
+            cache,
+            journal_path,
+            lambda target: target_options(target, args.chunk_size, args.level),
+            args.hash,
+            args.workers,
+            args.fsync_batch,
+        )
+    finally:
+        cache.close()
+    print(json.dumps(summary, indent=4))
+    if summary["interrupted"]:
+        return 130
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
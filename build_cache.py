@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+# Trwała pamięć budowania plików .model (SQLite) dla build_batch.py.
+# Dla każdego pliku wyjściowego zapisujemy odciski wejść (preview, info,
+# archiwum - plik albo drzewo katalogu dla model_pack) i opcje formatu, z
+# których powstał, oraz stat samego wyniku. Odcisk pliku to (size, mtime_ns,
+# dev, ino) i opcjonalnie hash treści (blake2b, jak model_verify).
+# Wejście o niezmienionym stat jest niezmienione - nigdy go nie haszujemy.
+# Inny stat przy tym samym rozmiarze i zapisanym hashu: liczymy hash i jeśli
+# się zgadza (np. sam touch albo ponowne skopiowanie), wejście jest
+# niezmienione, a rekord dostaje nowy stat. Wynik budujemy od nowa, gdy
+# zmieniło się którekolwiek wejście, opcje, albo plik wyjściowy zniknął lub
+# ma inny stat niż po ostatnim zapisie.
+
+HASH_CHUNK_SIZE = 1024 * 1024
+STAT_FIELDS = ("size", "mtime_ns", "dev", "ino")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS build_cache (
+    output TEXT PRIMARY KEY,
+    options TEXT NOT NULL,
+    inputs TEXT NOT NULL,
+    output_size INTEGER NOT NULL,
+    output_mtime_ns INTEGER NOT NULL,
+    built_at REAL NOT NULL
+)
+"""
+
+
+def file_hash(path, chunk_size=HASH_CHUNK_SIZE):
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def stat_entry(path):
+    st = os.stat(path)
+    return {
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "dev": st.st_dev,
+        "ino": st.st_ino,
+        "hash": None,
+    }
+
+
+def input_files(path):
+    # Plik -> {"": ścieżka}; katalog -> {ścieżka względna: ścieżka} (jak model_pack)
+    if not os.path.isdir(path):
+        return {"": path}
+    files = {}
+    for root, dirs, names in os.walk(path):
+        dirs.sort()
+        for name in sorted(names):
+            full = os.path.join(root, name)
+            if os.path.isfile(full):
+                files[os.path.relpath(full, path).replace(os.sep, "/")] = full
+    return files
+
+
+def compare_input(path, old, use_hash):
+    # Zwraca (nowy odcisk, zmienione) dla wejścia; old - odcisk z rekordu albo None.
+    # Wpisy bez hasha w trybie use_hash dostają go przy budowaniu (build_batch).
+    old = old or {}
+    files = input_files(path)
+    entries = {}
+    changed = set(old) - set(files) if old else {""}
+    for name, full in files.items():
+        entry = stat_entry(full)
+        previous = old.get(name)
+        if previous is not None and all(previous[f] == entry[f] for f in STAT_FIELDS):
+            entry["hash"] = previous.get("hash")
+        elif (
+            use_hash
+            and previous is not None
+            and previous.get("hash")
+            and previous["size"] == entry["size"]
+        ):
+            entry["hash"] = file_hash(full)
+            if entry["hash"] != previous["hash"]:
+                changed.add(name)
+        else:
+            changed.add(name)
+        entries[name] = entry
+    return entries, bool(changed)
+
+
+def output_stat(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_size, st.st_mtime_ns)
+
+
+class BuildRecord:
+    __slots__ = ("options", "inputs", "output_stat", "built_at")
+
+    def __init__(self, options, inputs, output_stat, built_at):
+        self.options = options
+        self.inputs = inputs
+        self.output_stat = output_stat
+        self.built_at = built_at
+
+
+class BuildCache:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+
+    def get(self, output):
+        row = self._conn.execute(
+            "SELECT options, inputs, output_size, output_mtime_ns, built_at "
+            "FROM build_cache WHERE output = ?",
+            (os.path.abspath(output),),
+        ).fetchone()
+        if row is None:
+            return None
+        return BuildRecord(json.loads(row[0]), json.loads(row[1]), (row[2], row[3]), row[4])
+
+    def store(self, output, options, inputs, stat):
+        # Zatwierdzane od razu - przerwana partia nie traci ukończonych wyników
+        self._conn.execute(
+            "INSERT OR REPLACE INTO build_cache VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                os.path.abspath(output),
+                json.dumps(options, sort_keys=True),
+                json.dumps(inputs, sort_keys=True),
+                *stat,
+                time.time(),
+            ),
+        )
+        self._conn.commit()
+
+    def forget(self, output):
+        self._conn.execute(
+            "DELETE FROM build_cache WHERE output = ?", (os.path.abspath(output),)
+        )
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
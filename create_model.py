@@ -6,7 +6,14 @@ import sys
 import time
 import zipfile
 
-import rarfile  # Pamiętaj o potencjalnej potrzebie instalacji (pip install rarfile) i unrar
+import model_atomic
+import model_format
+import model_logging
+import model_metrics
+import model_profile
+import model_recover
+import model_schema
+import model_writecheck
 from PyQt6.QtCore import Qt  # Upewniono się, że Qt jest importowane
 from PyQt6.QtWidgets import (
     QApplication,
@@ -21,25 +28,18 @@ from PyQt6.QtWidgets import (
     QWidget,
 )
 
-# Konfiguracja loggingu
-# Ustaw poziom logowania, format i miejsce docelowe (np. plik lub konsola)
-# Można to zrobić bardziej globalnie, jeśli aplikacja ma wiele modułów
+# Konfiguracja loggingu: kolejka + osobny wątek zapisu, rotowany plik.
+# Poziom z CFAB_MODEL_LOG_LEVEL (domyślnie INFO) - szczegóły w model_logging.py
 log_file_path = os.path.join(
     os.path.dirname(__file__) if __file__ else ".", "model_creator.log"
 )
-logging.basicConfig(
-    level=logging.DEBUG,  # Zapisuj logi od poziomu DEBUG wzwyż
-    format="%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s",
-    handlers=[
-        logging.FileHandler(
-            log_file_path, encoding="utf-8"
-        ),  # Logi do pliku z kodowaniem UTF-8
-        logging.StreamHandler(sys.stdout),  # Opcjonalnie: logi również do konsoli
-    ],
-)
+model_logging.setup_logging(log_file_path)
 
 logger = logging.getLogger(__name__)  # Utwórz instancję loggera dla tego modułu
 
+# Profilowanie (CFAB_MODEL_PROFILE lub --profile): wyniki obok model_creator.log
+model_profile.configure_from_env(os.path.dirname(os.path.abspath(log_file_path)))
+
 
 class ModelCreator(QWidget):
     def __init__(self):
@@ -134,7 +134,8 @@ class ModelCreator(QWidget):
 
     def _verify_and_extract_info_json(self, info_data_bytes, model_file_path):
         logger.debug(
-            f"Rozpoczęcie weryfikacji i ekstrakcji info.json z pliku: {model_file_path}"
+            "Rozpoczęcie weryfikacji i ekstrakcji info.json z pliku: %s",
+            model_file_path,
         )
         try:
             info_content_str = info_data_bytes.decode("utf-8")
@@ -143,7 +144,9 @@ class ModelCreator(QWidget):
             logger.debug("Pomyślnie sparsowano info.json.")
         except UnicodeDecodeError as e:
             logger.error(
-                f"Błąd dekodowania UTF-8 dla info.json z {model_file_path}: {e}",
+                "Błąd dekodowania UTF-8 dla info.json z %s: %s",
+                model_file_path,
+                e,
                 exc_info=True,
             )
             self.status_label.setText(
@@ -157,7 +160,9 @@ class ModelCreator(QWidget):
             return None
         except json.JSONDecodeError as e:
             logger.error(
-                f"Błąd parsowania JSON dla info.json z {model_file_path}: {e}",
+                "Błąd parsowania JSON dla info.json z %s: %s",
+                model_file_path,
+                e,
                 exc_info=True,
             )
             self.status_label.setText(
@@ -172,7 +177,8 @@ class ModelCreator(QWidget):
 
         if not isinstance(info_json, dict):
             logger.error(
-                f"Weryfikacja nieudana: Główna struktura info.json nie jest obiektem w {model_file_path}."
+                "Weryfikacja nieudana: Główna struktura info.json nie jest obiektem w %s.",
+                model_file_path,
             )
             self.status_label.setText(
                 "Weryfikacja nieudana: Główna struktura info.json nie jest obiektem."
@@ -184,35 +190,27 @@ class ModelCreator(QWidget):
             )
             return None
 
-        # Przykładowa weryfikacja wymaganych kluczy
-        required_keys = [
-            "nazwa_modelu",
-            "wersja",
-        ]  # Można dodać więcej np. "autor", "opis"
-        for key in required_keys:
-            if key not in info_json:
-                logger.error(
-                    f"Weryfikacja nieudana: Brak klucza '{key}' in info.json w {model_file_path}."
-                )
-                self.status_label.setText(
-                    f"Weryfikacja nieudana: Brak klucza '{key}' w info.json."
-                )
-                QMessageBox.critical(
-                    self,
-                    "Błąd weryfikacji",
-                    f"Brak wymaganego klucza '{key}' w pliku info.json w '{model_file_path}'.",
-                )
-                return None
-
-        # Tutaj można dodać więcej szczegółowych weryfikacji, np. typów wartości
-        # Przykład:
-        # if not isinstance(info_json.get("wersja"), str):
-        #     self.status_label.setText("Weryfikacja nieudana: Klucz 'wersja' w info.json nie jest tekstem.")
-        #     QMessageBox.critical(self, "Błąd weryfikacji", f"Klucz 'wersja' w info.json w '{model_file_path}' musi być tekstem.")
-        #     return None
+        # Schemat info.json (wymagane klucze, typy, format wersji) - model_schema
+        # zwraca wszystkie błędy naraz, więc użytkownik widzi pełną listę
+        schema_errors = model_schema.validate_info(info_json)
+        if schema_errors:
+            for error in schema_errors:
+                logger.error("Weryfikacja nieudana (%s): %s", model_file_path, error)
+            summary = schema_errors[0]
+            if len(schema_errors) > 1:
+                summary += f" (oraz {len(schema_errors) - 1} innych błędów)"
+            self.status_label.setText(f"Weryfikacja nieudana: {summary}")
+            QMessageBox.critical(
+                self,
+                "Błąd weryfikacji",
+                f"Plik info.json w '{model_file_path}' zawiera błędy:\n"
+                + "\n".join(schema_errors),
+            )
+            return None
 
         logger.info(
-            f"Pomyślnie zweryfikowano i sparsowano info.json z {model_file_path}."
+            "Pomyślnie zweryfikowano i sparsowano info.json z %s.",
+            model_file_path,
         )
         return info_json
 
@@ -221,7 +219,7 @@ class ModelCreator(QWidget):
             self, "Wybierz plik preview.jpg", "", "Pliki JPG (*.jpg *.jpeg)"
         )
         if fname:
-            logger.info(f"Wybrano plik preview: {fname}")
+            logger.info("Wybrano plik preview: %s", fname)
             self.preview_path = fname
             self.preview_path_edit.setText(fname)
         else:
@@ -232,7 +230,7 @@ class ModelCreator(QWidget):
             self, "Wybierz plik info.json", "", "Pliki JSON (*.json)"
         )
         if fname:
-            logger.info(f"Wybrano plik info: {fname}")
+            logger.info("Wybrano plik info: %s", fname)
             self.info_path = fname
             self.info_path_edit.setText(fname)
         else:
@@ -246,7 +244,7 @@ class ModelCreator(QWidget):
             "Pliki ZIP (*.zip);;Pliki RAR (*.rar)",
         )
         if fname:
-            logger.info(f"Wybrano plik archiwum: {fname}")
+            logger.info("Wybrano plik archiwum: %s", fname)
             self.archive_path = fname
             self.archive_path_edit.setText(fname)
         else:
@@ -259,12 +257,13 @@ class ModelCreator(QWidget):
         if fname:
             if not fname.lower().endswith(".model"):
                 fname += ".model"
-            logger.info(f"Wybrano plik wyjściowy .model: {fname}")
+            logger.info("Wybrano plik wyjściowy .model: %s", fname)
             self.output_path = fname
             self.output_path_edit.setText(fname)
         else:
             logger.debug("Nie wybrano pliku wyjściowego .model.")
 
+    @model_profile.profiled("create")
     def createModelFile(self):
         logger.info("Rozpoczęto tworzenie pliku .model.")
         if not all(
@@ -283,18 +282,21 @@ class ModelCreator(QWidget):
         start_time = time.time()
         self.status_label.setText("Tworzenie pliku .model...")
         self.time_label.setText("")
+        metrics_op = model_metrics.start_operation("create", self.output_path)
+        created = False
 
         try:
             # 1. Wczytaj wszystkie komponenty do pamięci
+            metrics_op.phase("read_inputs")
             with open(self.preview_path, "rb") as f_preview:
                 preview_data = f_preview.read()
             preview_size = len(preview_data)
-            logger.debug(f"Wczytano preview.jpg, rozmiar: {preview_size} bajtów.")
+            logger.debug("Wczytano preview.jpg, rozmiar: %s bajtów.", preview_size)
 
             with open(self.info_path, "rb") as f_info:
                 info_data = f_info.read()
             info_size = len(info_data)
-            logger.debug(f"Wczytano info.json, rozmiar: {info_size} bajtów.")
+            logger.debug("Wczytano info.json, rozmiar: %s bajtów.", info_size)
             try:
                 json.loads(info_data.decode("utf-8"))
                 logger.debug(
@@ -302,7 +304,9 @@ class ModelCreator(QWidget):
                 )
             except Exception as e:
                 logger.error(
-                    f"Plik info.json ({self.info_path}) jest niepoprawny lub ma złe kodowanie: {e}",
+                    "Plik info.json (%s) jest niepoprawny lub ma złe kodowanie: %s",
+                    self.info_path,
+                    e,
                     exc_info=True,
                 )
                 QMessageBox.critical(
@@ -317,10 +321,14 @@ class ModelCreator(QWidget):
             archive_size = len(archive_data)
             archive_filename = os.path.basename(self.archive_path)
             logger.debug(
-                f"Wczytano archiwum {archive_filename}, rozmiar: {archive_size} bajtów."
+                "Wczytano archiwum %s, rozmiar: %s bajtów.",
+                archive_filename,
+                archive_size,
             )
+            metrics_op.add_bytes(preview_size + info_size + archive_size)
 
             # 2. Przygotuj ostateczny indeks JSON i jego zakodowaną postać
+            metrics_op.phase("build_index")
             logger.debug("Przygotowywanie ostatecznego indeksu JSON...")
 
             # Początkowy offset dla danych po 2-bajtowym prefiksie długości i samym indeksie
@@ -362,12 +370,16 @@ class ModelCreator(QWidget):
                 new_len_index_json_bytes = len(temp_final_index_json_bytes)
 
                 logger.debug(
-                    f"Iteracja {i+1} stabilizacji indeksu: poprzedni rozmiar JSON = {len_index_json_bytes}, nowy rozmiar JSON = {new_len_index_json_bytes}"
+                    "Iteracja %s stabilizacji indeksu: poprzedni rozmiar JSON = %s, nowy rozmiar JSON = %s",
+                    i + 1,
+                    len_index_json_bytes,
+                    new_len_index_json_bytes,
                 )
 
                 if new_len_index_json_bytes == len_index_json_bytes:
                     logger.debug(
-                        f"Rozmiar indeksu JSON ustabilizowany na {new_len_index_json_bytes} bajtów."
+                        "Rozmiar indeksu JSON ustabilizowany na %s bajtów.",
+                        new_len_index_json_bytes,
                     )
                     break
                 len_index_json_bytes = new_len_index_json_bytes
@@ -400,7 +412,9 @@ class ModelCreator(QWidget):
             # Sprawdzenie, czy po finalnym utworzeniu długość się nie zmieniła (nie powinna, jeśli indent jest stały)
             if len(final_index_json_bytes) != len_index_json_bytes:
                 logger.error(
-                    f"Niespójność! Ostateczny rozmiar indeksu JSON ({len(final_index_json_bytes)}) różni się od ustabilizowanego ({len_index_json_bytes})."
+                    "Niespójność! Ostateczny rozmiar indeksu JSON (%s) różni się od ustabilizowanego (%s).",
+                    len(final_index_json_bytes),
+                    len_index_json_bytes,
                 )
                 # Można by tu dodać ponowną próbę lub zgłosić błąd
                 # Na razie zakładamy, że to się nie zdarzy przy stałym indent.
@@ -409,110 +423,94 @@ class ModelCreator(QWidget):
                 )  # Użyj aktualnej długości
 
             logger.info(
-                f"Ostateczny indeks JSON przygotowany (rozmiar: {len_index_json_bytes} bajtów)."
-            )
-            logger.debug(
-                f"Ostateczny indeks JSON: {final_index_json_bytes.decode('utf-8', errors='replace')[:500]}..."
+                "Ostateczny indeks JSON przygotowany (rozmiar: %s bajtów).",
+                len_index_json_bytes,
             )
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "Ostateczny indeks JSON: %s...",
+                    final_index_json_bytes.decode("utf-8", errors="replace")[:500],
+                )
 
             # 3. Przygotuj 2-bajtowy prefiks długości dla indeksu JSON
             # Używamy formatu '>H' (big-endian unsigned short)
             packed_index_len_bytes = struct.pack(">H", len_index_json_bytes)
             logger.debug(
-                f"Przygotowano 2-bajtowy prefiks długości indeksu: {packed_index_len_bytes.hex()} (wartość: {len_index_json_bytes})."
+                "Przygotowano 2-bajtowy prefiks długości indeksu: %s (wartość: %s).",
+                packed_index_len_bytes.hex(),
+                len_index_json_bytes,
             )
 
             # 4. Zapisz plik .model w poprawnej kolejności
-            logger.debug(f"Rozpoczynanie zapisu do pliku: {self.output_path}")
-            with open(self.output_path, "wb") as f_out:
-                # a. Zapisz 2-bajtowy prefiks długości indeksu
-                f_out.write(packed_index_len_bytes)
-                logger.debug("Zapisano 2-bajtowy prefiks długości indeksu.")
+            metrics_op.phase("write")
+            logger.debug("Rozpoczynanie zapisu do pliku: %s", self.output_path)
+            total_size = (
+                len(packed_index_len_bytes)
+                + len_index_json_bytes
+                + preview_size
+                + info_size
+                + archive_size
+            )
+            # Zapis do pliku tymczasowego (zarezerwowanego na całość) i podmiana
+            # po fsync - awaria nie zostawi uciętego pliku .model.
+            # 5. Weryfikacja zapisu (model_writecheck): hashe sekcji liczone przy
+            # zapisie, a z dysku (z pominięciem pamięci podręcznej) czytany jest
+            # tylko nagłówek i próbki danych - przed podmianą pliku, więc błąd
+            # zostawia poprzedni plik .model na miejscu.
+            def verify_after_write(tmp_path):
+                metrics_op.phase("verify_after_write")
+                logger.debug("Rozpoczęcie weryfikacji po zapisie...")
+                written.verify(tmp_path)
 
-                # b. Zapisz zakodowany indeks JSON
-                f_out.write(final_index_json_bytes)
-                logger.debug(f"Zapisano indeks JSON ({len_index_json_bytes} bajtów).")
+            with model_atomic.AtomicOutput(
+                self.output_path, total_size, verify=verify_after_write
+            ) as output:
+                written = model_writecheck.WrittenSections(output.file)
+                # a, b. Zapisz 2-bajtowy prefiks długości indeksu i indeks JSON
+                written.write("index", packed_index_len_bytes + final_index_json_bytes)
+                logger.debug("Zapisano indeks JSON (%s bajtów).", len_index_json_bytes)
 
                 # c. Zapisz preview.jpg
-                f_out.write(preview_data)
-                logger.debug(f"Zapisano preview.jpg ({preview_size} bajtów).")
+                written.write("preview", preview_data)
+                logger.debug("Zapisano preview.jpg (%s bajtów).", preview_size)
 
                 # d. Zapisz info.json
-                f_out.write(info_data)
-                logger.debug(f"Zapisano info.json ({info_size} bajtów).")
+                written.write("info", info_data)
+                logger.debug("Zapisano info.json (%s bajtów).", info_size)
 
                 # e. Zapisz archiwum
-                f_out.write(archive_data)
+                written.write("archive", archive_data)
                 logger.debug(
-                    f"Zapisano archiwum {archive_filename} ({archive_size} bajtów)."
+                    "Zapisano archiwum %s (%s bajtów).",
+                    archive_filename,
+                    archive_size,
                 )
 
             logger.info("Zakończono zapis wszystkich komponentów do pliku .model.")
-
-            # 5. Weryfikacja zapisu (opcjonalna, ale zalecana)
-            # Można tutaj dodać logikę odczytu i weryfikacji pliku,
-            # podobną do tej w `verifyModelFile` lub `read_json_index_from_model_file`,
-            # aby upewnić się, że plik został zapisany poprawnie.
-            # Na przykład, odczytaj pierwsze 2 bajty, potem indeks, sprawdź offsety.
-            try:
-                logger.debug("Rozpoczęcie weryfikacji po zapisie...")
-                # Użyjemy istniejącej funkcji read_json_index_from_model_file do weryfikacji
-                # Należy ją dostosować, aby była metodą klasy lub przekazać 'self' jeśli to konieczne
-                # Dla uproszczenia zakładamy, że jest dostępna jako funkcja statyczna/globalna
-                # lub zaimportowana poprawnie.
-                # Jeśli read_json_index_from_model_file jest metodą, to:
-                # read_index = self.read_json_index_from_model_file(self.output_path)
-                # Jeśli jest funkcją globalną:
-                read_index = self.read_json_index_from_model_file(
-                    self.output_path
-                )  # ZMIANA TUTAJ
-
-                if read_index:
-                    logger.info(
-                        f"WERYFIKACJA PO ZAPISIE: Pomyślnie odczytano indeks: {read_index}"
-                    )
-                    # Można dodać więcej asercji, np. porównanie z `final_index_data`
-                    if read_index == final_index_data:
-                        logger.info(
-                            "WERYFIKACJA PO ZAPISIE: Odczytany indeks zgadza się z zapisanym."
-                        )
-                    else:
-                        logger.warning(
-                            "WERYFIKACJA PO ZAPISIE: Odczytany indeks RÓŻNI SIĘ od zapisanego."
-                        )
-                        logger.warning(f"Oczekiwano: {final_index_data}")
-                        logger.warning(f"Odczytano: {read_index}")
-                else:
-                    logger.error(
-                        "WERYFIKACJA PO ZAPISIE: Nie udało się odczytać indeksu z nowo utworzonego pliku."
-                    )
-                    # To jest krytyczny błąd, jeśli wystąpi
-                    raise Exception(
-                        "Weryfikacja po zapisie nie powiodła się: nie można odczytać indeksu."
-                    )
-
-            except Exception as e_verify_after_write:
-                logger.error(
-                    f"Błąd podczas weryfikacji pliku po zapisie: {e_verify_after_write}",
-                    exc_info=True,
-                )
-                # Można zdecydować, czy to ma być błąd krytyczny dla użytkownika
-                QMessageBox.warning(
-                    self,
-                    "Ostrzeżenie",
-                    f"Wystąpił błąd podczas weryfikacji pliku po zapisie: {e_verify_after_write}. Plik mógł zostać utworzony, ale jego poprawność nie jest gwarantowana.",
-                )
-                # Nie przerywamy, plik został zapisany, ale z ostrzeżeniem.
+            metrics_op.add_bytes(total_size)
+            check = written.result
+            logger.info(
+                "WERYFIKACJA PO ZAPISIE: zgodne %s próbek (%s B z dysku, "
+                "pominięcie pamięci podręcznej: %s).",
+                check["samples"],
+                check["bytes_read"],
+                check["cache_dropped"] or check["direct"],
+            )
+            logger.debug("Hashe sekcji: %s", check["section_hashes"])
 
             # Usunięto blok 'try...except' dotyczący iteracyjnej aktualizacji indeksu,
             # ponieważ indeks jest teraz finalizowany przed głównym zapisem.
             # Usunięto również kod weryfikacyjny, który był w tym bloku,
             # ponieważ nowa weryfikacja jest powyżej.
 
+            created = True
+            metrics_op.finish()  # Przed oknem z wynikiem
             end_time = time.time()
             elapsed_time = end_time - start_time
             logger.info(
-                f"Plik .model '{self.output_path}' utworzony pomyślnie w {elapsed_time:.4f} s."
+                "Plik .model '%s' utworzony pomyślnie w %.4f s.",
+                self.output_path,
+                elapsed_time,
             )
             self.status_label.setText("Plik .model utworzony pomyślnie!")
             self.time_label.setText(f"Czas utworzenia: {elapsed_time:.4f} s")
@@ -524,7 +522,8 @@ class ModelCreator(QWidget):
 
         except AssertionError as ae:
             logger.critical(
-                f"Błąd krytyczny podczas przygotowywania indeksu: {ae}", exc_info=True
+                "Błąd krytyczny podczas przygotowywania indeksu: %s",
+                ae, exc_info=True
             )
             self.status_label.setText(f"Błąd krytyczny: {ae}")
             self.time_label.setText("")
@@ -541,7 +540,9 @@ class ModelCreator(QWidget):
                 f"Czas próby: {elapsed_time:.4f} s" if elapsed_time > 0 else ""
             )
             logger.error(
-                f"Wystąpił błąd podczas tworzenia pliku .model '{self.output_path}': {e}",
+                "Wystąpił błąd podczas tworzenia pliku .model '%s': %s",
+                self.output_path,
+                e,
                 exc_info=True,
             )
             QMessageBox.critical(
@@ -549,13 +550,17 @@ class ModelCreator(QWidget):
                 "Błąd",
                 f"Wystąpił błąd podczas tworzenia pliku .model:\\n{e}\\nCzas próby: {elapsed_time:.4f} s",
             )
+        finally:
+            metrics_op.finish(failed=not created)
 
+    @model_profile.profiled("verify")
     def verifyModelFile(self):
         model_file_to_verify = (
             self.output_path_edit.text()
         )  # Użyj ścieżki z pola edycji
         logger.info(
-            f"Rozpoczęto weryfikację pliku .model: {model_file_to_verify if model_file_to_verify else 'Nie wybrano pliku'}"
+            "Rozpoczęto weryfikację pliku .model: %s",
+            model_file_to_verify if model_file_to_verify else 'Nie wybrano pliku',
         )
         if not model_file_to_verify:
             logger.debug(
@@ -568,12 +573,14 @@ class ModelCreator(QWidget):
                 logger.debug("Anulowano wybór pliku .model do weryfikacji.")
                 return  # Użytkownik anulował
             logger.info(
-                f"Wybrano plik .model do weryfikacji przez dialog: {model_file_to_verify}"
+                "Wybrano plik .model do weryfikacji przez dialog: %s",
+                model_file_to_verify,
             )
 
         if not os.path.exists(model_file_to_verify):
             logger.error(
-                f"Plik .model do weryfikacji '{model_file_to_verify}' nie istnieje."
+                "Plik .model do weryfikacji '%s' nie istnieje.",
+                model_file_to_verify,
             )
             QMessageBox.critical(
                 self, "Błąd", f"Plik '{model_file_to_verify}' nie istnieje."
@@ -583,14 +590,18 @@ class ModelCreator(QWidget):
         start_time = time.time()
         self.status_label.setText("Weryfikacja pliku .model...")
         self.time_label.setText("")
+        metrics_op = model_metrics.start_operation("verify", model_file_to_verify)
+        verified = False
 
         try:
             # Użyj ujednoliconej metody do odczytu indeksu
+            metrics_op.phase("read_index")
             index_data = self.read_json_index_from_model_file(model_file_to_verify)
 
             if not index_data:
                 logger.error(
-                    f"VERIFY: Nie udało się odczytać/sparsować indeksu JSON z pliku '{model_file_to_verify}' przy użyciu self.read_json_index_from_model_file."
+                    "VERIFY: Nie udało się odczytać/sparsować indeksu JSON z pliku '%s' przy użyciu self.read_json_index_from_model_file.",
+                    model_file_to_verify,
                 )
                 self.status_label.setText(
                     "Weryfikacja nieudana: Nie udało się odczytać/sparsować indeksu JSON."
@@ -602,7 +613,7 @@ class ModelCreator(QWidget):
                 )
                 return
 
-            logger.info(f"VERIFY: Pomyślnie odczytano indeks JSON: {index_data}")
+            logger.info("VERIFY: Pomyślnie odczytano indeks JSON: %s", index_data)
 
             # Po odczytaniu indeksu, potrzebujemy długości samego bloku indeksu JSON,
             # aby poprawnie obliczyć/zweryfikować offsety, jeśli są one względem końca nagłówka.
@@ -614,15 +625,23 @@ class ModelCreator(QWidget):
             # --- Początek bloku do uzyskania len_header_bytes ---
             len_header_bytes = 0
             with open(model_file_to_verify, "rb") as f_temp_len:
-                packed_len = f_temp_len.read(2)
-                if len(packed_len) < 2:
-                    raise ValueError(
-                        "Nie można odczytać długości nagłówka (za krótki plik)."
-                    )
-                actual_index_len = struct.unpack(">H", packed_len)[0]
-                len_header_bytes = 2 + actual_index_len
+                head = f_temp_len.read(len(model_format.METAFIRST_MAGIC))
+                if head == model_format.METAFIRST_MAGIC:
+                    # Metafirst: nagłówek to cały blok metadanych
+                    len_header_bytes = model_format.read_metafirst(
+                        f_temp_len
+                    ).index.header_len
+                else:
+                    packed_len = head[:2]
+                    if len(packed_len) < 2:
+                        raise ValueError(
+                            "Nie można odczytać długości nagłówka (za krótki plik)."
+                        )
+                    actual_index_len = struct.unpack(">H", packed_len)[0]
+                    len_header_bytes = 2 + actual_index_len
             logger.debug(
-                f"VERIFY: Obliczona długość nagłówka (prefix+JSON) to: {len_header_bytes}"
+                "VERIFY: Obliczona długość nagłówka (prefix+JSON) to: %s",
+                len_header_bytes,
             )
             # --- Koniec bloku do uzyskania len_header_bytes ---
 
@@ -632,16 +651,12 @@ class ModelCreator(QWidget):
 
             # 2. Sprawdź, czy indeks zawiera wymagane klucze
             logger.debug("VERIFY: Weryfikacja struktury odczytanego indeksu JSON.")
-            if not (
-                all(k in index_data for k in ["preview", "info", "archive"])
-                and all(k in index_data["preview"] for k in ["offset", "size"])
-                and all(k in index_data["info"] for k in ["offset", "size"])
-                and all(
-                    k in index_data["archive"] for k in ["offset", "size", "filename"]
-                )
-            ):
+            try:
+                model_index = model_format.ModelIndex.from_dict(index_data, len_header_bytes)
+            except model_format.ModelFormatError as e:
                 logger.error(
-                    "VERIFY: Indeks JSON nie zawiera wszystkich wymaganych informacji lub ma niepoprawną strukturę."
+                    "VERIFY: Indeks JSON ma niepoprawną strukturę: %s",
+                    e,
                 )
                 self.status_label.setText(
                     "Weryfikacja nieudana: Indeks nie zawiera wszystkich wymaganych informacji lub ma niepoprawną strukturę."
@@ -649,23 +664,35 @@ class ModelCreator(QWidget):
                 QMessageBox.critical(
                     self,
                     "Błąd",
-                    f"Indeks w pliku '{model_file_to_verify}' nie zawiera wszystkich wymaganych informacji lub ma niepoprawną strukturę.",
+                    f"Indeks w pliku '{model_file_to_verify}' ma niepoprawną strukturę:\n{e}",
                 )
                 return
 
             # Otwieramy plik do odczytu danych binarnych na podstawie offsetów
             with open(model_file_to_verify, "rb") as f_in:
+                # Rozmiary z indeksu są niezaufane - porównaj je z rzeczywistym
+                # rozmiarem pliku, zanim cokolwiek zostanie zaalokowane
+                file_size = os.fstat(f_in.fileno()).st_size
+                model_format.check_index_bounds(index_data, file_size)
+
                 # 3. Odczytaj preview.jpg
-                preview_offset = index_data["preview"]["offset"]
-                preview_size = index_data["preview"]["size"]
+                metrics_op.phase("read_preview")
+                preview_offset = model_index.preview.offset
+                preview_size = model_index.preview.size
                 logger.debug(
-                    f"VERIFY: Odczytywanie preview.jpg: offset={preview_offset}, size={preview_size}"
+                    "VERIFY: Odczytywanie preview.jpg: offset=%s, size=%s",
+                    preview_offset,
+                    preview_size,
                 )
-                f_in.seek(preview_offset)
-                preview_data = f_in.read(preview_size)
+                preview_data = model_format.read_section_bounded(
+                    f_in, index_data, "preview", file_size
+                )
+                metrics_op.add_bytes(len(preview_data))
                 if len(preview_data) != preview_size:
                     logger.error(
-                        f"VERIFY: Błąd odczytu preview.jpg: oczekiwano {preview_size}, odczytano {len(preview_data)}."
+                        "VERIFY: Błąd odczytu preview.jpg: oczekiwano %s, odczytano %s.",
+                        preview_size,
+                        len(preview_data),
                     )
                     self.status_label.setText(
                         "Weryfikacja nieudana: Błąd podczas odczytu preview.jpg."
@@ -678,16 +705,23 @@ class ModelCreator(QWidget):
                     return
 
                 # 4. Odczytaj info.json
-                info_offset = index_data["info"]["offset"]
-                info_size = index_data["info"]["size"]
+                metrics_op.phase("read_info")
+                info_offset = model_index.info.offset
+                info_size = model_index.info.size
                 logger.debug(
-                    f"VERIFY: Odczytywanie info.json: offset={info_offset}, size={info_size}"
+                    "VERIFY: Odczytywanie info.json: offset=%s, size=%s",
+                    info_offset,
+                    info_size,
+                )
+                info_data_bytes = model_format.read_section_bounded(
+                    f_in, index_data, "info", file_size
                 )
-                f_in.seek(info_offset)
-                info_data_bytes = f_in.read(info_size)
+                metrics_op.add_bytes(len(info_data_bytes))
                 if len(info_data_bytes) != info_size:
                     logger.error(
-                        f"VERIFY: Błąd odczytu info.json: oczekiwano {info_size}, odczytano {len(info_data_bytes)}."
+                        "VERIFY: Błąd odczytu info.json: oczekiwano %s, odczytano %s.",
+                        info_size,
+                        len(info_data_bytes),
                     )
                     self.status_label.setText(
                         "Weryfikacja nieudana: Błąd podczas odczytu danych dla info.json."
@@ -706,58 +740,76 @@ class ModelCreator(QWidget):
                     return
 
                 # 5. Odczytaj archiwum (częściowa weryfikacja)
-                archive_filename = index_data["archive"]["filename"]
-                archive_offset = index_data["archive"]["offset"]
-                archive_size = index_data["archive"]["size"]
+                metrics_op.phase("check_archive")
+                archive_filename = model_index.archive.filename
+                archive_offset = model_index.archive.offset
+                archive_size = model_index.archive.size
                 logger.debug(
-                    f"VERIFY: Odczytywanie archiwum '{archive_filename}': offset={archive_offset}, size={archive_size}"
+                    "VERIFY: Odczytywanie archiwum '%s': offset=%s, size=%s",
+                    archive_filename,
+                    archive_offset,
+                    archive_size,
                 )
-                f_in.seek(archive_offset)
-                archive_data = f_in.read(archive_size)
-                if len(archive_data) != archive_size:
-                    logger.error(
-                        f"VERIFY: Błąd odczytu archiwum '{archive_filename}': oczekiwano {archive_size}, odczytano {len(archive_data)}."
-                    )
-                    self.status_label.setText(
-                        f"Weryfikacja nieudana: Błąd podczas odczytu pliku archiwum {archive_filename}."
-                    )
-                    QMessageBox.critical(
-                        self,
-                        "Błąd",
-                        f"Błąd podczas odczytu pliku archiwum '{archive_filename}' z pliku '{model_file_to_verify}'.",
-                    )
-                    return
+                # Archiwum nie jest wczytywane do pamięci: zipfile/rarfile dostają
+                # widok na zakres pliku (pread), który czyta tylko potrzebne fragmenty
 
-                # Opcjonalnie: Spróbuj otworzyć archiwum w pamięci jako ZIP/RAR
+                # Opcjonalnie: Spróbuj otworzyć archiwum jako ZIP/RAR
                 try:
                     import io
 
-                    archive_buffer = io.BytesIO(archive_data)
+                    archive_buffer = io.BufferedReader(
+                        model_format.SectionFile(
+                            f_in.fileno(), archive_offset, archive_size
+                        )
+                    )
                     logger.debug(
-                        f"VERIFY: Próba weryfikacji archiwum '{archive_filename}' jako ZIP."
+                        "VERIFY: Próba weryfikacji archiwum '%s' jako ZIP.",
+                        archive_filename,
                     )
                     with zipfile.ZipFile(archive_buffer, "r") as temp_zip:
                         temp_zip.namelist()
                         logger.debug(
-                            f"VERIFY: Archiwum '{archive_filename}' pomyślnie zweryfikowane jako ZIP."
+                            "VERIFY: Archiwum '%s' pomyślnie zweryfikowane jako ZIP.",
+                            archive_filename,
                         )
                 except zipfile.BadZipFile:
                     logger.warning(
-                        f"VERIFY: Archiwum '{archive_filename}' nie jest prawidłowym plikiem ZIP. Próba jako RAR."
+                        "VERIFY: Archiwum '%s' nie jest prawidłowym plikiem ZIP. Próba jako RAR.",
+                        archive_filename,
                     )
+                    # rarfile (pip install rarfile + unrar) ładowany dopiero, gdy
+                    # archiwum nie jest ZIP - szybszy start aplikacji
+                    try:
+                        import rarfile
+                    except ImportError:
+                        logger.error(
+                            "VERIFY: Brak modułu rarfile - nie można sprawdzić archiwum RAR."
+                        )
+                        self.status_label.setText(
+                            "Weryfikacja nieudana: brak modułu rarfile (pip install rarfile)."
+                        )
+                        QMessageBox.critical(
+                            self,
+                            "Błąd",
+                            "Archiwum nie jest ZIP, a moduł rarfile nie jest zainstalowany.",
+                        )
+                        return
                     try:
                         archive_buffer.seek(0)  # Wróć na początek bufora dla RAR
                         logger.debug(
-                            f"VERIFY: Próba weryfikacji archiwum '{archive_filename}' jako RAR."
+                            "VERIFY: Próba weryfikacji archiwum '%s' jako RAR.",
+                            archive_filename,
                         )
                         with rarfile.RarFile(archive_buffer, "r") as temp_rar:
                             temp_rar.namelist()
                             logger.debug(
-                                f"VERIFY: Archiwum '{archive_filename}' pomyślnie zweryfikowane jako RAR."
+                                "VERIFY: Archiwum '%s' pomyślnie zweryfikowane jako RAR.",
+                                archive_filename,
                             )
                     except rarfile.NotRarFile:
                         logger.error(
-                            f"VERIFY: Plik archiwum '{archive_filename}' nie jest prawidłowym ZIP ani RAR.",
+                            "VERIFY: Plik archiwum '%s' nie jest prawidłowym ZIP ani RAR.",
+                            archive_filename,
                             exc_info=True,
                         )
                         self.status_label.setText(
@@ -771,7 +823,9 @@ class ModelCreator(QWidget):
                         return
                     except Exception as e:
                         logger.error(
-                            f"Błąd podczas otwierania archiwum RAR '{archive_filename}': {e}",
+                            "Błąd podczas otwierania archiwum RAR '%s': %s",
+                            archive_filename,
+                            e,
                             exc_info=True,
                         )
                         self.status_label.setText(
@@ -785,7 +839,9 @@ class ModelCreator(QWidget):
                         return
                 except Exception as e:
                     logger.error(
-                        f"Błąd podczas otwierania archiwum ZIP '{archive_filename}': {e}",
+                        "Błąd podczas otwierania archiwum ZIP '%s': %s",
+                        archive_filename,
+                        e,
                         exc_info=True,
                     )
                     self.status_label.setText(
@@ -798,6 +854,9 @@ class ModelCreator(QWidget):
                     )
                     return
 
+                metrics_op.add_bytes(archive_buffer.raw.bytes_read)
+                verified = True
+                metrics_op.finish()  # Przed oknem z wynikiem
                 end_time = time.time()
                 elapsed_time = end_time - start_time
 
@@ -814,7 +873,9 @@ class ModelCreator(QWidget):
                     f"Czas weryfikacji: {elapsed_time:.4f} s"
                 )
                 logger.info(
-                    f"Weryfikacja pliku .model '{model_file_to_verify}' zakończona pomyślnie w {elapsed_time:.4f} s."
+                    "Weryfikacja pliku .model '%s' zakończona pomyślnie w %.4f s.",
+                    model_file_to_verify,
+                    elapsed_time,
                 )
                 self.status_label.setText(
                     "Weryfikacja pliku .model zakończona pomyślnie!"
@@ -828,7 +889,9 @@ class ModelCreator(QWidget):
 
         except ValueError as ve:  # Dla błędów parsowania indeksu lub struktury
             logger.error(
-                f"Błąd weryfikacji pliku .model '{model_file_to_verify}': {ve}",
+                "Błąd weryfikacji pliku .model '%s': %s",
+                model_file_to_verify,
+                ve,
                 exc_info=True,
             )
             self.status_label.setText(f"Weryfikacja nieudana: {ve}")
@@ -846,7 +909,9 @@ class ModelCreator(QWidget):
                 f"Czas próby: {elapsed_time:.4f} s" if elapsed_time > 0 else ""
             )
             logger.error(
-                f"Nieoczekiwany błąd podczas weryfikacji pliku .model '{model_file_to_verify}': {e}",
+                "Nieoczekiwany błąd podczas weryfikacji pliku .model '%s': %s",
+                model_file_to_verify,
+                e,
                 exc_info=True,
             )
             QMessageBox.critical(
@@ -854,11 +919,15 @@ class ModelCreator(QWidget):
                 "Błąd",
                 f"Wystąpił nieoczekiwany błąd podczas weryfikacji pliku .model ('{model_file_to_verify}'):\\n{e}\\nCzas próby: {elapsed_time:.4f} s",
             )
+        finally:
+            metrics_op.finish(failed=not verified)
 
+    @model_profile.profiled("load_info")
     def loadAndDisplayInfoFromModel(self):
         model_path = self.output_path_edit.text()
         logger.info(
-            f"Rozpoczęto wczytywanie info.json z pliku .model: {model_path if model_path else 'Nie wybrano pliku'}"
+            "Rozpoczęto wczytywanie info.json z pliku .model: %s",
+            model_path if model_path else 'Nie wybrano pliku',
         )
         if not model_path:  # Jeśli pole jest puste, poproś o wybór pliku
             logger.debug(
@@ -870,10 +939,10 @@ class ModelCreator(QWidget):
             if not model_path:
                 logger.debug("Anulowano wybór pliku .model do wczytania.")
                 return  # Użytkownik anulował
-            logger.info(f"Wybrano plik .model do wczytania przez dialog: {model_path}")
+            logger.info("Wybrano plik .model do wczytania przez dialog: %s", model_path)
 
         if not os.path.exists(model_path):
-            logger.error(f"Plik .model do wczytania '{model_path}' nie istnieje.")
+            logger.error("Plik .model do wczytania '%s' nie istnieje.", model_path)
             QMessageBox.critical(self, "Błąd", f"Plik '{model_path}' nie istnieje.")
             return
 
@@ -882,110 +951,77 @@ class ModelCreator(QWidget):
         )
         self.time_label.setText("")
         start_time = time.time()
+        metrics_op = model_metrics.start_operation("load_info", model_path)
+        loaded = False
 
         try:
-            # Użyj ujednoliconej metody do odczytu indeksu
-            index_data = self.read_json_index_from_model_file(model_path)
-
-            if not index_data:
-                logger.error(
-                    f"LOAD_INFO: Nie udało się odczytać/sparsować indeksu JSON z pliku '{model_path}' przy użyciu self.read_json_index_from_model_file."
-                )
-                raise ValueError(
-                    "Nie udało się odczytać/sparsować indeksu JSON z początku pliku."
-                )
+            metrics_op.phase("read_index")
+            info_data_bytes = self._read_info_bytes(model_path, metrics_op)
 
-            logger.info(f"LOAD_INFO: Pomyślnie odczytano indeks JSON: {index_data}")
+            # 3. Zweryfikuj i sparsuj zawartość info.json
+            logger.debug(
+                "LOAD_INFO: Rozpoczęcie weryfikacji i ekstrakcji wczytanych danych info.json."
+            )
+            metrics_op.phase("parse_info")
+            verified_info_json = self._verify_and_extract_info_json(
+                info_data_bytes, model_path
+            )
 
-            # Sprawdź podstawową strukturę indeksu
-            logger.debug("LOAD_INFO: Weryfikacja struktury odczytanego indeksu JSON.")
-            if not (
-                all(k in index_data for k in ["preview", "info", "archive"])
-                and all(k_comp in index_data["info"] for k_comp in ["offset", "size"])
-            ):
-                logger.error(
-                    "LOAD_INFO: Indeks JSON nie zawiera wymaganych informacji o sekcji 'info' lub ma niepoprawną strukturę."
+            if verified_info_json:
+                # Pomiar kończy się przed oknem z wynikiem (czas użytkownika)
+                loaded = True
+                metrics_op.finish()
+                end_time = time.time()
+                elapsed_time = end_time - start_time
+                logger.info(
+                    "Dane info.json z '%s' wczytane i zweryfikowane pomyślnie w %.4f s.",
+                    model_path,
+                    elapsed_time,
                 )
-                raise ValueError(
-                    "Indeks nie zawiera wymaganych informacji o sekcji 'info' lub ma niepoprawną strukturę."
+                self.status_label.setText(
+                    "Dane info.json wczytane i zweryfikowane pomyślnie."
                 )
+                self.time_label.setText(f"Czas wczytywania: {elapsed_time:.4f} s")
 
-            # Otwieramy plik do odczytu danych binarnych na podstawie offsetów
-            with open(model_path, "rb") as f_in:
-                # 2. Wyodrębnij dane info.json na podstawie indeksu
-                info_offset = index_data["info"]["offset"]
-                info_size = index_data["info"]["size"]
-                logger.debug(
-                    f"LOAD_INFO: Odczytywanie danych info.json: offset={info_offset}, size={info_size}."
+                # Wyświetl zawartość info.json
+                pretty_info = json.dumps(
+                    verified_info_json, indent=4, ensure_ascii=False
                 )
 
-                f_in.seek(info_offset)
-                info_data_bytes = f_in.read(info_size)
-
-                if len(info_data_bytes) != info_size:
-                    logger.error(
-                        f"LOAD_INFO: Błąd odczytu sekcji info.json: oczekiwano {info_size}, odczytano {len(info_data_bytes)}."
-                    )
-                    raise ValueError(
-                        f"Błąd odczytu sekcji info.json: oczekiwano {info_size} bajtów, odczytano {len(info_data_bytes)}."
-                    )
-
-                # 3. Zweryfikuj i sparsuj zawartość info.json
-                logger.debug(
-                    "LOAD_INFO: Rozpoczęcie weryfikacji i ekstrakcji wczytanych danych info.json."
+                # Użyj QMessageBox do wyświetlenia, można dostosować rozmiar jeśli potrzeba
+                msg_box = QMessageBox(self)
+                msg_box.setWindowTitle(
+                    f"Zawartość info.json z {os.path.basename(model_path)}"
                 )
-                verified_info_json = self._verify_and_extract_info_json(
-                    info_data_bytes, model_path
+                msg_box.setTextFormat(
+                    Qt.TextFormat.PlainText
+                )  # Aby poprawnie wyświetlić formatowanie JSON
+                msg_box.setText(pretty_info)
+                msg_box.setStandardButtons(QMessageBox.StandardButton.Ok)
+                # msg_box.setStyleSheet("QTextEdit{min-width: 500px; min-height: 300px;}") # Opcjonalne stylowanie
+                msg_box.exec()
+
+                # Możesz zwrócić te dane lub zapisać w instancji klasy, jeśli potrzebne gdzie indziej
+                # self.loaded_model_info = verified_info_json
+                return verified_info_json
+            else:
+                logger.warning(
+                    "Weryfikacja danych info.json z pliku '%s' nie powiodła się.",
+                    model_path,
                 )
-
-                if verified_info_json:
-                    end_time = time.time()
-                    elapsed_time = end_time - start_time
-                    logger.info(
-                        f"Dane info.json z '{model_path}' wczytane i zweryfikowane pomyślnie w {elapsed_time:.4f} s."
-                    )
-                    self.status_label.setText(
-                        "Dane info.json wczytane i zweryfikowane pomyślnie."
-                    )
-                    self.time_label.setText(f"Czas wczytywania: {elapsed_time:.4f} s")
-
-                    # Wyświetl zawartość info.json
-                    pretty_info = json.dumps(
-                        verified_info_json, indent=4, ensure_ascii=False
-                    )
-
-                    # Użyj QMessageBox do wyświetlenia, można dostosować rozmiar jeśli potrzeba
-                    msg_box = QMessageBox(self)
-                    msg_box.setWindowTitle(
-                        f"Zawartość info.json z {os.path.basename(model_path)}"
-                    )
-                    msg_box.setTextFormat(
-                        Qt.TextFormat.PlainText
-                    )  # Aby poprawnie wyświetlić formatowanie JSON
-                    msg_box.setText(pretty_info)
-                    msg_box.setStandardButtons(QMessageBox.StandardButton.Ok)
-                    # msg_box.setStyleSheet("QTextEdit{min-width: 500px; min-height: 300px;}") # Opcjonalne stylowanie
-                    msg_box.exec()
-
-                    # Możesz zwrócić te dane lub zapisać w instancji klasy, jeśli potrzebne gdzie indziej
-                    # self.loaded_model_info = verified_info_json
-                    return verified_info_json
-                else:
-                    logger.warning(
-                        f"Weryfikacja danych info.json z pliku '{model_path}' nie powiodła się."
-                    )
-                    # _verify_and_extract_info_json już wyświetlił błąd
-                    self.status_label.setText(
-                        "Weryfikacja danych info.json nie powiodła się."
-                    )
-                    self.time_label.setText(
-                        ""  # Reset czasu, bo operacja nie zakończyła się pełnym sukcesem
-                    )
-                    return None
+                # _verify_and_extract_info_json już wyświetlił błąd
+                self.status_label.setText(
+                    "Weryfikacja danych info.json nie powiodła się."
+                )
+                self.time_label.setText(
+                    ""  # Reset czasu, bo operacja nie zakończyła się pełnym sukcesem
+                )
+                return None
 
         except FileNotFoundError:
             logger.error(
-                f"Plik .model '{model_path}' nie został znaleziony podczas próby wczytania info.",
+                "Plik .model '%s' nie został znaleziony podczas próby wczytania info.",
+                model_path,
                 exc_info=True,
             )
             self.status_label.setText(
@@ -999,7 +1035,9 @@ class ModelCreator(QWidget):
             ValueError
         ) as ve:  # Dla błędów parsowania indeksu, struktury, odczytu sekcji
             logger.error(
-                f"Błąd wczytywania pliku .model '{model_path}': {ve}", exc_info=True
+                "Błąd wczytywania pliku .model '%s': %s",
+                model_path,
+                ve, exc_info=True
             )
             self.status_label.setText(f"Błąd wczytywania pliku .model: {ve}")
             self.time_label.setText("")
@@ -1016,7 +1054,9 @@ class ModelCreator(QWidget):
                 f"Czas próby: {elapsed_time:.4f} s" if elapsed_time > 0 else ""
             )
             logger.error(
-                f"Nieoczekiwany błąd podczas wczytania pliku .model '{model_path}': {e}",
+                "Nieoczekiwany błąd podczas wczytania pliku .model '%s': %s",
+                model_path,
+                e,
                 exc_info=True,
             )
             QMessageBox.critical(
@@ -1024,73 +1064,176 @@ class ModelCreator(QWidget):
                 "Błąd",
                 f"Wystąpił nieoczekiwany błąd podczas wczytania pliku .model ('{model_path}'):\\n{e}",
             )
+        finally:
+            metrics_op.finish(failed=not loaded)
 
         logger.debug(
             "Zakończono próbę wczytania info.json, zwracanie None z powodu błędu."
         )
         return None
 
+    def _read_info_bytes(self, model_path, metrics_op):
+        # Pierwsze METAFIRST_BLOCK_SIZE bajtów jednym odczytem: w układzie metafirst
+        # to już wszystkie metadane (indeks + info.json), w układzie z indeksem -
+        # prefiks i indeks JSON, więc zostaje tylko odczyt samego info.json
+        with open(model_path, "rb") as f_in:
+            file_size = os.fstat(f_in.fileno()).st_size
+            head_block = f_in.read(model_format.METAFIRST_BLOCK_SIZE)
+        if head_block.startswith(model_format.METAFIRST_MAGIC):
+            header = model_format.parse_metafirst_block(head_block, file_size)
+            logger.debug(
+                "LOAD_INFO: Układ metafirst - info.json (%s bajtów) z bloku metadanych.",
+                len(header.info_bytes),
+            )
+            metrics_op.phase("read_info")
+            metrics_op.add_bytes(len(header.info_bytes))
+            return header.info_bytes
+
+        index_data = None
+        if len(head_block) >= model_format.INDEX_LEN_PREFIX_SIZE:
+            index_len = struct.unpack_from(model_format.INDEX_LEN_FORMAT, head_block)[0]
+            index_end = model_format.INDEX_LEN_PREFIX_SIZE + index_len
+            if index_end <= len(head_block):
+                try:
+                    index_data = model_format.parse_index_bytes(
+                        head_block[model_format.INDEX_LEN_PREFIX_SIZE : index_end]
+                    )
+                except model_format.ModelFormatError as e:
+                    logger.debug("LOAD_INFO: Nagłówek wymaga odzyskiwania: %s", e)
+        if index_data is None:
+            # Uszkodzony lub nietypowy nagłówek - pełna ścieżka z odzyskiwaniem indeksu
+            index_data = self.read_json_index_from_model_file(model_path)
+
+        if not index_data:
+            logger.error(
+                "LOAD_INFO: Nie udało się odczytać/sparsować indeksu JSON z pliku '%s' przy użyciu self.read_json_index_from_model_file.",
+                model_path,
+            )
+            raise ValueError(
+                "Nie udało się odczytać/sparsować indeksu JSON z początku pliku."
+            )
+
+        logger.info("LOAD_INFO: Pomyślnie odczytano indeks JSON: %s", index_data)
+
+        # Sprawdź podstawową strukturę indeksu
+        logger.debug("LOAD_INFO: Weryfikacja struktury odczytanego indeksu JSON.")
+        try:
+            model_index = model_format.ModelIndex.from_dict(index_data)
+        except model_format.ModelFormatError as e:
+            logger.error("LOAD_INFO: Indeks JSON ma niepoprawną strukturę: %s", e)
+            raise ValueError(
+                f"Indeks nie zawiera wymaganych informacji lub ma niepoprawną strukturę: {e}"
+            ) from e
+
+        # Otwieramy plik do odczytu danych binarnych na podstawie offsetów
+        with open(model_path, "rb") as f_in:
+            # 2. Wyodrębnij dane info.json na podstawie indeksu
+            info_offset = model_index.info.offset
+            info_size = model_index.info.size
+            logger.debug(
+                "LOAD_INFO: Odczytywanie danych info.json: offset=%s, size=%s.",
+                info_offset,
+                info_size,
+            )
+
+            # Walidacja rozmiaru względem fstat i budżetu pamięci przed alokacją
+            metrics_op.phase("read_info")
+            info_data_bytes = model_format.read_section_bounded(
+                f_in, index_data, "info"
+            )
+            metrics_op.add_bytes(len(info_data_bytes))
+
+            if len(info_data_bytes) != info_size:
+                logger.error(
+                    "LOAD_INFO: Błąd odczytu sekcji info.json: oczekiwano %s, odczytano %s.",
+                    info_size,
+                    len(info_data_bytes),
+                )
+                raise ValueError(
+                    f"Błąd odczytu sekcji info.json: oczekiwano {info_size} bajtów, odczytano {len(info_data_bytes)}."
+                )
+        return info_data_bytes
+
     def read_json_index_from_model_file(
         self,
         file_path,
     ):  # Jeśli to funkcja statyczna/globalna
-        logging.info(
-            f"READ_INDEX (metoda): Próba odczytu indeksu JSON z pliku: {file_path}"
+        logger.debug(
+            "READ_INDEX (metoda): Próba odczytu indeksu JSON z pliku: %s",
+            file_path,
         )
         try:
             with open(file_path, "rb") as f:
-                # Zaloguj pierwsze kilkaset bajtów, aby zobaczyć, z czym mamy do czynienia
-                f.seek(0)
-                initial_bytes = f.read(512)  # Odczytaj fragment na potrzeby diagnostyki
-                f.seek(0)  # Zresetuj wskaźnik pliku do początku
-
-                if not initial_bytes:
-                    logging.warning(
-                        f"READ_INDEX: Plik {file_path} jest pusty lub nie udało się odczytać początkowych bajtów."
-                    )
-                else:
-                    logging.info(
-                        f"READ_INDEX: Pierwsze 512 bajtów pliku {file_path} (hex): {initial_bytes.hex()}"
-                    )
-                    try:
+                # Zrzut pierwszych bajtów tylko przy włączonym DEBUG - odczyt i hex
+                # kosztują przy każdym pliku, a na poziomie INFO nikt ich nie czyta
+                if logger.isEnabledFor(logging.DEBUG):
+                    f.seek(0)
+                    initial_bytes = f.read(512)  # Odczytaj fragment na potrzeby diagnostyki
+                    f.seek(0)  # Zresetuj wskaźnik pliku do początku
+
+                    if not initial_bytes:
+                        logger.warning(
+                            "READ_INDEX: Plik %s jest pusty lub nie udało się odczytać początkowych bajtów.",
+                            file_path,
+                        )
+                    else:
+                        logger.debug(
+                            "READ_INDEX: Pierwsze 512 bajtów pliku %s (hex): %s",
+                            file_path,
+                            initial_bytes.hex(),
+                        )
                         # Ostrożnie dekoduj dla celów logowania, unikając przerwania w razie błędów
                         decoded_initial_bytes = initial_bytes.decode(
                             "utf-8", errors="replace"
                         )
-                        logging.info(
-                            f"READ_INDEX: Pierwsze 512 bajtów pliku {file_path} (jako tekst, błędy zastąpione): {decoded_initial_bytes[:200]}..."
+                        logger.debug(
+                            "READ_INDEX: Pierwsze 512 bajtów pliku %s (jako tekst, błędy zastąpione): %s...",
+                            file_path,
+                            decoded_initial_bytes[:200],
                         )  # Pokaż początek
-                    except Exception as e_decode_log:
-                        logging.error(
-                            f"READ_INDEX: Błąd podczas dekodowania początkowych bajtów na potrzeby logowania: {e_decode_log}"
+
+                # --- STRATEGIA 0: Układ metafirst (sygnatura zamiast prefiksu długości) ---
+                if f.read(len(model_format.METAFIRST_MAGIC)) == model_format.METAFIRST_MAGIC:
+                    try:
+                        header = model_format.read_metafirst(
+                            f, os.fstat(f.fileno()).st_size
+                        )
+                    except model_format.ModelFormatError as e_meta:
+                        # Odzyskiwanie po sygnaturze JSON nie dotyczy bloku metafirst
+                        logger.error(
+                            "READ_INDEX: Uszkodzony blok metadanych metafirst: %s", e_meta
                         )
+                        return None
+                    logger.debug("READ_INDEX: Układ metafirst - indeks z bloku metadanych.")
+                    return header.index.to_dict()
+                f.seek(0)
 
                 # --- STRATEGIA 1: Odczyt na podstawie 2-bajtowego prefiksu długości ---
-                logging.info(
+                logger.debug(
                     "READ_INDEX: Strategia 1: Próba odczytu z 2-bajtowym prefiksem długości."
                 )
                 packed_index_len_bytes = f.read(2)
 
                 if len(packed_index_len_bytes) < 2:
-                    logging.error(
+                    logger.error(
                         "READ_INDEX: Strategia 1: Nie udało się odczytać 2 bajtów na długość indeksu. Plik może być za krótki."
                     )
-                    # Tutaj można by spróbować innej strategii, jeśli istnieje, lub zwrócić None
-                    # Na razie zakładamy, że to główna strategia
-                    return None
+                    return self._recover_index_by_signature_scan(file_path)
 
-                logging.info(
-                    f"READ_INDEX: Strategia 1: Odczytane bajty długości: {packed_index_len_bytes.hex()}"
+                logger.debug(
+                    "READ_INDEX: Strategia 1: Odczytane bajty długości: %s",
+                    packed_index_len_bytes.hex(),
                 )
 
                 try:
                     index_len = struct.unpack(">H", packed_index_len_bytes)[0]
-                    logging.info(
-                        f"READ_INDEX: Strategia 1: Rozpakowana długość indeksu: {index_len}"
+                    logger.debug(
+                        "READ_INDEX: Strategia 1: Rozpakowana długość indeksu: %s",
+                        index_len,
                     )
 
                     if index_len == 0:
-                        logging.warning(
+                        logger.warning(
                             "READ_INDEX: Strategia 1: Długość indeksu wynosi 0. Może to być problem lub pusty indeks."
                         )
                         # Można zwrócić pusty słownik lub None, w zależności od logiki aplikacji
@@ -1099,96 +1242,151 @@ class ModelCreator(QWidget):
                     # Sprawdzenie, czy index_len nie jest absurdalnie duży (np. > 1MB, co byłoby nietypowe dla indeksu)
                     MAX_EXPECTED_INDEX_LEN = 1 * 1024 * 1024  # 1MB
                     if index_len > MAX_EXPECTED_INDEX_LEN:
-                        logging.error(
-                            f"READ_INDEX: Strategia 1: Rozpakowana długość indeksu ({index_len}) jest podejrzanie duża."
+                        logger.error(
+                            "READ_INDEX: Strategia 1: Rozpakowana długość indeksu (%s) jest podejrzanie duża.",
+                            index_len,
                         )
-                        return None  # Prawdopodobnie błąd odczytu długości
+                        # Prawdopodobnie błąd odczytu długości
+                        return self._recover_index_by_signature_scan(file_path)
 
                     json_bytes = f.read(index_len)
-                    logging.info(
-                        f"READ_INDEX: Strategia 1: Odczytano {len(json_bytes)} bajtów na zawartość JSON (oczekiwano {index_len}). Hex: {json_bytes[:256].hex()}..."
-                    )  # Loguj tylko część, jeśli długie
+                    logger.debug(
+                        "READ_INDEX: Strategia 1: Odczytano %s bajtów na zawartość JSON (oczekiwano %s).",
+                        len(json_bytes),
+                        index_len,
+                    )
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug(
+                            "READ_INDEX: Strategia 1: Hex indeksu: %s...",
+                            json_bytes[:256].hex(),
+                        )  # Loguj tylko część, jeśli długie
 
                     if len(json_bytes) < index_len:
-                        logging.error(
-                            f"READ_INDEX: Strategia 1: Oczekiwano {index_len} bajtów JSON, odczytano {len(json_bytes)}."
+                        logger.error(
+                            "READ_INDEX: Strategia 1: Oczekiwano %s bajtów JSON, odczytano %s.",
+                            index_len,
+                            len(json_bytes),
                         )
-                        return None
+                        return self._recover_index_by_signature_scan(file_path)
 
                     json_str = ""
                     try:
                         json_str = json_bytes.decode("utf-8", errors="replace")
                         # Usuń ewentualne znaki NUL na końcu, które mogłyby powstać przez 'replace' i psuć parsowanie JSON
                         json_str = json_str.rstrip("\\x00").strip()
-                        logging.info(
-                            f"READ_INDEX: Strategia 1: Zdekodowany ciąg JSON (błędy zastąpione, oczyszczony): '{json_str}'"
+                        logger.debug(
+                            "READ_INDEX: Strategia 1: Zdekodowany ciąg JSON (błędy zastąpione, oczyszczony): '%s'",
+                            json_str,
                         )
 
                         if not json_str:
-                            logging.error(
+                            logger.error(
                                 "READ_INDEX: Strategia 1: Zdekodowany ciąg JSON jest pusty po oczyszczeniu."
                             )
-                            return None
+                            return self._recover_index_by_signature_scan(file_path)
 
                         index_dict = json.loads(json_str)
-                        logging.info(
-                            f"READ_INDEX: Strategia 1: Pomyślnie sparsowano indeks JSON: {index_dict}"
+                        logger.debug(
+                            "READ_INDEX: Strategia 1: Pomyślnie sparsowano indeks JSON: %s",
+                            index_dict,
                         )
                         return index_dict
                     except json.JSONDecodeError as e_json:
-                        logging.error(
-                            f"READ_INDEX: Strategia 1: Błąd dekodowania JSON: {e_json}. Ciąg był: '{json_str}'"
+                        logger.error(
+                            "READ_INDEX: Strategia 1: Błąd dekodowania JSON: %s. Ciąg był: '%s'",
+                            e_json,
+                            json_str,
                         )
-                        logging.error(
-                            f"READ_INDEX: Strategia 1: Szczegóły błędu JSON: msg={e_json.msg}, doc={e_json.doc}, pos={e_json.pos}, lineno={e_json.lineno}, colno={e_json.colno}"
+                        logger.error(
+                            "READ_INDEX: Strategia 1: Szczegóły błędu JSON: msg=%s, doc=%s, pos=%s, lineno=%s, colno=%s",
+                            e_json.msg,
+                            e_json.doc,
+                            e_json.pos,
+                            e_json.lineno,
+                            e_json.colno,
                         )
                     except (
                         UnicodeDecodeError
                     ) as e_unicode:  # Teoretycznie obsłużone przez errors='replace'
-                        logging.error(
-                            f"READ_INDEX: Strategia 1: Błąd dekodowania Unicode: {e_unicode}. Bajty: {json_bytes.hex()}"
+                        logger.error(
+                            "READ_INDEX: Strategia 1: Błąd dekodowania Unicode: %s. Bajty: %s",
+                            e_unicode,
+                            json_bytes.hex(),
                         )
                     except Exception as e_s1_parse:
-                        logging.error(
-                            f"READ_INDEX: Strategia 1: Inny błąd podczas parsowania JSON: {e_s1_parse}. Ciąg był: '{json_str}'"
+                        logger.error(
+                            "READ_INDEX: Strategia 1: Inny błąd podczas parsowania JSON: %s. Ciąg był: '%s'",
+                            e_s1_parse,
+                            json_str,
                         )
 
                 except struct.error as e_struct:
-                    logging.error(
-                        f"READ_INDEX: Strategia 1: Błąd rozpakowania (struct.error): {e_struct}. Bajty długości: {packed_index_len_bytes.hex()}"
+                    logger.error(
+                        "READ_INDEX: Strategia 1: Błąd rozpakowania (struct.error): %s. Bajty długości: %s",
+                        e_struct,
+                        packed_index_len_bytes.hex(),
                     )
                 except Exception as e_s1_outer:
-                    logging.error(
-                        f"READ_INDEX: Strategia 1: Ogólny błąd: {e_s1_outer}",
+                    logger.error(
+                        "READ_INDEX: Strategia 1: Ogólny błąd: %s",
+                        e_s1_outer,
                         exc_info=True,
                     )
 
                 # Jeśli dotarliśmy tutaj, strategia 1 zawiodła.
-                # Można dodać logikę dla STRATEGII 2, jeśli istnieje w kodzie.
-                # logging.info("READ_INDEX: Strategia 1 nie powiodła się, próba strategii 2 (jeśli zaimplementowana)...")
-                # ... kod dla strategii 2 ...
-
-                logging.error(
-                    "READ_INDEX: Wszystkie strategie odczytu indeksu JSON zawiodły."
-                )
-                return None
+                return self._recover_index_by_signature_scan(file_path)
 
         except FileNotFoundError:
-            logging.error(f"READ_INDEX: Plik nie znaleziony: {file_path}")
+            logger.error("READ_INDEX: Plik nie znaleziony: %s", file_path)
         except Exception as e_open:
-            logging.error(
-                f"READ_INDEX: Ogólny błąd podczas otwierania/odczytu pliku {file_path}: {e_open}",
+            logger.error(
+                "READ_INDEX: Ogólny błąd podczas otwierania/odczytu pliku %s: %s",
+                file_path,
+                e_open,
                 exc_info=True,
             )
 
         return None  # Ostateczny zwrot None w przypadku niepowodzenia
 
+    def _recover_index_by_signature_scan(self, file_path):
+        # --- STRATEGIA 2: Odtworzenie indeksu ze skanu sygnatur sekcji (model_recover) ---
+        # Plik nie jest modyfikowany; trwała naprawa: python model_recover.py <plik>
+        logger.debug(
+            "READ_INDEX: Strategia 2: Próba odtworzenia indeksu ze znaczników JPEG/JSON/ZIP/RAR."
+        )
+        try:
+            index_dict, _ = model_recover.scan_sections(file_path)
+        except (model_format.ModelFormatError, OSError) as e_scan:
+            logger.error("READ_INDEX: Strategia 2: Skan sygnatur nie powiódł się: %s", e_scan)
+            logger.error(
+                "READ_INDEX: Wszystkie strategie odczytu indeksu JSON zawiodły."
+            )
+            return None
+        logger.warning(
+            "READ_INDEX: Strategia 2: Odtworzono indeks z sygnatur: %s. Nagłówek pliku %s jest uszkodzony - napraw go poleceniem 'python model_recover.py %s'.",
+            index_dict,
+            file_path,
+            file_path,
+        )
+        return index_dict
+
 
 if __name__ == "__main__":
     # Upewnij się, że konfiguracja loggingu jest wywoływana przed utworzeniem aplikacji,
     # jeśli chcesz logować również wczesne etapy inicjalizacji (choć tutaj jest już na poziomie modułu).
     logger.info("Uruchamianie aplikacji ModelCreator.")
-    app = QApplication(sys.argv)
+    # --profile[=cpu|mem|all] - własna flaga, usuwana przed przekazaniem argv do Qt
+    qt_argv = []
+    for arg in sys.argv:
+        if arg == "--profile" or arg.startswith("--profile="):
+            profile_mode = model_profile.configure(
+                arg.partition("=")[2] or "all",
+                os.path.dirname(os.path.abspath(log_file_path)),
+            )
+            logger.info("Profilowanie włączone: %s", profile_mode)
+        else:
+            qt_argv.append(arg)
+    app = QApplication(qt_argv)
     window = ModelCreator()
     window.show()
     sys.exit(app.exec())
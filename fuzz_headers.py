@@ -0,0 +1,190 @@
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import struct
+import sys
+import tempfile
+import zipfile
+
+import model_backends
+import model_format
+import model_verify
+
+# Fuzzing nagłówków plików .model: z poprawnego pliku powstają tysiące wariantów
+# z podmienionymi offsetami/rozmiarami w indeksie, losowo przekłamanymi bitami,
+# uciętym końcem lub uszkodzonym katalogiem centralnym ZIP. Każdy wariant
+# przechodzi przez verify_model oraz odczyt sekcji przez open_model. Wynik:
+#   - lista nieoczekiwanych wyjątków (każdy wyjątek spoza EXPECTED_ERRORS),
+#   - przyrost szczytowego RSS, który musi zmieścić się w limicie zależnym
+#     od budżetu pamięci (model_format.set_read_budget).
+
+EXPECTED_ERRORS = model_verify.READ_ERRORS
+HUGE_VALUES = (2**31, 2**40, 2**62)
+CHUNK_SIZE = 1024 * 1024
+
+
+def peak_rss_bytes():
+    # ru_maxrss: KiB na Linuksie, bajty na macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def make_base_model(directory, archive_size, seed):
+    # Wejścia pisane kawałkami, żeby generowanie nie podbiło szczytowego RSS
+    rng = random.Random(seed)
+    preview_path = os.path.join(directory, "preview.jpg")
+    info_path = os.path.join(directory, "info.json")
+    archive_path = os.path.join(directory, "archive.zip")
+    with open(preview_path, "wb") as f:
+        f.write(b"\xff\xd8\xff\xe0" + rng.randbytes(16 * 1024) + b"\xff\xd9")
+    with open(info_path, "w", encoding="utf-8") as f:
+        json.dump({"nazwa_modelu": "fuzz", "wersja": "1.0"}, f)
+    with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_STORED) as zf:
+        with zf.open("payload.bin", "w", force_zip64=True) as member:
+            for start in range(0, archive_size, CHUNK_SIZE):
+                member.write(rng.randbytes(min(CHUNK_SIZE, archive_size - start)))
+    indexed_path = os.path.join(directory, "base.model")
+    model_format.write_model_file(indexed_path, preview_path, info_path, archive_path)
+    zip_path = os.path.join(directory, "base_zip.model")
+    with model_backends.open_model(indexed_path) as source:
+        model_backends.WRITERS["zip"](zip_path, source)
+    return indexed_path, zip_path
+
+
+def rewrite_index(path, index_data, header_len):
+    # Nowy indeks w zwartym JSON dopełniony spacjami do długości starego,
+    # żeby nie przesuwać sekcji w pliku
+    json_bytes = json.dumps(index_data, separators=(",", ":")).encode("utf-8")
+    index_len = header_len - model_format.INDEX_LEN_PREFIX_SIZE
+    if len(json_bytes) > index_len:
+        return False
+    with open(path, "r+b") as f:
+        f.write(struct.pack(model_format.INDEX_LEN_FORMAT, index_len))
+        f.write(json_bytes.ljust(index_len, b" "))
+    return True
+
+
+def mutate_index_value(rng, path, file_size):
+    index_data, header_len = model_format.read_index_from_path(path)
+    section = index_data[rng.choice(model_format.SECTION_NAMES)]
+    field = rng.choice(("offset", "size"))
+    section[field] = rng.choice(
+        HUGE_VALUES
+        + (file_size, file_size + 1, file_size - section["offset"] + 1, -1, "x", None)
+    )
+    return rewrite_index(path, index_data, header_len)
+
+
+def flip_bits(rng, path, start, length, flips):
+    with open(path, "r+b") as f:
+        for _ in range(flips):
+            position = start + rng.randrange(length)
+            f.seek(position)
+            byte = f.read(1)[0]
+            f.seek(position)
+            f.write(bytes([byte ^ (1 << rng.randrange(8))]))
+    return True
+
+
+def mutate(rng, kind, base_path, path):
+    shutil.copyfile(base_path, path)
+    file_size = os.path.getsize(path)
+    if kind == "index_value":
+        return mutate_index_value(rng, path, file_size)
+    if kind == "header_bits":
+        _, header_len = model_format.read_index_from_path(base_path)
+        return flip_bits(rng, path, 0, header_len, rng.randint(1, 8))
+    if kind == "truncate":
+        with open(path, "r+b") as f:
+            f.truncate(rng.randrange(file_size))
+        return True
+    if kind == "zip_directory":
+        # Katalog centralny i EOCD leżą na końcu pliku
+        tail = min(file_size, 512)
+        return flip_bits(rng, path, file_size - tail, tail, rng.randint(1, 8))
+    raise ValueError(f"Nieznany rodzaj mutacji: {kind}")
+
+
+def exercise(path):
+    # Wszystkie ścieżki odczytu, które mają szanować budżet pamięci
+    model_verify.verify_model(path, model_verify.LEVEL_FULL)
+    try:
+        with model_backends.open_model(path) as model:
+            for name in model_format.SECTION_NAMES:
+                for step in ("read", "iter", "open"):
+                    try:
+                        if step == "read":
+                            model.read_section(name)
+                        elif step == "iter":
+                            for _ in model.iter_section(name, CHUNK_SIZE):
+                                pass
+                        else:
+                            with model.open_section(name) as f:
+                                while f.read(CHUNK_SIZE):
+                                    pass
+                    except EXPECTED_ERRORS:
+                        pass
+    except EXPECTED_ERRORS:
+        pass
+
+
+def run(iterations, archive_size, budget, seed, rss_limit):
+    model_format.set_read_budget(budget)
+    rng = random.Random(seed)
+    crashes = []
+    counts = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        indexed_path, zip_path = make_base_model(tmp, archive_size, seed)
+        mutant_path = os.path.join(tmp, "mutant.model")
+        exercise(indexed_path)  # Rozgrzewka: importy, bufory, pula deskryptorów
+        baseline = peak_rss_bytes()
+        for i in range(iterations):
+            kind = rng.choice(("index_value", "header_bits", "truncate", "zip_directory"))
+            base_path = zip_path if kind == "zip_directory" else indexed_path
+            if not mutate(rng, kind, base_path, mutant_path):
+                continue
+            counts[kind] = counts.get(kind, 0) + 1
+            try:
+                exercise(mutant_path)
+            except Exception as e:
+                crashes.append({"iteration": i, "kind": kind, "error": repr(e)})
+        growth = peak_rss_bytes() - baseline
+    return {
+        "iterations": iterations,
+        "mutations": counts,
+        "budget": budget,
+        "archive_size": archive_size,
+        "peak_rss_growth": growth,
+        "rss_limit": rss_limit,
+        "rss_ok": growth <= rss_limit,
+        "crashes": crashes[:20],
+        "crash_count": len(crashes),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Fuzzing nagłówków .model z kontrolą szczytowego RSS."
+    )
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--archive-size", type=int, default=32 * 1024 * 1024)
+    parser.add_argument("--budget", type=int, default=4 * 1024 * 1024)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--rss-limit",
+        type=int,
+        default=None,
+        help="Dopuszczalny przyrost szczytowego RSS w bajtach (domyślnie 4x budżet)",
+    )
+    args = parser.parse_args(argv)
+    rss_limit = args.rss_limit if args.rss_limit is not None else 4 * args.budget
+    report = run(args.iterations, args.archive_size, args.budget, args.seed, rss_limit)
+    print(json.dumps(report, indent=4))
+    return 0 if report["rss_ok"] and report["crash_count"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
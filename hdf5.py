@@ -6,6 +6,8 @@ import json
 import time
 import h5py
 import io
+import model_backends
+import model_hdf5
 from PyQt6.QtWidgets import (
     QApplication,
     QWidget,
@@ -17,9 +19,28 @@ from PyQt6.QtWidgets import (
     QMessageBox,
     QLineEdit,
     QInputDialog,
+    QComboBox,
 )
 from PyQt6.QtCore import Qt
 
+DATASET_CHUNK_SIZE = model_hdf5.DEFAULT_CHUNK_SIZE
+CHUNK_SIZE_CHOICES = {
+    "64 KiB": 64 * 1024,
+    "256 KiB": 256 * 1024,
+    "1 MiB": 1024 * 1024,
+    "4 MiB": 4 * 1024 * 1024,
+}
+
+
+def open_dataset_bounded(dataset, file_size):
+    # Strumieniowy widok sekcji (model_hdf5.DatasetReader) - archiwum nie jest
+    # już w całości kopiowane do pamięci; BufferedReader łączy drobne odczyty
+    # zipfile/rarfile w odczyty całych fragmentów
+    reader = model_hdf5.open_section_reader(dataset, file_size)
+    if isinstance(reader, model_hdf5.DatasetReader):
+        return io.BufferedReader(reader, DATASET_CHUNK_SIZE)
+    return reader
+
 
 class ModelCreator(QWidget):
     def __init__(self):
@@ -80,6 +101,19 @@ class ModelCreator(QWidget):
         output_layout.addWidget(self.output_button)
         main_layout.addLayout(output_layout)
 
+        # Layout dla opcji zapisu datasetów (rozmiar fragmentu, filtr)
+        storage_layout = QHBoxLayout()
+        storage_layout.addWidget(QLabel("Fragment:"))
+        self.chunk_size_combo = QComboBox()
+        self.chunk_size_combo.addItems(list(CHUNK_SIZE_CHOICES))
+        self.chunk_size_combo.setCurrentText("1 MiB")
+        storage_layout.addWidget(self.chunk_size_combo)
+        storage_layout.addWidget(QLabel("Kompresja:"))
+        self.compression_combo = QComboBox()
+        self.compression_combo.addItems(list(model_hdf5.COMPRESSIONS))
+        storage_layout.addWidget(self.compression_combo)
+        main_layout.addLayout(storage_layout)
+
         # Przycisk tworzenia i weryfikacji
         button_layout = QHBoxLayout()
         self.create_button = QPushButton("Utwórz plik .model (HDF5)")
@@ -88,6 +122,9 @@ class ModelCreator(QWidget):
         self.verify_button.clicked.connect(self.verifyModelFile)
         button_layout.addWidget(self.create_button)
         button_layout.addWidget(self.verify_button)
+        self.library_button = QPushButton("Dodaj do biblioteki HDF5...")
+        self.library_button.clicked.connect(self.addToLibrary)
+        button_layout.addWidget(self.library_button)
         main_layout.addLayout(button_layout)
 
         # Label statusu i czasu
@@ -158,22 +195,20 @@ class ModelCreator(QWidget):
         self.time_label.setText("")
 
         try:
-            with h5py.File(self.output_path, "w") as h5f:
-                # Zapisz preview.jpg
-                with open(self.preview_path, "rb") as f_preview:
-                    preview_data = f_preview.read()
-                    h5f.create_dataset("preview.jpg", data=preview_data)
-
-                # Zapisz info.json
-                with open(self.info_path, "rb") as f_info:
-                    info_data = f_info.read()
-                    h5f.create_dataset("info.json", data=info_data)
-
-                # Zapisz archiwum
-                with open(self.archive_path, "rb") as f_archive:
-                    archive_data = f_archive.read()
-                    archive_filename = os.path.basename(self.archive_path)
-                    h5f.create_dataset(f"archive/{archive_filename}", data=archive_data)
+            # Fragmentowane datasety uint8, zapisywane kawałkami (model_hdf5) -
+            # żaden plik wejściowy nie jest wczytywany w całości
+            chunk_size = CHUNK_SIZE_CHOICES[self.chunk_size_combo.currentText()]
+            compression = self.compression_combo.currentText()
+            archive_filename = os.path.basename(self.archive_path)
+            with model_hdf5.open_file(self.output_path, "w") as h5f:
+                for dataset_name, path in (
+                    ("preview.jpg", self.preview_path),
+                    ("info.json", self.info_path),
+                    (f"archive/{archive_filename}", self.archive_path),
+                ):
+                    model_hdf5.write_file_section(
+                        h5f, dataset_name, path, chunk_size, compression
+                    )
 
             end_time = time.time()
             elapsed_time = end_time - start_time
@@ -196,6 +231,63 @@ class ModelCreator(QWidget):
                 f"Wystąpił błąd podczas tworzenia pliku .model (HDF5):\n{e}\nCzas próby: {elapsed_time:.4f} s",
             )
 
+    def addToLibrary(self):
+        # Tryb biblioteki: wiele modeli w jednym pliku HDF5 (model_hdf5.ModelLibrary),
+        # dopisywanie w trybie SWMR - czytelnicy biblioteki nie muszą jej zamykać
+        if not all([self.preview_path, self.info_path, self.archive_path]):
+            QMessageBox.critical(
+                self,
+                "Błąd",
+                "Proszę wybrać wszystkie wymagane pliki (preview.jpg, info.json, archiwum).",
+            )
+            return
+        fname, _ = QFileDialog.getSaveFileName(
+            self,
+            "Biblioteka modeli HDF5",
+            "",
+            "Biblioteki HDF5 (*.h5 *.hdf5)",
+            options=QFileDialog.Option.DontConfirmOverwrite,
+        )
+        if not fname:
+            return
+
+        start_time = time.time()
+        self.status_label.setText("Dodawanie modelu do biblioteki HDF5...")
+        self.time_label.setText("")
+
+        try:
+            source = model_backends.FileSetSource(
+                self.preview_path, self.info_path, self.archive_path
+            )
+            chunk_size = CHUNK_SIZE_CHOICES[self.chunk_size_combo.currentText()]
+            with model_hdf5.ModelLibrary(
+                fname,
+                "a",
+                chunk_size=chunk_size,
+                compression=self.compression_combo.currentText(),
+            ) as library:
+                library.add_model(source, chunk_size=chunk_size)
+                count = len(library)
+
+            elapsed_time = time.time() - start_time
+            self.status_label.setText(f"Model dodany do biblioteki ({count} modeli).")
+            self.time_label.setText(f"Czas dodania: {elapsed_time:.4f} s")
+            QMessageBox.information(
+                self,
+                "Sukces",
+                f"Model dodany do biblioteki '{fname}' ({count} modeli).\nCzas dodania: {elapsed_time:.4f} s",
+            )
+
+        except Exception as e:
+            elapsed_time = time.time() - start_time
+            self.status_label.setText(f"Błąd podczas dodawania do biblioteki: {e}")
+            self.time_label.setText(f"Czas próby: {elapsed_time:.4f} s")
+            QMessageBox.critical(
+                self,
+                "Błąd",
+                f"Wystąpił błąd podczas dodawania do biblioteki HDF5:\n{e}\nCzas próby: {elapsed_time:.4f} s",
+            )
+
     def verifyModelFile(self):
         if not self.output_path:
             QMessageBox.critical(
@@ -214,7 +306,8 @@ class ModelCreator(QWidget):
         self.time_label.setText("")
 
         try:
-            with h5py.File(self.output_path, "r") as h5f:
+            file_size = os.path.getsize(self.output_path)
+            with model_hdf5.open_file(self.output_path) as h5f:
                 required_datasets = ["preview.jpg", "info.json"]
                 found_datasets = list(h5f.keys())
 
@@ -235,8 +328,9 @@ class ModelCreator(QWidget):
 
                 # Sprawdzenie i odczyt info.json
                 try:
-                    info_data = h5f["info.json"][:]  # Odczytanie całego datasetu
-                    info_content = info_data.tobytes().decode("utf-8")
+                    with open_dataset_bounded(h5f["info.json"], file_size) as info_file:
+                        info_data = info_file.read()
+                    info_content = info_data.rstrip(b"\x00").decode("utf-8")
                     json.loads(info_content)
                     # Można dodać dodatkowe walidacje zawartości info.json
                     # print(f"Odczytano info.json: {info_data}")
@@ -262,9 +356,14 @@ class ModelCreator(QWidget):
                     return
 
                 # Sprawdzenie obecności datasetu archiwum
-                archive_datasets = [
-                    d for d in found_datasets if d.startswith("archive/")
-                ]
+                # Datasety archiwum leżą w grupie "archive" - h5f.keys() zwraca
+                # tylko najwyższy poziom, więc nazwy "archive/..." trzeba zbudować
+                archive_group = h5f.get("archive")
+                archive_datasets = (
+                    [f"archive/{d}" for d in archive_group.keys()]
+                    if isinstance(archive_group, h5py.Group)
+                    else []
+                )
                 if len(archive_datasets) != 1:
                     self.status_label.setText(
                         "Weryfikacja nieudana: Oczekiwano dokładnie jednego datasetu archiwum."
@@ -277,15 +376,12 @@ class ModelCreator(QWidget):
                     return
 
                 archive_dataset_name = archive_datasets[0]
-                archive_data = h5f[archive_dataset_name][
-                    :
-                ]  # Odczytanie całego datasetu
+                archive_buffer = open_dataset_bounded(
+                    h5f[archive_dataset_name], file_size
+                )
 
-                # Opcjonalnie: Spróbuj otworzyć archiwum w pamięci jako ZIP/RAR
+                # Opcjonalnie: Spróbuj otworzyć archiwum jako ZIP/RAR
                 try:
-                    import io
-
-                    archive_buffer = io.BytesIO(archive_data)
                     with zipfile.ZipFile(archive_buffer, "r") as temp_zip:
                         temp_zip.namelist()
                 except zipfile.BadZipFile:
@@ -0,0 +1,230 @@
+import errno
+import os
+import tempfile
+import threading
+
+# Atomowy zapis plików wyjściowych .model: dane trafiają do pliku tymczasowego
+# w katalogu docelowym (.<nazwa>.<losowe>.tmp), po zapisie fsync i os.replace
+# na właściwą nazwę, potem fsync katalogu. Awaria albo pełny dysk w trakcie
+# zapisu zostawia stary plik (albo żaden), nigdy ucięty .model.
+# Znany z góry rozmiar jest rezerwowany przez posix_fallocate: brak miejsca
+# wychodzi od razu (ENOSPC przed zapisem pierwszego bajtu), a plik jest mniej
+# pofragmentowany. Rezerwacja może być większa niż wynik (rozmiar szacowany) -
+# przy zatwierdzeniu plik jest przycinany do pozycji końcowej, więc zapisujący
+# musi kończyć na końcu danych (zapis sekwencyjny, zipfile po close()).
+# W trybie wsadowym (SyncBatch) fsync i replace są odkładane i wykonywane
+# grupami: najpierw fsync wszystkich plików grupy, potem podmiany, na końcu
+# jeden fsync na katalog - zamiast fsync pliku i katalogu po każdym wyniku.
+# Do chwili podmiany wynik leży tylko w pliku tymczasowym.
+# verify(tmp_path) - sprawdzenie pliku po fsync, a przed podmianą (np.
+# model_writecheck); wyjątek z niego zostawia poprzedni plik na miejscu.
+
+TMP_SUFFIX = ".tmp"
+DEFAULT_BATCH_FILES = 64
+DEFAULT_BATCH_BYTES = 512 * 1024 * 1024
+# Błędy posix_fallocate oznaczające brak wsparcia (np. tmpfs starszych jąder,
+# NFS, ZFS) - wtedy zapis idzie bez rezerwacji
+_FALLOCATE_UNSUPPORTED = {errno.EOPNOTSUPP, errno.ENOSYS, errno.EINVAL}
+
+
+# mkstemp tworzy plik 0600; wynik dostaje uprawnienia jak z open(path, "wb")
+# albo zastępowanego pliku. umask odczytujemy raz i bez os.umask - przełączanie
+# maski procesu wpłynęłoby na pliki tworzone w tym czasie przez inne wątki.
+_default_mode = None
+_default_mode_lock = threading.Lock()
+
+
+def _creation_mode(directory):
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("Umask:"):
+                    return 0o666 & ~int(line.split()[1], 8)
+    except (OSError, ValueError, IndexError):
+        pass
+    # Bez /proc (macOS, starsze jądra): uprawnienia pliku próbnego utworzonego z 0666
+    probe = os.path.join(directory, f".umask-{os.getpid()}-{threading.get_ident()}.tmp")
+    fd = os.open(probe, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        return os.fstat(fd).st_mode & 0o777
+    finally:
+        os.close(fd)
+        os.remove(probe)
+
+
+def default_mode(directory):
+    global _default_mode
+    with _default_mode_lock:
+        if _default_mode is None:
+            _default_mode = _creation_mode(directory)
+        return _default_mode
+
+
+def preallocate(fd, size):
+    # True - miejsce zarezerwowane; False - system plików tego nie obsługuje
+    if size <= 0 or not hasattr(os, "posix_fallocate"):
+        return False
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except OSError as e:
+        if e.errno in _FALLOCATE_UNSUPPORTED:
+            return False
+        if e.errno in (errno.ENOSPC, errno.EDQUOT):
+            raise OSError(
+                e.errno, f"Za mało miejsca na dysku na {size} bajtów ({os.strerror(e.errno)})"
+            ) from e
+        raise
+    return True
+
+
+def fsync_directory(path):
+    # Trwałość samej podmiany nazwy wymaga fsync katalogu (nie na Windows)
+    if os.name != "posix":
+        return
+    fd = os.open(path or ".", os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_path(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def remove_quietly(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class SyncBatch:
+    # Odłożone fsync + os.replace dla wielu wyników; max_files=None - bez
+    # automatycznego zatwierdzania (np. w procesie roboczym, który oddaje
+    # listę pending procesowi głównemu)
+    def __init__(self, max_files=DEFAULT_BATCH_FILES, max_bytes=DEFAULT_BATCH_BYTES):
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.pending = []
+        self._bytes = 0
+        self._callbacks = []
+        self.flushes = 0
+
+    def add(self, tmp_path, path, size=0, on_commit=None):
+        self.pending.append((tmp_path, path))
+        self._bytes += size
+        if on_commit is not None:
+            self._callbacks.append(on_commit)
+        if self.max_files is not None and (
+            len(self.pending) >= self.max_files or self._bytes >= self.max_bytes
+        ):
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return 0
+        pending, callbacks = self.pending, self._callbacks
+        self.pending, self._callbacks, self._bytes = [], [], 0
+        for tmp_path, _ in pending:
+            fsync_path(tmp_path)
+        directories = set()
+        for tmp_path, path in pending:
+            os.replace(tmp_path, path)
+            directories.add(os.path.dirname(os.path.abspath(path)))
+        for directory in directories:
+            fsync_directory(directory)
+        self.flushes += 1
+        for callback in callbacks:
+            callback()
+        return len(pending)
+
+    def discard(self):
+        for tmp_path, _ in self.pending:
+            remove_quietly(tmp_path)
+        self.pending, self._callbacks, self._bytes = [], [], 0
+
+
+class AtomicOutput:
+    # with AtomicOutput(ścieżka, rozmiar) as out: zapis do out.file (albo do
+    # out.tmp_path, gdy zapisujący sam otwiera plik - np. h5py); wyjątek w bloku
+    # usuwa plik tymczasowy, normalne wyjście zatwierdza wynik
+    def __init__(self, path, size=None, batch=None, verify=None):
+        if batch is not None and verify is not None:
+            # Przed fsync grupy odczyt przyszedłby z pamięci podręcznej
+            raise ValueError("verify nie działa z odłożonym fsync (batch)")
+        self.path = os.path.abspath(path)
+        self.size = size
+        self.batch = batch
+        self.verify = verify
+        self.tmp_path = None
+        self.file = None
+        self.preallocated = False
+
+    def __enter__(self):
+        directory, name = os.path.split(self.path)
+        fd, self.tmp_path = tempfile.mkstemp(
+            prefix=f".{name}.", suffix=TMP_SUFFIX, dir=directory
+        )
+        try:
+            try:
+                mode = os.stat(self.path).st_mode & 0o7777
+            except FileNotFoundError:
+                mode = default_mode(directory)
+            os.chmod(fd if os.chmod in os.supports_fd else self.tmp_path, mode)
+            if self.size:
+                self.preallocated = preallocate(fd, self.size)
+            # fdopen nie obcina pliku - rezerwacja zostaje
+            self.file = os.fdopen(fd, "wb")
+        except BaseException:
+            os.close(fd)
+            remove_quietly(self.tmp_path)
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+            return False
+        self.commit()
+        return False
+
+    def abort(self):
+        if self.file is not None and not self.file.closed:
+            self.file.close()
+        remove_quietly(self.tmp_path)
+
+    def commit(self):
+        try:
+            if not self.file.closed:
+                self.file.flush()
+                if self.preallocated:
+                    # Rezerwacja była szacunkiem - plik kończy się na pozycji końcowej
+                    end = self.file.tell()
+                    if end != os.fstat(self.file.fileno()).st_size:
+                        self.file.truncate(end)
+                if self.batch is None:
+                    os.fsync(self.file.fileno())
+                self.file.close()
+            elif self.batch is None:
+                fsync_path(self.tmp_path)
+            if self.batch is None:
+                if self.verify is not None:
+                    self.verify(self.tmp_path)
+                os.replace(self.tmp_path, self.path)
+                fsync_directory(os.path.dirname(self.path))
+        except BaseException:
+            self.abort()
+            raise
+        if self.batch is not None:
+            self.batch.add(self.tmp_path, self.path, os.path.getsize(self.tmp_path))
+
+
+def atomic_write(path, write, size=None, batch=None):
+    # write(plik) zapisuje całość do otwartego pliku binarnego; zwraca jego wynik
+    with AtomicOutput(path, size, batch) as out:
+        return write(out.file)
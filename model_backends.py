@@ -0,0 +1,576 @@
+import contextlib
+import io
+import json
+import os
+import struct
+import tempfile
+import zipfile
+
+import model_atomic
+import model_format
+from pread_reader import PReadModelReader, open_range
+
+# Rejestr backendów dla wariantów pliku .model o tym samym rozszerzeniu:
+#   "zip"     - kontener ZIP_STORED (new.py, new_timer.py, new2.py)
+#   "hdf5"    - datasety h5py (hdf5.py)
+#   "indexed" - prefiks długości + indeks JSON (create_model.py)
+#   "metafirst" - sygnatura + metadane w pierwszych 64 KiB (model_format, jeden odczyt)
+# open_model(path) czyta początek pliku jednym odczytem, dopasowuje go do
+# zarejestrowanych sygnatur i zwraca obiekt ModelHandle backendu. Wszystkie
+# backendy mają ten sam interfejs sekcji "preview", "info" i "archive":
+# index(), section_size(), iter_section(), read_section(), archive_filename,
+# więc sekcje można też strumieniowo przepisać do dowolnego innego wariantu.
+# CFAB_MODEL_ZIP_CACHE=<baza SQLite> - katalogi centralne ZIP z model_zipcache.
+# write_model(path, format, source) zapisuje atomowo (model_atomic): plik
+# tymczasowy w katalogu docelowym, fsync, os.replace. Zapisujący z streams=True
+# przyjmują zamiast ścieżki otwarty plik, który dostaje rezerwację miejsca.
+
+CHUNK_SIZE = 1024 * 1024
+SNIFF_SIZE = 16
+ZIP_MAGICS = (b"PK\x03\x04", b"PK\x05\x06")
+ZIP_LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+ZIP_EOCD = struct.Struct("<4s4H2LH")
+ZIP64_LOCATOR = struct.Struct("<4sLQL")
+ZIP64_EOCD = struct.Struct("<4sQ2H2L4Q")
+ZIP_MAX_COMMENT = 0xFFFF
+HDF5_MAGIC = b"\x89HDF\r\n\x1a\n"
+SECTION_ARCNAMES = {"preview": "preview.jpg", "info": "info.json"}
+# Nagłówek szyfrowanego kontenera ZIP (model_crypto)
+CRYPTO_ARCNAME = "crypto.json"
+
+
+class EncryptedModelError(model_format.ModelFormatError):
+    # Szyfrowany kontener ZIP - open_model nie zna klucza (model_keys)
+    pass
+
+
+class Backend:
+    __slots__ = ("name", "sniff", "opener", "writer", "streams")
+
+    def __init__(self, name, sniff, opener, writer=None, streams=False):
+        self.name = name
+        self.sniff = sniff
+        self.opener = opener
+        self.writer = writer
+        self.streams = streams
+
+
+_backends = []
+WRITERS = {}
+# Zapas rezerwacji ponad sumę sekcji na nagłówki i indeksy wariantów
+OUTPUT_OVERHEAD = 64 * 1024
+
+
+def register_backend(name, sniff, opener, writer=None, first=False, streams=False):
+    # sniff(head) dostaje pierwsze SNIFF_SIZE bajtów pliku i zwraca True/False;
+    # streams=True - writer przyjmuje też otwarty plik binarny zamiast ścieżki
+    unregister_backend(name)
+    backend = Backend(name, sniff, opener, writer, streams)
+    if first:
+        _backends.insert(0, backend)
+    else:
+        _backends.append(backend)
+    if writer is not None:
+        WRITERS[name] = writer
+    return backend
+
+
+def unregister_backend(name):
+    _backends[:] = [b for b in _backends if b.name != name]
+    WRITERS.pop(name, None)
+
+
+def registered_backends():
+    return [b.name for b in _backends]
+
+
+def sniff_head(head):
+    # Backend pasujący do początku pliku (co najmniej SNIFF_SIZE bajtów) albo None
+    for backend in _backends:
+        if backend.sniff(head):
+            return backend
+    return None
+
+
+def sniff_backend(path):
+    with open(path, "rb") as f:
+        head = f.read(SNIFF_SIZE)
+    backend = sniff_head(head)
+    if backend is None:
+        raise model_format.ModelFormatError(f"Nieznany wariant pliku .model: {path}")
+    return backend
+
+
+def detect_variant(path):
+    return sniff_backend(path).name
+
+
+def open_model(path):
+    return sniff_backend(path).opener(path)
+
+
+def check_zip_directory(f, what):
+    # zipfile wczytuje cały katalog centralny jednym read(size_cd) - rozmiar
+    # deklarowany w EOCD sprawdzamy wcześniej względem rozmiaru pliku i budżetu
+    file_size = f.seek(0, io.SEEK_END)
+    tail_size = min(file_size, ZIP_EOCD.size + ZIP_MAX_COMMENT)
+    f.seek(file_size - tail_size)
+    tail = f.read(tail_size)
+    position = tail.rfind(b"PK\x05\x06")
+    if position < 0 or len(tail) - position < ZIP_EOCD.size:
+        return  # Brak EOCD - zipfile sam zgłosi BadZipFile
+    size_cd = ZIP_EOCD.unpack_from(tail, position)[5]
+    locator_position = position - ZIP64_LOCATOR.size
+    if locator_position >= 0 and tail[locator_position : locator_position + 4] == b"PK\x06\x07":
+        zip64_offset = ZIP64_LOCATOR.unpack_from(tail, locator_position)[2]
+        if zip64_offset + ZIP64_EOCD.size <= file_size:
+            f.seek(zip64_offset)
+            record = f.read(ZIP64_EOCD.size)
+            if record[:4] == b"PK\x06\x06" and len(record) == ZIP64_EOCD.size:
+                size_cd = ZIP64_EOCD.unpack(record)[8]
+    f.seek(0)
+    if size_cd > file_size:
+        raise model_format.ModelFormatError(
+            f"{what}: katalog centralny ZIP ({size_cd} bajtów) większy niż plik ({file_size})."
+        )
+    model_format.check_read_budget(size_cd, f"{what}: katalog centralny ZIP")
+
+
+def zip_member_data_offset(path, zinfo):
+    # Początek danych członka ZIP_STORED: nagłówek lokalny ma własne długości
+    # nazwy i pola extra, niezależne od katalogu centralnego
+    with open_range(path, zinfo.header_offset, ZIP_LOCAL_HEADER.size) as f:
+        header = f.read(ZIP_LOCAL_HEADER.size)
+    if len(header) != ZIP_LOCAL_HEADER.size or header[:4] != b"PK\x03\x04":
+        raise model_format.ModelFormatError(
+            f"Uszkodzony nagłówek lokalny '{zinfo.filename}' w '{path}'."
+        )
+    fields = ZIP_LOCAL_HEADER.unpack(header)
+    data_offset = zinfo.header_offset + ZIP_LOCAL_HEADER.size + fields[9] + fields[10]
+    file_size = os.path.getsize(path)
+    if data_offset + zinfo.compress_size > file_size:
+        raise model_format.ModelFormatError(
+            f"Członek '{zinfo.filename}' ({data_offset}+{zinfo.compress_size}) wykracza "
+            f"poza koniec pliku ({file_size})."
+        )
+    return data_offset
+
+
+def zip_archive_name(names, path):
+    # Nazwa archiwum w kontenerze ZIP; poza nim muszą być dokładnie sekcje
+    # preview.jpg i info.json
+    if CRYPTO_ARCNAME in names:
+        raise EncryptedModelError(
+            f"Plik '{path}' jest zaszyfrowany - otwórz go przez "
+            f"model_crypto.EncryptedZipModel z hasłem lub kluczem (model_keys)."
+        )
+    missing = [n for n in SECTION_ARCNAMES.values() if n not in names]
+    archive_names = [n for n in names if n not in SECTION_ARCNAMES.values()]
+    if missing or len(archive_names) != 1:
+        raise model_format.ModelFormatError(
+            f"Plik ZIP '{path}' nie zawiera preview.jpg, info.json i dokładnie "
+            f"jednego archiwum."
+        )
+    return archive_names[0]
+
+
+class ModelHandle:
+    variant = None
+    archive_filename = None
+
+    def section_size(self, name):
+        raise NotImplementedError
+
+    def iter_section(self, name, chunk_size=CHUNK_SIZE):
+        raise NotImplementedError
+
+    def read_section(self, name, budget=None):
+        model_format.check_read_budget(self.section_size(name), f"Sekcja '{name}'", budget)
+        return b"".join(self.iter_section(name))
+
+    def open_section(self, name):
+        # Przeszukiwalny obiekt plikowy tylko do odczytu z zawartością sekcji;
+        # powyżej budżetu pamięci sekcja trafia strumieniowo do pliku tymczasowego
+        budget = model_format.get_read_budget()
+        if self.section_size(name) <= budget:
+            return io.BytesIO(self.read_section(name))
+        spool = tempfile.SpooledTemporaryFile(max_size=budget)
+        try:
+            for chunk in self.iter_section(name):
+                spool.write(chunk)
+            spool.seek(0)
+        except BaseException:
+            spool.close()
+            raise
+        return spool
+
+    def index(self):
+        sections = {
+            name: {"size": self.section_size(name)} for name in model_format.SECTION_NAMES
+        }
+        sections["archive"]["filename"] = self.archive_filename
+        return sections
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class FileSetSource(ModelHandle):
+    # Luźne pliki wejściowe (preview.jpg, info.json, archiwum) jako źródło sekcji
+    variant = "files"
+
+    def __init__(self, preview_path, info_path, archive_path):
+        self.paths = {
+            "preview": preview_path,
+            "info": info_path,
+            "archive": archive_path,
+        }
+        self.archive_filename = os.path.basename(archive_path)
+
+    def section_size(self, name):
+        return os.path.getsize(self.paths[name])
+
+    def iter_section(self, name, chunk_size=CHUNK_SIZE):
+        with open(self.paths[name], "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+
+class IndexedModel(ModelHandle):
+    variant = "indexed"
+
+    def __init__(self, path):
+        self.path = path
+        self._reader = PReadModelReader(path)
+        index_data = self._reader.index()
+        self.archive_filename = str(index_data["archive"].get("filename", "archive"))
+
+    def section_size(self, name):
+        return model_format.section_bounds(self._reader.index(), name)[1]
+
+    def iter_section(self, name, chunk_size=CHUNK_SIZE):
+        return self._reader.iter_section(name, chunk_size)
+
+    def read_section(self, name, budget=None):
+        return self._reader.read_section(name, budget)
+
+    def open_section(self, name):
+        return self._reader.open_section(name)
+
+    def index(self):
+        return self._reader.index()
+
+
+class MetaFirstModel(ModelHandle):
+    variant = "metafirst"
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            file_size = os.fstat(f.fileno()).st_size
+            self.header = model_format.read_metafirst(f, file_size)
+        self._index = self.header.index
+        self.archive_filename = self._index.archive.filename
+
+    def section_size(self, name):
+        return self._index.section(name).size
+
+    def iter_section(self, name, chunk_size=CHUNK_SIZE):
+        if name == "info":
+            yield self.header.info_bytes  # Już w pamięci z bloku metadanych
+            return
+        with self.open_section(name) as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def read_section(self, name, budget=None):
+        if name == "info":
+            return self.header.info_bytes
+        return super().read_section(name, budget)
+
+    def open_section(self, name):
+        if name == "info":
+            return io.BytesIO(self.header.info_bytes)
+        entry = self._index.section(name)
+        return open_range(self.path, entry.offset, entry.size)
+
+    def index(self):
+        return self._index.to_dict()
+
+
+class ZipModel(ModelHandle):
+    variant = "zip"
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            check_zip_directory(f, path)
+        self._zip = zipfile.ZipFile(path, "r")
+        try:
+            self.archive_filename = zip_archive_name(self._zip.namelist(), path)
+        except model_format.ModelFormatError:
+            self._zip.close()
+            raise
+
+    def _arcname(self, name):
+        return SECTION_ARCNAMES.get(name, self.archive_filename)
+
+    def section_size(self, name):
+        return self._zip.getinfo(self._arcname(name)).file_size
+
+    def iter_section(self, name, chunk_size=CHUNK_SIZE):
+        with self._zip.open(self._arcname(name)) as member:
+            while True:
+                chunk = member.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def open_section(self, name):
+        zinfo = self._zip.getinfo(self._arcname(name))
+        if zinfo.compress_type != zipfile.ZIP_STORED or zinfo.flag_bits & 0x1:
+            return self._zip.open(zinfo)
+        # Dane członka ZIP_STORED leżą w pliku wprost - widok bez kopiowania
+        data_offset = zip_member_data_offset(self.path, zinfo)
+        return open_range(self.path, data_offset, zinfo.file_size)
+
+    def close(self):
+        self._zip.close()
+
+
+class Hdf5Model(ModelHandle):
+    variant = "hdf5"
+
+    def __init__(self, path):
+        import model_hdf5  # Tylko gdy faktycznie trafimy na plik HDF5 (h5py)
+
+        self.path = path
+        self._h5f = model_hdf5.open_file(path)
+        archive_group = self._h5f.get("archive")
+        if (
+            "preview.jpg" not in self._h5f
+            or "info.json" not in self._h5f
+            or archive_group is None
+            or len(archive_group) != 1
+        ):
+            self._h5f.close()
+            raise model_format.ModelFormatError(
+                f"Plik HDF5 '{path}' nie zawiera preview.jpg, info.json i dokładnie "
+                f"jednego datasetu archiwum."
+            )
+        self.archive_filename = next(iter(archive_group.keys()))
+
+    def _dataset(self, name):
+        if name == "archive":
+            return self._h5f["archive"][self.archive_filename]
+        return self._h5f[SECTION_ARCNAMES[name]]
+
+    def section_size(self, name):
+        dataset = self._dataset(name)
+        if dataset.shape == ():
+            return dataset.dtype.itemsize
+        return dataset.shape[0]
+
+    def open_section(self, name):
+        # Dataset 1-D: strumieniowy widok czytający tylko potrzebne fragmenty;
+        # stary zapis hdf5.py (skalar) - w całości, w granicach budżetu
+        import model_hdf5
+
+        return model_hdf5.open_section_reader(
+            self._dataset(name), os.path.getsize(self.path)
+        )
+
+    def iter_section(self, name, chunk_size=CHUNK_SIZE):
+        with self.open_section(name) as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def close(self):
+        self._h5f.close()
+
+
+def _open_output(output):
+    # Ścieżka albo otwarty plik binarny (model_atomic) - ten zamyka wywołujący
+    if hasattr(output, "write"):
+        return contextlib.nullcontext(output)
+    return open(output, "wb")
+
+
+def _write_section(f_out, source, name, size, chunk_size):
+    # Offsety w nagłówku wynikają z zadeklarowanych rozmiarów - sekcja, która
+    # zmieniła się w trakcie zapisu, przesunęłaby wszystkie następne
+    section_written = 0
+    for chunk in source.iter_section(name, chunk_size):
+        f_out.write(chunk)
+        section_written += len(chunk)
+    if section_written != size:
+        raise model_format.ModelFormatError(
+            f"Sekcja '{name}' zmieniła rozmiar podczas zapisu "
+            f"({section_written} zamiast {size} bajtów)."
+        )
+    return section_written
+
+
+def write_indexed(output_path, source, chunk_size=CHUNK_SIZE):
+    sizes = {name: source.section_size(name) for name in model_format.SECTION_NAMES}
+    index_data, index_json_bytes = model_format.build_index(
+        sizes["preview"], sizes["info"], source.archive_filename, sizes["archive"]
+    )
+    written = 0
+    with _open_output(output_path) as f_out:
+        f_out.write(struct.pack(model_format.INDEX_LEN_FORMAT, len(index_json_bytes)))
+        f_out.write(index_json_bytes)
+        for name in model_format.SECTION_NAMES:
+            written += _write_section(f_out, source, name, sizes[name], chunk_size)
+    return written
+
+
+def write_metafirst(output_path, source, chunk_size=CHUNK_SIZE):
+    # info.json musi zmieścić się w bloku metadanych, więc czytamy go w całości
+    info_size = source.section_size("info")
+    model_format.check_read_budget(
+        min(info_size, model_format.METAFIRST_BLOCK_SIZE + 1), "info.json"
+    )
+    if info_size > model_format.METAFIRST_BLOCK_SIZE:
+        raise model_format.ModelFormatError(
+            f"info.json ({info_size} bajtów) nie mieści się w bloku metadanych "
+            f"({model_format.METAFIRST_BLOCK_SIZE} bajtów) - użyj układu z indeksem."
+        )
+    info_bytes = b"".join(source.iter_section("info", chunk_size))
+    if len(info_bytes) != info_size:
+        raise model_format.ModelFormatError(
+            f"Sekcja 'info' zmieniła rozmiar podczas zapisu "
+            f"({len(info_bytes)} zamiast {info_size} bajtów)."
+        )
+    try:
+        info_json = json.loads(info_bytes.decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        info_json = None
+    if not isinstance(info_json, dict):
+        info_json = {}
+    sizes = {name: source.section_size(name) for name in ("preview", "archive")}
+    _, block = model_format.build_metafirst_header(
+        sizes["preview"],
+        info_bytes,
+        source.archive_filename,
+        sizes["archive"],
+        info_json.get("nazwa_modelu"),
+        info_json.get("wersja"),
+    )
+    written = len(info_bytes)
+    with _open_output(output_path) as f_out:
+        f_out.write(block)
+        for name in ("preview", "archive"):
+            written += _write_section(f_out, source, name, sizes[name], chunk_size)
+    return written
+
+
+def write_zip(output_path, source, chunk_size=CHUNK_SIZE):
+    written = 0
+    with zipfile.ZipFile(output_path, "w", zipfile.ZIP_STORED) as model_zip:
+        for name in model_format.SECTION_NAMES:
+            arcname = SECTION_ARCNAMES.get(name, source.archive_filename)
+            size = source.section_size(name)
+            zinfo = zipfile.ZipInfo(arcname)
+            zinfo.compress_type = zipfile.ZIP_STORED
+            zinfo.file_size = size
+            with model_zip.open(
+                zinfo, "w", force_zip64=size >= zipfile.ZIP64_LIMIT
+            ) as member:
+                for chunk in source.iter_section(name, chunk_size):
+                    member.write(chunk)
+                    written += len(chunk)
+    return written
+
+
+def write_hdf5(output_path, source, chunk_size=CHUNK_SIZE, compression=None, level=None):
+    # Fragmentowane datasety uint8 (model_hdf5); chunk_size to też rozmiar
+    # fragmentu HDF5, compression: None/"gzip"/"lzf"/"zstd"
+    import model_hdf5
+
+    written = 0
+    with model_hdf5.open_file(output_path, "w") as h5f:
+        for name in model_format.SECTION_NAMES:
+            if name == "archive":
+                dataset_name = f"archive/{source.archive_filename}"
+            else:
+                dataset_name = SECTION_ARCNAMES[name]
+            size = source.section_size(name)
+            model_hdf5.write_section(
+                h5f,
+                dataset_name,
+                size,
+                source.iter_section(name, chunk_size),
+                chunk_size,
+                compression,
+                level,
+            )
+            written += size
+    return written
+
+
+def write_model(output_path, fmt, source, chunk_size=CHUNK_SIZE, batch=None, **options):
+    # Atomowy zapis wariantu fmt; batch - model_atomic.SyncBatch (odłożony fsync)
+    backend = next((b for b in _backends if b.name == fmt and b.writer), None)
+    if backend is None:
+        raise model_format.ModelFormatError(f"Nieznany format: {fmt}")
+    if not backend.streams:
+        # Zapisujący sam otwiera plik (h5py) - bez rezerwacji miejsca
+        with model_atomic.AtomicOutput(output_path, batch=batch) as output:
+            output.file.close()
+            return backend.writer(output.tmp_path, source, chunk_size, **options)
+    size = sum(source.section_size(name) for name in model_format.SECTION_NAMES)
+    with model_atomic.AtomicOutput(output_path, size + OUTPUT_OVERHEAD, batch) as output:
+        return backend.writer(output.file, source, chunk_size, **options)
+
+
+def _sniff_zip(head):
+    return head[:4] in ZIP_MAGICS
+
+
+def _sniff_hdf5(head):
+    return head[:8] == HDF5_MAGIC
+
+
+def _sniff_metafirst(head):
+    return head[:8] == model_format.METAFIRST_MAGIC
+
+
+def _sniff_indexed(head):
+    # Stary układ bez sygnatury: 2-bajtowy prefiks długości, po nim indeks JSON
+    if len(head) < model_format.INDEX_LEN_PREFIX_SIZE + 1:
+        return False
+    index_len = struct.unpack_from(model_format.INDEX_LEN_FORMAT, head)[0]
+    return index_len > 0 and head[model_format.INDEX_LEN_PREFIX_SIZE] == ord("{")
+
+
+def _open_zip(path):
+    # Z CFAB_MODEL_ZIP_CACHE katalog centralny pochodzi z trwałej pamięci
+    # (model_zipcache) - niezmieniony plik otwieramy bez zipfile
+    cache_path = os.environ.get("CFAB_MODEL_ZIP_CACHE")
+    if cache_path:
+        import model_zipcache
+
+        return model_zipcache.open_cached(path, cache_path)
+    return ZipModel(path)
+
+
+register_backend("zip", _sniff_zip, _open_zip, write_zip, streams=True)
+register_backend("hdf5", _sniff_hdf5, Hdf5Model, write_hdf5)
+register_backend("metafirst", _sniff_metafirst, MetaFirstModel, write_metafirst, streams=True)
+register_backend("indexed", _sniff_indexed, IndexedModel, write_indexed, streams=True)
@@ -0,0 +1,176 @@
+import argparse
+import json
+import logging
+import os
+import sys
+
+# Wspólny punkt wejścia dla krótkotrwałych wywołań (skrypty, batch):
+#   model info PLIK...            - indeks sekcji i info.json
+#   model verify PLIK|KATALOG...  - weryfikacja model_verify (JSON na wiersz)
+#   model pack PREVIEW INFO ARCHIWUM -o WYJŚCIE [--format hdf5|indexed|metafirst|zip]
+#   model gui [--variant indexed|zip|hdf5] [--profile[=tryb]]
+# Na poziomie modułu tylko biblioteka standardowa: PyQt6 ładowane jest wyłącznie
+# przez "gui", h5py dopiero przy pliku HDF5 (model_backends), a rarfile dopiero
+# przy archiwum RAR (model_verify). model_backends (formaty dla "pack") ładuje
+# build_parser - bez h5py, a zipfile i tak importuje każda komenda. Czas startu każdej komendy mierzy
+# bench_backends.py --startup (python -X importtime).
+
+logger = logging.getLogger(__name__)
+
+GUI_MODULES = {
+    "indexed": "create_model",
+    "zip": "new_timer",
+    "hdf5": "hdf5",
+}
+
+
+def describe_model(path):
+    import model_backends
+
+    with model_backends.open_model(path) as model:
+        info_bytes = model.read_section("info")
+        try:
+            info = json.loads(info_bytes.decode("utf-8"))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            info = None
+            logger.warning("Niepoprawny info.json w %s: %s", path, e)
+        return {
+            "path": path,
+            "variant": model.variant,
+            "size": os.path.getsize(path),
+            "sections": model.index(),
+            "info": info,
+        }
+
+
+def cmd_info(args):
+    import model_format
+
+    failed = 0
+    for path in args.paths:
+        try:
+            report = describe_model(path)
+        except (model_format.ModelFormatError, OSError) as e:
+            failed += 1
+            logger.error("Nie można odczytać %s: %s", path, e)
+            continue
+        except ImportError as e:
+            failed += 1
+            logger.error("Brak zależności dla wariantu pliku %s: %s", path, e)
+            continue
+        print(json.dumps(report, indent=4, ensure_ascii=False))
+    return 1 if failed else 0
+
+
+def iter_paths(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            from model_convert import iter_model_files
+
+            yield from iter_model_files(path)
+        else:
+            yield path
+
+
+def cmd_verify(args):
+    import model_verify
+
+    failed = 0
+    for path in iter_paths(args.paths):
+        result = model_verify.verify_model(path, args.level)
+        if not result["ok"]:
+            failed += 1
+        print(json.dumps(result, ensure_ascii=False), flush=True)
+    return 1 if failed else 0
+
+
+def cmd_pack(args):
+    import model_backends
+    import model_format
+
+    source = model_backends.FileSetSource(args.preview, args.info, args.archive)
+    try:
+        written = model_backends.write_model(args.output, args.format, source)
+    except (model_format.ModelFormatError, OSError) as e:
+        logger.error("Nie udało się zapisać %s: %s", args.output, e)
+        return 1
+    except ImportError as e:
+        logger.error("Brak zależności dla formatu %s: %s", args.format, e)
+        return 1
+    print(
+        json.dumps(
+            {"output": args.output, "format": args.format, "bytes": written},
+            ensure_ascii=False,
+        )
+    )
+    return 0
+
+
+def cmd_gui(args):
+    import importlib
+
+    from PyQt6.QtWidgets import QApplication
+
+    module = importlib.import_module(GUI_MODULES[args.variant])
+    if args.profile is not None:
+        # Po imporcie modułu - create_model konfiguruje profilowanie ze zmiennych
+        import model_profile
+
+        log_file_path = getattr(module, "log_file_path", None)
+        directory = os.path.dirname(os.path.abspath(log_file_path)) if log_file_path else None
+        model_profile.configure(args.profile, directory)
+    app = QApplication([sys.argv[0]] + args.qt_args)
+    window = module.ModelCreator()
+    window.show()
+    return app.exec()
+
+
+def build_parser():
+    import model_backends
+
+    parser = argparse.ArgumentParser(prog="model", description="Narzędzia plików .model.")
+    parser.add_argument("--log-level", default="WARNING")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    info_parser = subparsers.add_parser("info", help="Pokaż indeks i info.json")
+    info_parser.add_argument("paths", nargs="+")
+    info_parser.set_defaults(func=cmd_info)
+
+    verify_parser = subparsers.add_parser("verify", help="Zweryfikuj pliki .model")
+    verify_parser.add_argument("paths", nargs="+", help="Pliki lub katalogi")
+    verify_parser.add_argument("--level", choices=("quick", "full"), default="full")
+    verify_parser.set_defaults(func=cmd_verify)
+
+    pack_parser = subparsers.add_parser("pack", help="Utwórz plik .model z luźnych plików")
+    pack_parser.add_argument("preview")
+    pack_parser.add_argument("info")
+    pack_parser.add_argument("archive")
+    pack_parser.add_argument("-o", "--output", required=True)
+    pack_parser.add_argument(
+        "--format", choices=sorted(model_backends.WRITERS), default="indexed"
+    )
+    pack_parser.set_defaults(func=cmd_pack)
+
+    gui_parser = subparsers.add_parser("gui", help="Uruchom aplikację okienkową")
+    gui_parser.add_argument("--variant", choices=sorted(GUI_MODULES), default="indexed")
+    gui_parser.add_argument(
+        "--profile", nargs="?", const="all", help="Profilowanie operacji (cpu|mem|all)"
+    )
+    gui_parser.add_argument("qt_args", nargs=argparse.REMAINDER, help="Argumenty dla Qt")
+    gui_parser.set_defaults(func=cmd_gui)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command != "gui":
+        # Aplikacje okienkowe konfigurują logowanie same (model_logging)
+        logging.basicConfig(
+            level=args.log_level.upper(),
+            format="%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s",
+        )
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
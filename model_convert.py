@@ -0,0 +1,131 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import model_backends
+
+# Strumieniowa konwersja plików .model między wariantami ZIP / HDF5 / indexed.
+# Wariant źródłowy jest wykrywany po pierwszych bajtach; sekcje są przepisywane
+# fragmentami (bez wczytywania całych sekcji do pamięci). Dla katalogu praca
+# rozkładana jest na pulę procesów, a na końcu raportowana jest przepustowość.
+
+logger = logging.getLogger(__name__)
+
+
+def convert_file(src_path, dst_path, target, chunk_size=model_backends.CHUNK_SIZE):
+    start = time.perf_counter()
+    result = {"src": src_path, "dst": dst_path, "target": target}
+    try:
+        with model_backends.open_model(src_path) as source:
+            result["variant"] = source.variant
+            if source.variant == target and os.path.abspath(src_path) == os.path.abspath(
+                dst_path
+            ):
+                result["skipped"] = True
+                result["bytes"] = 0
+                return result
+            os.makedirs(os.path.dirname(os.path.abspath(dst_path)), exist_ok=True)
+            # Atomowo (model_atomic) - także konwersja w miejscu (dst == src)
+            result["bytes"] = model_backends.write_model(
+                dst_path, target, source, chunk_size
+            )
+        result["ok"] = True
+    except Exception as e:
+        result["ok"] = False
+        result["error"] = str(e)
+        result.setdefault("bytes", 0)
+    finally:
+        result["elapsed_s"] = time.perf_counter() - start
+    return result
+
+
+def iter_model_files(root):
+    for dirpath, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            if filename.lower().endswith(".model"):
+                yield os.path.join(dirpath, filename)
+
+
+def convert_tree(src_root, dst_root, target, workers=None, chunk_size=model_backends.CHUNK_SIZE):
+    jobs = []
+    for src_path in iter_model_files(src_root):
+        rel_path = os.path.relpath(src_path, src_root)
+        dst_path = os.path.join(dst_root, rel_path) if dst_root else src_path
+        jobs.append((src_path, dst_path))
+
+    summary = {"files": len(jobs), "converted": 0, "skipped": 0, "failed": 0, "bytes": 0}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(convert_file, src, dst, target, chunk_size) for src, dst in jobs
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            if result.get("skipped"):
+                summary["skipped"] += 1
+            elif result.get("ok"):
+                summary["converted"] += 1
+                summary["bytes"] += result["bytes"]
+                logger.info(
+                    "Skonwertowano %s (%s -> %s, %d B, %.3f s)",
+                    result["src"],
+                    result["variant"],
+                    target,
+                    result["bytes"],
+                    result["elapsed_s"],
+                )
+            else:
+                summary["failed"] += 1
+                logger.error(
+                    "Nie udało się skonwertować %s: %s", result["src"], result["error"]
+                )
+    elapsed = time.perf_counter() - start
+    summary["elapsed_s"] = round(elapsed, 3)
+    summary["mb_per_s"] = round(summary["bytes"] / elapsed / 1e6, 2) if elapsed else 0.0
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Konwersja plików .model między wariantami ZIP, HDF5 i indexed."
+    )
+    parser.add_argument("src", help="Plik .model lub katalog")
+    parser.add_argument("--to", required=True, choices=sorted(model_backends.WRITERS))
+    parser.add_argument(
+        "--out", help="Plik/katalog docelowy (domyślnie konwersja w miejscu)"
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=model_backends.CHUNK_SIZE)
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        level=args.log_level.upper(),
+        format="%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s",
+    )
+
+    if os.path.isdir(args.src):
+        summary = convert_tree(args.src, args.out, args.to, args.workers, args.chunk_size)
+    else:
+        result = convert_file(args.src, args.out or args.src, args.to, args.chunk_size)
+        elapsed = result["elapsed_s"]
+        summary = {
+            "files": 1,
+            "converted": int(bool(result.get("ok"))),
+            "skipped": int(bool(result.get("skipped"))),
+            "failed": int(result.get("ok") is False),
+            "bytes": result["bytes"],
+            "elapsed_s": round(elapsed, 3),
+            "mb_per_s": round(result["bytes"] / elapsed / 1e6, 2) if elapsed else 0.0,
+        }
+        if result.get("error"):
+            summary["error"] = result["error"]
+    print(json.dumps(summary, indent=4))
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,419 @@
+import binascii
+import collections
+import hashlib
+import json
+import os
+import secrets
+import struct
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import model_format
+from model_backends import (
+    CHUNK_SIZE,
+    CRYPTO_ARCNAME,
+    SECTION_ARCNAMES,
+    ModelHandle,
+    check_zip_directory,
+    zip_member_data_offset,
+)
+from pread_reader import pread_exact
+
+try:
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+except ImportError:  # Szyfrowanie jest opcjonalne - reszta formatu działa bez niego
+    AESGCM = ChaCha20Poly1305 = HKDF = hashes = None
+    InvalidTag = ()
+
+# Szyfrowany wariant ZIP pliku .model (new_timer.py, new2.py). zipfile nie
+# szyfruje przy zapisie (setpassword działa tylko przy odczycie ZipCrypto),
+# więc sekcje szyfrujemy sami, AEAD w fragmentach o stałym rozmiarze:
+#   crypto.json          - parametry (szyfr, KDF, sól pliku, rozmiary sekcji)
+#   preview.jpg.enc      - ZIP_STORED, kolejne fragmenty: szyfrogram + tag (16 B)
+#   info.json.enc
+#   <archiwum>.enc
+# Klucz główny = scrypt(hasło, sól KDF); klucz pliku = HKDF(klucz główny, sól
+# pliku), więc nonce może być deterministyczne: identyfikator sekcji (4 B) +
+# numer fragmentu (8 B). AAD wiąże fragment z nazwą członka, numerem i
+# rozmiarem sekcji - podmiana, przestawienie albo obcięcie fragmentów kończy
+# się błędem uwierzytelnienia. Pole "check" (tag pustego szyfrogramu) odróżnia
+# złe hasło od uszkodzonych danych.
+# Każdy fragment odszyfrowuje się niezależnie, więc preview i info.json czyta
+# się bez dotykania archiwum, a archiwum - równolegle w puli wątków i od
+# dowolnego miejsca (read_range).
+
+CRYPTO_FORMAT = "cfab-model-aead"
+CRYPTO_VERSION = 1
+DEFAULT_CIPHER = "aes-256-gcm"
+CIPHERS = {
+    "aes-256-gcm": lambda key: AESGCM(key),
+    "chacha20-poly1305": lambda key: ChaCha20Poly1305(key),
+}
+KEY_SIZE = 32
+TAG_SIZE = 16
+SALT_SIZE = 16
+# scrypt: ~32 MiB pamięci i ~0.1 s na wyprowadzenie klucza
+DEFAULT_KDF = {"name": "scrypt", "n": 2**15, "r": 8, "p": 1}
+SCRYPT_MAXMEM = 128 * 1024 * 1024
+SECTION_IDS = {"check": 0, "preview": 1, "info": 2, "archive": 3}
+NONCE = struct.Struct(">IQ")
+AAD_PREFIX = b"CFAB-AEAD1\x00"
+DEFAULT_WORKERS = min(8, os.cpu_count() or 1)
+
+
+class ModelCryptoError(model_format.ModelFormatError):
+    pass
+
+
+class InvalidPasswordError(ModelCryptoError):
+    pass
+
+
+def require_crypto():
+    if AESGCM is None:
+        raise ModelCryptoError(
+            "Szyfrowanie plików .model wymaga pakietu 'cryptography' "
+            "(pip install cryptography)."
+        )
+
+
+def new_kdf_params(**overrides):
+    params = dict(DEFAULT_KDF, **overrides)
+    params["salt"] = secrets.token_hex(SALT_SIZE)
+    return params
+
+
+def derive_master_key(password, kdf):
+    if kdf.get("name") != "scrypt":
+        raise ModelCryptoError(f"Nieobsługiwana funkcja KDF: {kdf.get('name')!r}.")
+    if isinstance(password, str):
+        password = password.encode("utf-8")
+    try:
+        return hashlib.scrypt(
+            password,
+            salt=binascii.unhexlify(kdf["salt"]),
+            n=int(kdf["n"]),
+            r=int(kdf["r"]),
+            p=int(kdf["p"]),
+            maxmem=SCRYPT_MAXMEM,
+            dklen=KEY_SIZE,
+        )
+    except (KeyError, ValueError, binascii.Error) as e:
+        raise ModelCryptoError(f"Niepoprawne parametry KDF: {e}")
+
+
+def derive_file_key(master_key, file_salt):
+    require_crypto()
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=KEY_SIZE,
+        salt=file_salt,
+        info=AAD_PREFIX + b"file-key",
+    ).derive(master_key)
+
+
+def chunk_count(size, chunk_size):
+    # Pusta sekcja ma jeden pusty fragment - inaczej jej obcięcie byłoby niewykrywalne
+    return max(1, -(-size // chunk_size))
+
+
+def encrypted_size(size, chunk_size):
+    return size + chunk_count(size, chunk_size) * TAG_SIZE
+
+
+def _aad(arcname, index, size):
+    return AAD_PREFIX + arcname.encode("utf-8") + b"\x00" + struct.pack(">QQ", index, size)
+
+
+def _check_aad(header):
+    return AAD_PREFIX + json.dumps(
+        [header["cipher"], header["chunk_size"], header["file_salt"]]
+    ).encode("ascii")
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    # Wspólna pula dla wszystkich uchwytów - serwer otwiera wiele modeli naraz
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = int(os.environ.get("CFAB_MODEL_CRYPTO_WORKERS", DEFAULT_WORKERS))
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, workers), thread_name_prefix="model-crypto"
+            )
+        return _executor
+
+
+def _map_ordered(fn, items, workers):
+    # Jak executor.map, ale z ograniczonym oknem zadań w locie (pamięć) i
+    # anulowaniem reszty, gdy konsument przerwie iterację
+    if workers <= 1:
+        for item in items:
+            yield fn(item)
+        return
+    executor = get_executor()
+    pending = collections.deque()
+    items = iter(items)
+    try:
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _rechunk(chunks, chunk_size):
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        while len(buffer) >= chunk_size:
+            yield bytes(buffer[:chunk_size])
+            del buffer[:chunk_size]
+    if buffer:
+        yield bytes(buffer)
+
+
+def write_encrypted_zip(
+    output_path,
+    source,
+    password=None,
+    master_key=None,
+    kdf=None,
+    cipher=DEFAULT_CIPHER,
+    chunk_size=CHUNK_SIZE,
+    workers=DEFAULT_WORKERS,
+):
+    # password -> nowa sól KDF (albo podane kdf); master_key + kdf -> klucz już
+    # wyprowadzony dla tej grupy soli (np. z pamięci podręcznej kluczy)
+    require_crypto()
+    if cipher not in CIPHERS:
+        raise ModelCryptoError(f"Nieobsługiwany szyfr: {cipher!r}.")
+    if master_key is None:
+        if not password:
+            raise ModelCryptoError("Szyfrowanie wymaga hasła albo klucza.")
+        kdf = kdf or new_kdf_params()
+        master_key = derive_master_key(password, kdf)
+    elif kdf is None:
+        raise ModelCryptoError("Klucz główny wymaga parametrów KDF (sól) do zapisu w pliku.")
+    file_salt = secrets.token_bytes(SALT_SIZE)
+    aead = CIPHERS[cipher](derive_file_key(master_key, file_salt))
+
+    sections = {}
+    for name in model_format.SECTION_NAMES:
+        arcname = SECTION_ARCNAMES.get(name, source.archive_filename) + ".enc"
+        sections[name] = {"arcname": arcname, "size": source.section_size(name)}
+    sections["archive"]["filename"] = source.archive_filename
+    header = {
+        "format": CRYPTO_FORMAT,
+        "version": CRYPTO_VERSION,
+        "cipher": cipher,
+        "kdf": kdf,
+        "file_salt": file_salt.hex(),
+        "chunk_size": chunk_size,
+        "sections": sections,
+    }
+    header["check"] = aead.encrypt(
+        NONCE.pack(SECTION_IDS["check"], 0), b"", _check_aad(header)
+    ).hex()
+
+    written = 0
+    with zipfile.ZipFile(output_path, "w", zipfile.ZIP_STORED) as model_zip:
+        model_zip.writestr(
+            CRYPTO_ARCNAME, json.dumps(header, indent=4).encode("utf-8")
+        )
+        for name in model_format.SECTION_NAMES:
+            entry = sections[name]
+            size, arcname = entry["size"], entry["arcname"]
+            section_id = SECTION_IDS[name]
+
+            def encrypt(job, section_id=section_id, arcname=arcname, size=size):
+                index, plaintext = job
+                return aead.encrypt(
+                    NONCE.pack(section_id, index), plaintext, _aad(arcname, index, size)
+                )
+
+            zinfo = zipfile.ZipInfo(arcname)
+            zinfo.compress_type = zipfile.ZIP_STORED
+            zinfo.file_size = encrypted_size(size, chunk_size)
+            plaintext_chunks = _rechunk(source.iter_section(name, chunk_size), chunk_size)
+            jobs = enumerate(plaintext_chunks) if size else iter([(0, b"")])
+            section_written = 0
+            with model_zip.open(
+                zinfo, "w", force_zip64=zinfo.file_size >= zipfile.ZIP64_LIMIT
+            ) as member:
+                for ciphertext in _map_ordered(encrypt, jobs, workers):
+                    member.write(ciphertext)
+                    section_written += len(ciphertext) - TAG_SIZE
+            if section_written != size:
+                raise ModelCryptoError(
+                    f"Sekcja '{name}' zmieniła rozmiar podczas szyfrowania "
+                    f"({section_written} zamiast {size} bajtów)."
+                )
+            written += section_written
+    return written
+
+
+def is_encrypted_zip(path):
+    try:
+        with zipfile.ZipFile(path, "r") as model_zip:
+            return CRYPTO_ARCNAME in model_zip.namelist()
+    except zipfile.BadZipFile:
+        return False
+
+
+def read_crypto_header(path):
+    with open(path, "rb") as f:
+        check_zip_directory(f, path)
+    with zipfile.ZipFile(path, "r") as model_zip:
+        try:
+            zinfo = model_zip.getinfo(CRYPTO_ARCNAME)
+        except KeyError:
+            raise ModelCryptoError(f"Plik '{path}' nie jest zaszyfrowanym plikiem .model.")
+        model_format.check_read_budget(zinfo.file_size, f"{path}: {CRYPTO_ARCNAME}")
+        try:
+            header = json.loads(model_zip.read(zinfo).decode("utf-8"))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise ModelCryptoError(f"Uszkodzony {CRYPTO_ARCNAME} w '{path}': {e}")
+        members = {zinfo.filename: zinfo for zinfo in model_zip.infolist()}
+    if (
+        not isinstance(header, dict)
+        or header.get("format") != CRYPTO_FORMAT
+        or header.get("version") != CRYPTO_VERSION
+    ):
+        raise ModelCryptoError(f"Nieobsługiwana wersja szyfrowania w '{path}'.")
+    return header, members
+
+
+class EncryptedZipModel(ModelHandle):
+    variant = "zip-aead"
+
+    def __init__(
+        self, path, password=None, master_key=None, workers=DEFAULT_WORKERS, keyring=None
+    ):
+        # keyring (model_keys.KeyRing): klucz z pamięci podręcznej, pliku kluczy
+        # lub agenta - scrypt tylko raz na grupę soli
+        require_crypto()
+        self.path = path
+        self.workers = workers
+        self.header, members = read_crypto_header(path)
+        try:
+            self.kdf = self.header["kdf"]
+            cipher = self.header["cipher"]
+            self.chunk_size = int(self.header["chunk_size"])
+            file_salt = binascii.unhexlify(self.header["file_salt"])
+            check = binascii.unhexlify(self.header["check"])
+            sections = self.header["sections"]
+            self._sections = {
+                name: (sections[name]["arcname"], int(sections[name]["size"]))
+                for name in model_format.SECTION_NAMES
+            }
+            self.archive_filename = str(sections["archive"]["filename"])
+        except (KeyError, TypeError, ValueError, binascii.Error) as e:
+            raise ModelCryptoError(f"Niekompletny nagłówek szyfrowania w '{path}': {e}")
+        if cipher not in CIPHERS or self.chunk_size <= 0:
+            raise ModelCryptoError(f"Nieobsługiwane parametry szyfrowania w '{path}'.")
+        if master_key is None and keyring is not None:
+            master_key = keyring.master_key(self.kdf, password)
+        if master_key is None:
+            if not password:
+                raise InvalidPasswordError(f"Plik '{path}' wymaga hasła.")
+            master_key = derive_master_key(password, self.kdf)
+        self._aead = CIPHERS[cipher](derive_file_key(master_key, file_salt))
+        try:
+            self._aead.decrypt(
+                NONCE.pack(SECTION_IDS["check"], 0), check, _check_aad(self.header)
+            )
+        except InvalidTag:
+            if keyring is not None:
+                keyring.discard(self.kdf, password)
+            raise InvalidPasswordError(f"Nieprawidłowe hasło lub klucz dla '{path}'.")
+
+        self._offsets = {}
+        for name, (arcname, size) in self._sections.items():
+            zinfo = members.get(arcname)
+            if zinfo is None or zinfo.compress_type != zipfile.ZIP_STORED:
+                raise ModelCryptoError(f"Brak sekcji '{arcname}' (ZIP_STORED) w '{path}'.")
+            if zinfo.file_size != encrypted_size(size, self.chunk_size):
+                raise ModelCryptoError(
+                    f"Sekcja '{arcname}' ma {zinfo.file_size} bajtów, oczekiwano "
+                    f"{encrypted_size(size, self.chunk_size)}."
+                )
+            self._offsets[name] = zip_member_data_offset(path, zinfo)
+        self._fd = os.open(path, os.O_RDONLY | getattr(os, "O_CLOEXEC", 0))
+
+    def section_size(self, name):
+        return self._sections[name][1]
+
+    def chunk_count(self, name):
+        return chunk_count(self.section_size(name), self.chunk_size)
+
+    def read_chunk(self, name, index):
+        # Bezpieczne wątkowo: os.pread bez wspólnej pozycji pliku
+        arcname, size = self._sections[name]
+        if not 0 <= index < chunk_count(size, self.chunk_size):
+            raise IndexError(f"Fragment {index} poza sekcją '{name}'.")
+        start = index * self.chunk_size
+        length = min(self.chunk_size, size - start) + TAG_SIZE
+        offset = self._offsets[name] + index * (self.chunk_size + TAG_SIZE)
+        ciphertext = pread_exact(self._fd, length, offset)
+        if len(ciphertext) != length:
+            raise ModelCryptoError(f"Sekcja '{arcname}' jest obcięta (fragment {index}).")
+        try:
+            return self._aead.decrypt(
+                NONCE.pack(SECTION_IDS[name], index), ciphertext, _aad(arcname, index, size)
+            )
+        except InvalidTag:
+            raise ModelCryptoError(
+                f"Fragment {index} sekcji '{arcname}' jest uszkodzony lub zmodyfikowany."
+            )
+
+    def iter_chunks(self, name, start=0, stop=None, workers=None):
+        count = self.chunk_count(name)
+        stop = count if stop is None else min(stop, count)
+        workers = self.workers if workers is None else workers
+        indexes = range(start, stop)
+        return _map_ordered(
+            lambda index: self.read_chunk(name, index),
+            indexes,
+            workers if len(indexes) > 1 else 1,
+        )
+
+    def iter_section(self, name, chunk_size=None):
+        # Rozmiar fragmentu wyznacza szyfrowanie - chunk_size jest tu ignorowany
+        return self.iter_chunks(name)
+
+    def read_range(self, name, offset, size):
+        # Dostęp swobodny: odszyfrowuje tylko fragmenty pokrywające zakres
+        section_size = self.section_size(name)
+        if offset < 0 or size < 0 or offset > section_size:
+            raise ValueError(f"Zakres {offset}+{size} poza sekcją '{name}'.")
+        size = min(size, section_size - offset)
+        if size == 0:
+            return b""
+        first = offset // self.chunk_size
+        last = (offset + size - 1) // self.chunk_size
+        data = b"".join(self.iter_chunks(name, first, last + 1))
+        skip = offset - first * self.chunk_size
+        return data[skip : skip + size]
+
+    def index(self):
+        sections = super().index()
+        for name, (arcname, _) in self._sections.items():
+            sections[name]["arcname"] = arcname
+        return sections
+
+    def close(self):
+        fd, self._fd = getattr(self, "_fd", None), None
+        if fd is not None:
+            os.close(fd)
@@ -0,0 +1,512 @@
+import io
+import json
+import logging
+import os
+import struct
+import zlib
+
+# Wspólny, niezależny od Qt odczyt/zapis pliku .model z indeksem (create_model.py).
+# Układ pliku:
+#   [2 bajty długości indeksu (big-endian)][indeks JSON][preview.jpg][info.json][archiwum]
+# Offsety w indeksie są absolutne (liczone od początku pliku).
+
+logger = logging.getLogger(__name__)
+
+INDEX_LEN_FORMAT = ">H"
+INDEX_LEN_PREFIX_SIZE = struct.calcsize(INDEX_LEN_FORMAT)
+MAX_INDEX_LEN = 0xFFFF  # Więcej nie zmieści się w 2-bajtowym prefiksie
+SECTION_NAMES = ("preview", "info", "archive")
+SECTION_CONTENT_TYPES = {
+    "preview": "image/jpeg",
+    "info": "application/json",
+    "archive": "application/octet-stream",
+}
+COPY_CHUNK_SIZE = 1024 * 1024
+# Maksymalny rozmiar pojedynczej alokacji przy odczycie sekcji w całości.
+# Większe sekcje trzeba czytać strumieniowo (iter_section/open_section).
+DEFAULT_READ_BUDGET = 64 * 1024 * 1024
+
+_read_budget = int(os.environ.get("CFAB_MODEL_READ_BUDGET", DEFAULT_READ_BUDGET))
+
+
+class ModelFormatError(ValueError):
+    # ValueError, bo tak dotychczas zgłaszane są błędy parsowania indeksu w create_model.py
+    pass
+
+
+class ReadBudgetExceeded(ModelFormatError):
+    pass
+
+
+class UnsupportedLayoutError(ModelFormatError):
+    # Poprawny plik .model w wariancie, którego sekcji nie da się czytać wprost
+    # z pliku po offsetach (HDF5, skompresowany ZIP)
+    pass
+
+
+def get_read_budget():
+    return _read_budget
+
+
+def set_read_budget(budget):
+    global _read_budget
+    if budget < 1:
+        raise ValueError("Budżet odczytu musi być dodatni.")
+    _read_budget = budget
+
+
+def check_read_budget(size, what, budget=None):
+    budget = _read_budget if budget is None else budget
+    if size > budget:
+        raise ReadBudgetExceeded(
+            f"{what}: {size} bajtów przekracza budżet pamięci {budget} bajtów "
+            f"- wymagany odczyt strumieniowy."
+        )
+
+
+def parse_index_bytes(json_bytes):
+    try:
+        json_str = json_bytes.decode("utf-8")
+    except UnicodeDecodeError as e:
+        raise ModelFormatError(f"Indeks JSON nie jest poprawnym UTF-8: {e}") from e
+    json_str = json_str.rstrip("\x00").strip()
+    if not json_str:
+        raise ModelFormatError("Indeks JSON jest pusty.")
+    try:
+        index_dict = json.loads(json_str)
+    except json.JSONDecodeError as e:
+        raise ModelFormatError(f"Błąd dekodowania indeksu JSON: {e}") from e
+    if not isinstance(index_dict, dict):
+        raise ModelFormatError("Indeks JSON nie jest obiektem.")
+    return index_dict
+
+
+def read_index(f):
+    # Zwraca (indeks, długość nagłówka), gdzie nagłówek = prefiks + indeks JSON
+    f.seek(0)
+    packed_len = f.read(INDEX_LEN_PREFIX_SIZE)
+    if len(packed_len) < INDEX_LEN_PREFIX_SIZE:
+        raise ModelFormatError(
+            "Nie można odczytać długości nagłówka (za krótki plik)."
+        )
+    index_len = struct.unpack(INDEX_LEN_FORMAT, packed_len)[0]
+    json_bytes = f.read(index_len)
+    if len(json_bytes) < index_len:
+        raise ModelFormatError(
+            f"Oczekiwano {index_len} bajtów indeksu JSON, odczytano {len(json_bytes)}."
+        )
+    return parse_index_bytes(json_bytes), INDEX_LEN_PREFIX_SIZE + index_len
+
+
+def read_index_from_path(file_path):
+    with open(file_path, "rb") as f:
+        return read_index(f)
+
+
+def section_bounds(index_data, name):
+    try:
+        section = index_data[name]
+        offset = int(section["offset"])
+        size = int(section["size"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ModelFormatError(
+            f"Indeks nie zawiera poprawnego opisu sekcji '{name}'."
+        ) from e
+    if offset < 0 or size < 0:
+        raise ModelFormatError(f"Sekcja '{name}' ma ujemny offset lub rozmiar.")
+    return offset, size
+
+
+class SectionEntry:
+    # Opis jednej sekcji z indeksu; __slots__, bo przy skanach katalogów
+    # trzymamy w pamięci miliony takich rekordów
+    __slots__ = ("name", "offset", "size", "filename")
+
+    def __init__(self, name, offset, size, filename=None):
+        self.name = name
+        self.offset = offset
+        self.size = size
+        self.filename = filename
+
+    @property
+    def end(self):
+        return self.offset + self.size
+
+    def to_dict(self):
+        entry = {"offset": self.offset, "size": self.size}
+        if self.filename is not None:
+            entry["filename"] = self.filename
+        return entry
+
+    def __repr__(self):
+        return f"SectionEntry({self.name!r}, offset={self.offset}, size={self.size})"
+
+
+class ModelIndex:
+    # Indeks pliku .model jako rekord: sekcje + długość nagłówka (prefiks + JSON)
+    __slots__ = ("preview", "info", "archive", "header_len")
+
+    def __init__(self, preview, info, archive, header_len=None):
+        self.preview = preview
+        self.info = info
+        self.archive = archive
+        self.header_len = header_len
+
+    @classmethod
+    def from_dict(cls, index_data, header_len=None):
+        # Sprawdza całą strukturę w jednym przejściu i zgłasza wszystkie błędy naraz
+        errors = []
+        if not isinstance(index_data, dict):
+            raise ModelFormatError("Indeks JSON nie jest obiektem.")
+        entries = []
+        for name in SECTION_NAMES:
+            section = index_data.get(name)
+            if not isinstance(section, dict):
+                errors.append(f"Brak opisu sekcji '{name}' w indeksie.")
+                continue
+            values = []
+            for field in ("offset", "size"):
+                value = section.get(field)
+                # bool to podklasa int - "size": true nie jest rozmiarem
+                if type(value) is not int:
+                    errors.append(
+                        f"Sekcja '{name}': pole '{field}' musi być liczbą całkowitą."
+                    )
+                elif value < 0:
+                    errors.append(f"Sekcja '{name}': pole '{field}' jest ujemne.")
+                values.append(value)
+            filename = section.get("filename")
+            if name == "archive" and (not isinstance(filename, str) or not filename):
+                errors.append("Indeks nie zawiera nazwy pliku archiwum.")
+            entries.append(SectionEntry(name, values[0], values[1], filename))
+        if errors:
+            raise ModelFormatError(" ".join(errors))
+        return cls(*entries, header_len=header_len)
+
+    def sections(self):
+        return (self.preview, self.info, self.archive)
+
+    def section(self, name):
+        if name not in SECTION_NAMES:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def bounds_errors(self, file_size):
+        return validate_index_bounds(self.to_dict(), file_size)
+
+    def to_dict(self):
+        return {entry.name: entry.to_dict() for entry in self.sections()}
+
+
+def read_index_record(f):
+    index_data, header_len = read_index(f)
+    return ModelIndex.from_dict(index_data, header_len)
+
+
+def validate_index_bounds(index_data, file_size):
+    # Rozmiary z dysku są niezaufane: każda sekcja musi mieścić się w pliku (fstat)
+    errors = []
+    for name in SECTION_NAMES:
+        try:
+            offset, size = section_bounds(index_data, name)
+        except ModelFormatError as e:
+            errors.append(str(e))
+            continue
+        if offset + size > file_size:
+            errors.append(
+                f"Sekcja '{name}' ({offset}+{size}) wykracza poza koniec pliku ({file_size})."
+            )
+    archive = index_data.get("archive")
+    if not isinstance(archive, dict) or "filename" not in archive:
+        errors.append("Indeks nie zawiera nazwy pliku archiwum.")
+    return errors
+
+
+def check_index_bounds(index_data, file_size):
+    errors = validate_index_bounds(index_data, file_size)
+    if errors:
+        raise ModelFormatError(" ".join(errors))
+
+
+def read_section_bounded(f, index_data, name, file_size=None, budget=None):
+    # Odczyt sekcji w całości z pliku otwartego przez open() - z walidacją rozmiaru
+    offset, size = section_bounds(index_data, name)
+    if file_size is None:
+        file_size = os.fstat(f.fileno()).st_size
+    if offset + size > file_size:
+        raise ModelFormatError(
+            f"Sekcja '{name}' ({offset}+{size}) wykracza poza koniec pliku ({file_size})."
+        )
+    check_read_budget(size, f"Sekcja '{name}'", budget)
+    f.seek(offset)
+    return f.read(size)
+
+
+def build_index(preview_size, info_size, archive_filename, archive_size):
+    # Stabilizacja rozmiaru indeksu: offsety zależą od długości samego indeksu JSON
+    len_index_json_bytes = 0
+    for _ in range(5):
+        offset_preview = INDEX_LEN_PREFIX_SIZE + len_index_json_bytes
+        offset_info = offset_preview + preview_size
+        offset_archive = offset_info + info_size
+        index_data = {
+            "preview": {"offset": offset_preview, "size": preview_size},
+            "info": {"offset": offset_info, "size": info_size},
+            "archive": {
+                "filename": archive_filename,
+                "offset": offset_archive,
+                "size": archive_size,
+            },
+        }
+        index_json_bytes = json.dumps(index_data, indent=4).encode("utf-8")
+        if len(index_json_bytes) == len_index_json_bytes:
+            if len_index_json_bytes > MAX_INDEX_LEN:
+                raise ModelFormatError(
+                    f"Indeks JSON ({len_index_json_bytes} bajtów) nie mieści się w prefiksie."
+                )
+            return index_data, index_json_bytes
+        len_index_json_bytes = len(index_json_bytes)
+    raise ModelFormatError("Nie udało się ustabilizować rozmiaru indeksu JSON.")
+
+
+def copy_range(f_in, f_out, size, chunk_size=COPY_CHUNK_SIZE):
+    remaining = size
+    while remaining > 0:
+        chunk = f_in.read(min(chunk_size, remaining))
+        if not chunk:
+            raise ModelFormatError(
+                f"Nieoczekiwany koniec danych: brakuje {remaining} bajtów."
+            )
+        f_out.write(chunk)
+        remaining -= len(chunk)
+
+
+def write_model_file(output_path, preview_path, info_path, archive_path):
+    # Strumieniowy zapis pliku .model bez wczytywania sekcji do pamięci
+    preview_size = os.path.getsize(preview_path)
+    info_size = os.path.getsize(info_path)
+    archive_size = os.path.getsize(archive_path)
+    archive_filename = os.path.basename(archive_path)
+    index_data, index_json_bytes = build_index(
+        preview_size, info_size, archive_filename, archive_size
+    )
+    with open(output_path, "wb") as f_out:
+        f_out.write(struct.pack(INDEX_LEN_FORMAT, len(index_json_bytes)))
+        f_out.write(index_json_bytes)
+        for path, size in (
+            (preview_path, preview_size),
+            (info_path, info_size),
+            (archive_path, archive_size),
+        ):
+            with open(path, "rb") as f_in:
+                copy_range(f_in, f_out, size)
+    logger.debug("Zapisano plik .model %s", output_path)
+    return index_data
+
+
+# Układ "metafirst": wszystkie metadane w pierwszych METAFIRST_BLOCK_SIZE bajtach,
+# więc listowanie modeli (np. na dysku sieciowym) to jeden odczyt zamiast trzech
+# (prefiks, indeks, seek do info.json za wielomegabajtowym preview):
+#   [nagłówek stały][nazwa archiwum][info.json][dopełnienie do METAFIRST_ALIGN]
+#   [preview.jpg][archiwum]
+# Nagłówek stały (big-endian): sygnatura, wersja układu, flagi, długość bloku
+# metadanych, offset/rozmiar trzech sekcji, długość nazwy archiwum, pola
+# nazwa_modelu i wersja o stałej długości (UTF-8 dopełnione NUL) oraz CRC32
+# całego bloku metadanych (liczone z polem CRC równym zero).
+METAFIRST_MAGIC = b"CFABMETA"
+METAFIRST_VERSION = 1
+METAFIRST_BLOCK_SIZE = 64 * 1024
+METAFIRST_ALIGN = 4096
+METAFIRST_NAME_SIZE = 256
+METAFIRST_MODEL_VERSION_SIZE = 64
+METAFIRST_HEADER = struct.Struct(
+    f">8sHHI6QH{METAFIRST_NAME_SIZE}s{METAFIRST_MODEL_VERSION_SIZE}sI"
+)
+METAFIRST_CRC_OFFSET = METAFIRST_HEADER.size - 4
+METAFIRST_MAX_FILENAME = 255
+
+
+class MetaFirstHeader:
+    # Odczytany blok metadanych metafirst
+    __slots__ = (
+        "version",
+        "flags",
+        "index",
+        "model_name",
+        "model_version",
+        "info_bytes",
+    )
+
+    def __init__(self, version, flags, index, model_name, model_version, info_bytes):
+        self.version = version
+        self.flags = flags
+        self.index = index
+        self.model_name = model_name
+        self.model_version = model_version
+        self.info_bytes = info_bytes
+
+
+def _fixed_field(value, size):
+    # Obcięcie na granicy znaku UTF-8, dopełnienie NUL (struct "s")
+    data = str(value if value is not None else "").encode("utf-8")[:size]
+    return data.decode("utf-8", errors="ignore").encode("utf-8")
+
+
+def _align(value, alignment):
+    return (value + alignment - 1) // alignment * alignment
+
+
+def build_metafirst_header(
+    preview_size, info_bytes, archive_filename, archive_size, model_name, model_version
+):
+    # Zwraca (ModelIndex, blok metadanych dopełniony do offsetu preview)
+    filename_bytes = archive_filename.encode("utf-8")
+    if not filename_bytes or len(filename_bytes) > METAFIRST_MAX_FILENAME:
+        raise ModelFormatError(
+            f"Nazwa archiwum musi mieć od 1 do {METAFIRST_MAX_FILENAME} bajtów UTF-8."
+        )
+    info_offset = METAFIRST_HEADER.size + len(filename_bytes)
+    metadata_len = info_offset + len(info_bytes)
+    if metadata_len > METAFIRST_BLOCK_SIZE:
+        raise ModelFormatError(
+            f"info.json ({len(info_bytes)} bajtów) nie mieści się w bloku metadanych "
+            f"({METAFIRST_BLOCK_SIZE} bajtów) - użyj układu z indeksem."
+        )
+    preview_offset = _align(metadata_len, METAFIRST_ALIGN)
+    archive_offset = preview_offset + preview_size
+    index = ModelIndex(
+        SectionEntry("preview", preview_offset, preview_size),
+        SectionEntry("info", info_offset, len(info_bytes)),
+        SectionEntry("archive", archive_offset, archive_size, archive_filename),
+        header_len=metadata_len,
+    )
+    header = METAFIRST_HEADER.pack(
+        METAFIRST_MAGIC,
+        METAFIRST_VERSION,
+        0,
+        metadata_len,
+        preview_offset,
+        preview_size,
+        info_offset,
+        len(info_bytes),
+        archive_offset,
+        archive_size,
+        len(filename_bytes),
+        _fixed_field(model_name, METAFIRST_NAME_SIZE),
+        _fixed_field(model_version, METAFIRST_MODEL_VERSION_SIZE),
+        0,
+    )
+    block = bytearray(header + filename_bytes + info_bytes)
+    struct.pack_into(">I", block, METAFIRST_CRC_OFFSET, zlib.crc32(block))
+    block += bytes(preview_offset - metadata_len)
+    return index, bytes(block)
+
+
+def parse_metafirst_block(block, file_size=None):
+    if len(block) < METAFIRST_HEADER.size or not block.startswith(METAFIRST_MAGIC):
+        raise ModelFormatError("Brak sygnatury układu metafirst.")
+    (
+        _,
+        version,
+        flags,
+        metadata_len,
+        preview_offset,
+        preview_size,
+        info_offset,
+        info_size,
+        archive_offset,
+        archive_size,
+        filename_len,
+        model_name,
+        model_version,
+        crc,
+    ) = METAFIRST_HEADER.unpack_from(block)
+    if version > METAFIRST_VERSION:
+        raise ModelFormatError(f"Nieobsługiwana wersja układu metafirst: {version}.")
+    if metadata_len > min(len(block), METAFIRST_BLOCK_SIZE) or (
+        info_offset != METAFIRST_HEADER.size + filename_len
+        or info_offset + info_size != metadata_len
+    ):
+        raise ModelFormatError("Niespójna długość bloku metadanych metafirst.")
+    checked = bytearray(block[:metadata_len])
+    struct.pack_into(">I", checked, METAFIRST_CRC_OFFSET, 0)
+    if zlib.crc32(checked) != crc:
+        raise ModelFormatError("Błędna suma CRC32 bloku metadanych metafirst.")
+    try:
+        archive_filename = bytes(
+            block[METAFIRST_HEADER.size : METAFIRST_HEADER.size + filename_len]
+        ).decode("utf-8")
+        model_name = model_name.rstrip(b"\x00").decode("utf-8")
+        model_version = model_version.rstrip(b"\x00").decode("utf-8")
+    except UnicodeDecodeError as e:
+        raise ModelFormatError(f"Pola tekstowe metafirst nie są UTF-8: {e}") from e
+    index = ModelIndex(
+        SectionEntry("preview", preview_offset, preview_size),
+        SectionEntry("info", info_offset, info_size),
+        SectionEntry("archive", archive_offset, archive_size, archive_filename),
+        header_len=metadata_len,
+    )
+    if file_size is not None:
+        errors = index.bounds_errors(file_size)
+        if errors:
+            raise ModelFormatError(" ".join(errors))
+    return MetaFirstHeader(
+        version,
+        flags,
+        index,
+        model_name,
+        model_version,
+        bytes(block[info_offset:metadata_len]),
+    )
+
+
+def read_metafirst(f, file_size=None):
+    # Jeden odczyt z początku pliku daje indeks, info.json i pola kluczowe
+    f.seek(0)
+    return parse_metafirst_block(f.read(METAFIRST_BLOCK_SIZE), file_size)
+
+
+class SectionFile(io.RawIOBase):
+    # Tylko-do-odczytu widok na zakres [offset, offset + size) pliku, oparty o pread.
+    # Pozwala np. otworzyć osadzone archiwum przez zipfile bez kopiowania go do pamięci.
+    def __init__(self, fd, offset, size):
+        super().__init__()
+        self._fd = fd
+        self._offset = offset
+        self._size = size
+        self._pos = 0
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            new_pos = pos
+        elif whence == io.SEEK_CUR:
+            new_pos = self._pos + pos
+        elif whence == io.SEEK_END:
+            new_pos = self._size + pos
+        else:
+            raise ValueError(f"Nieprawidłowe whence: {whence}")
+        if new_pos < 0:
+            raise ValueError("Ujemna pozycja w sekcji.")
+        self._pos = new_pos
+        return self._pos
+
+    def readinto(self, buffer):
+        remaining = self._size - self._pos
+        if remaining <= 0:
+            return 0
+        length = min(len(buffer), remaining)
+        data = os.pread(self._fd, length, self._offset + self._pos)
+        buffer[: len(data)] = data
+        self._pos += len(data)
+        self.bytes_read += len(data)
+        return len(data)
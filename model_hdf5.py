@@ -0,0 +1,464 @@
+import io
+import os
+
+import h5py
+import numpy
+
+import model_format
+
+# Sekcje pliku .model w HDF5 (hdf5.py, model_backends.Hdf5Model) jako
+# fragmentowane (chunked) datasety 1-D uint8:
+#   preview.jpg, info.json, archive/<nazwa archiwum>
+# Rozmiar fragmentu i filtr (gzip, lzf, zstd) wybiera się przy zapisie;
+# HDF5 zapisuje je w pliku, więc czytelnik ich nie potrzebuje. Odczyt idzie
+# przez DatasetReader - strumieniowy, przeszukiwalny widok pliku, który
+# czyta tylko fragmenty pokrywające żądany zakres (read_direct do bufora
+# wywołującego, bez kopii pośredniej). Stary zapis hdf5.py (cały blob jako
+# jeden skalar) nadal da się odczytać, ale tylko w całości.
+# zstd wymaga pakietu hdf5plugin (rejestruje filtr w bibliotece HDF5) - przy
+# zapisie i przy odczycie; gzip i lzf są wbudowane w h5py.
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+# Pamięć podręczna fragmentów na plik (rdcc): kilka fragmentów, żeby odczyty
+# nie wyrównane do granic nie dekompresowały tego samego fragmentu dwa razy
+DEFAULT_CACHE_BYTES = 8 * 1024 * 1024
+COMPRESSIONS = ("none", "gzip", "lzf", "zstd")
+DEFAULT_LEVELS = {"gzip": 4, "zstd": 3}
+
+_plugins_loaded = False
+
+
+def load_plugins(required=False):
+    # hdf5plugin jest opcjonalny: bez niego zstd nie działa, reszta tak
+    global _plugins_loaded
+    if _plugins_loaded:
+        return True
+    try:
+        import hdf5plugin  # noqa: F401 - import rejestruje filtry
+    except ImportError:
+        if required:
+            raise model_format.ModelFormatError(
+                "Filtr zstd wymaga pakietu hdf5plugin (pip install hdf5plugin)."
+            )
+        return False
+    _plugins_loaded = True
+    return True
+
+
+def filter_options(compression=None, level=None):
+    if compression in (None, "none"):
+        return {}
+    if compression == "gzip":
+        return {"compression": "gzip", "compression_opts": level or DEFAULT_LEVELS["gzip"]}
+    if compression == "lzf":
+        return {"compression": "lzf"}
+    if compression == "zstd":
+        load_plugins(required=True)
+        import hdf5plugin
+
+        return dict(hdf5plugin.Zstd(clevel=level or DEFAULT_LEVELS["zstd"]))
+    raise model_format.ModelFormatError(f"Nieznany filtr HDF5: {compression!r}.")
+
+
+def open_file(path, mode="r", cache_bytes=DEFAULT_CACHE_BYTES, **kwargs):
+    load_plugins()
+    return h5py.File(path, mode, rdcc_nbytes=cache_bytes, **kwargs)
+
+
+def is_filtered(dataset):
+    return dataset.id.get_create_plist().get_nfilters() > 0
+
+
+def create_section(
+    h5f, dataset_name, size, chunk_size=DEFAULT_CHUNK_SIZE, compression=None, level=None
+):
+    if not size:
+        # HDF5 nie tworzy fragmentowanego datasetu o rozmiarze 0 - pusty, ciągły
+        return h5f.create_dataset(dataset_name, shape=(0,), dtype="uint8")
+    return h5f.create_dataset(
+        dataset_name,
+        shape=(size,),
+        dtype="uint8",
+        chunks=(min(chunk_size, size),),
+        **filter_options(compression, level),
+    )
+
+
+def write_section(
+    h5f,
+    dataset_name,
+    size,
+    chunks,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    compression=None,
+    level=None,
+):
+    # chunks - iterator bajtów o łącznej długości size; kawałki wyrównane do
+    # chunk_size trafiają w całe fragmenty HDF5 (bez czytania i ponownej kompresji)
+    dataset = create_section(h5f, dataset_name, size, chunk_size, compression, level)
+    position = 0
+    for chunk in chunks:
+        if position + len(chunk) > size:
+            raise model_format.ModelFormatError(
+                f"Dane sekcji '{dataset_name}' dłuższe niż deklarowane {size} bajtów."
+            )
+        dataset.write_direct(
+            numpy.frombuffer(chunk, dtype="uint8"),
+            dest_sel=numpy.s_[position : position + len(chunk)],
+        )
+        position += len(chunk)
+    if position != size:
+        raise model_format.ModelFormatError(
+            f"Sekcja '{dataset_name}' ma {position} bajtów zamiast {size}."
+        )
+    return dataset
+
+
+def iter_file_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def write_file_section(
+    h5f, dataset_name, path, chunk_size=DEFAULT_CHUNK_SIZE, compression=None, level=None
+):
+    return write_section(
+        h5f,
+        dataset_name,
+        os.path.getsize(path),
+        iter_file_chunks(path, chunk_size),
+        chunk_size,
+        compression,
+        level,
+    )
+
+
+class DatasetReader(io.RawIOBase):
+    # Widok datasetu 1-D uint8 (albo okna offset..offset+size w nim) jako plik:
+    # read/readinto/seek/tell
+    def __init__(self, dataset, offset=0, size=None):
+        super().__init__()
+        if len(dataset.shape) != 1 or dataset.dtype != numpy.uint8:
+            raise model_format.ModelFormatError(
+                f"Dataset '{dataset.name}' nie jest 1-D uint8 ({dataset.shape}, {dataset.dtype})."
+            )
+        if size is None:
+            size = dataset.shape[0] - offset
+        if offset < 0 or size < 0 or offset + size > dataset.shape[0]:
+            raise model_format.ModelFormatError(
+                f"Zakres {offset}+{size} poza datasetem '{dataset.name}' ({dataset.shape[0]})."
+            )
+        self._dataset = dataset
+        self._offset = offset
+        self.size = size
+        self._position = 0
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = pos
+        elif whence == io.SEEK_CUR:
+            position = self._position + pos
+        elif whence == io.SEEK_END:
+            position = self.size + pos
+        else:
+            raise ValueError(f"Nieprawidłowe whence: {whence}")
+        if position < 0:
+            raise ValueError("Ujemna pozycja w sekcji.")
+        self._position = position
+        return position
+
+    def tell(self):
+        return self._position
+
+    def readinto(self, buffer):
+        count = min(len(buffer), self.size - self._position)
+        if count <= 0:
+            return 0
+        target = numpy.frombuffer(buffer, dtype="uint8", count=count)
+        start = self._offset + self._position
+        self._dataset.read_direct(target, source_sel=numpy.s_[start : start + count])
+        self._position += count
+        self.bytes_read += count
+        return count
+
+
+def open_section_reader(dataset, file_size):
+    # Deklarowany rozmiar jest niezaufany: bez filtrów nie może przekraczać
+    # rozmiaru pliku. Stary skalar czytamy w całości (w granicach budżetu).
+    nbytes = dataset.size * dataset.dtype.itemsize
+    if not is_filtered(dataset) and nbytes > file_size:
+        raise model_format.ModelFormatError(
+            f"Dataset '{dataset.name}' deklaruje {nbytes} bajtów, plik ma {file_size}."
+        )
+    if dataset.shape == ():
+        # ds[()] obcina końcowe bajty NUL - czytamy surowy bufor
+        model_format.check_read_budget(nbytes, f"Dataset '{dataset.name}'")
+        buffer = numpy.empty((), dtype=dataset.dtype)
+        dataset.read_direct(buffer)
+        return io.BytesIO(buffer.tobytes())
+    return DatasetReader(dataset)
+
+
+# Biblioteka modeli: wiele plików .model w jednym pliku HDF5, zamiast osobnego
+# pliku (i superbloku) na model. SWMR nie pozwala tworzyć nowych grup ani
+# datasetów po włączeniu trybu zapisu, więc biblioteka ma stały układ z
+# datasetami rozszerzalnymi, do których pisarz tylko dopisuje:
+#   /data  - uint8, sekcje wszystkich modeli jedna za drugą (fragmenty + filtr)
+#   /index - wiersz na model: nazwa, wersja, nazwa archiwum, offsety i rozmiary
+# Pisarz (jeden) dopisuje sekcje do /data, flush, dopiero potem wiersz do
+# /index, flush - czytelnik widzący wiersz widzi też jego dane. Czytelnicy
+# (dowolnie wiele procesów) otwierają plik raz z swmr=True i przez refresh()
+# dostają nowe modele bez ponownego otwierania. Ta sama nazwa dopisana
+# ponownie to nowa wersja - obowiązuje ostatni wiersz.
+
+LIBRARY_FORMAT = "cfab-model-library"
+LIBRARY_VERSION = 1
+LIBRARY_NAME_SIZE = 255
+LIBRARY_VERSION_SIZE = 64
+LIBRARY_INDEX_CHUNK = 256
+LIBRARY_INDEX_DTYPE = numpy.dtype(
+    [
+        ("name", f"S{LIBRARY_NAME_SIZE}"),
+        ("version", f"S{LIBRARY_VERSION_SIZE}"),
+        ("archive_filename", f"S{LIBRARY_NAME_SIZE}"),
+        ("preview_offset", "<u8"),
+        ("preview_size", "<u8"),
+        ("info_offset", "<u8"),
+        ("info_size", "<u8"),
+        ("archive_offset", "<u8"),
+        ("archive_size", "<u8"),
+    ]
+)
+
+
+def _fixed_bytes(value, size, what):
+    data = str(value).encode("utf-8")
+    if len(data) > size:
+        raise model_format.ModelFormatError(f"{what} dłuższa niż {size} bajtów UTF-8.")
+    return data
+
+
+class LibraryModel:
+    # Jeden model z biblioteki - ten sam interfejs sekcji co model_backends.ModelHandle
+    variant = "hdf5-library"
+
+    def __init__(self, library, row):
+        self._data = library._data
+        self.name = row["name"].decode("utf-8")
+        self.version = row["version"].decode("utf-8")
+        self.archive_filename = row["archive_filename"].decode("utf-8")
+        self._sections = {
+            name: (int(row[f"{name}_offset"]), int(row[f"{name}_size"]))
+            for name in model_format.SECTION_NAMES
+        }
+
+    def section_size(self, name):
+        return self._sections[name][1]
+
+    def open_section(self, name):
+        offset, size = self._sections[name]
+        return DatasetReader(self._data, offset, size)
+
+    def iter_section(self, name, chunk_size=DEFAULT_CHUNK_SIZE):
+        with self.open_section(name) as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def read_section(self, name, budget=None):
+        model_format.check_read_budget(self.section_size(name), f"Sekcja '{name}'", budget)
+        with self.open_section(name) as f:
+            return f.read()
+
+    def index(self):
+        sections = {
+            name: {"offset": offset, "size": size}
+            for name, (offset, size) in self._sections.items()
+        }
+        sections["archive"]["filename"] = self.archive_filename
+        return sections
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ModelLibrary:
+    def __init__(
+        self,
+        path,
+        mode="r",
+        chunk_size=DEFAULT_CHUNK_SIZE,
+        compression=None,
+        level=None,
+        cache_bytes=DEFAULT_CACHE_BYTES,
+    ):
+        # mode "r" - czytelnik SWMR; "a" - jedyny pisarz (tworzy plik, jeśli go nie ma)
+        if mode not in ("r", "a"):
+            raise ValueError(f"Nieobsługiwany tryb biblioteki: {mode!r}")
+        self.path = path
+        self.writable = mode == "a"
+        if self.writable:
+            self._h5f = open_file(path, "a", cache_bytes, libver="latest")
+            if not len(self._h5f):
+                self._create_layout(chunk_size, compression, level)
+        else:
+            self._h5f = open_file(path, "r", cache_bytes, libver="latest", swmr=True)
+        if self._h5f.attrs.get("format") != LIBRARY_FORMAT:
+            self._h5f.close()
+            raise model_format.ModelFormatError(f"'{path}' nie jest biblioteką modeli HDF5.")
+        self._index = self._h5f["index"]
+        self._data = self._h5f["data"]
+        if self.writable:
+            # Od tej chwili czytelnicy mogą otwierać plik równolegle z zapisem
+            self._h5f.swmr_mode = True
+        self._rows = {}
+        self._known = 0
+        self.refresh()
+
+    def _create_layout(self, chunk_size, compression, level):
+        self._h5f.attrs["format"] = LIBRARY_FORMAT
+        self._h5f.attrs["version"] = LIBRARY_VERSION
+        self._h5f.create_dataset(
+            "index",
+            shape=(0,),
+            maxshape=(None,),
+            dtype=LIBRARY_INDEX_DTYPE,
+            chunks=(LIBRARY_INDEX_CHUNK,),
+        )
+        self._h5f.create_dataset(
+            "data",
+            shape=(0,),
+            maxshape=(None,),
+            dtype="uint8",
+            chunks=(chunk_size,),
+            **filter_options(compression, level),
+        )
+
+    def refresh(self):
+        # Nowe wiersze indeksu (od pisarza w innym procesie); dane przed indeksem
+        if not self.writable:
+            self._index.refresh()
+            self._data.refresh()
+        count = self._index.shape[0]
+        if count > self._known:
+            rows = self._index[self._known : count]
+            for row in rows:
+                self._rows[row["name"].decode("utf-8")] = row
+            self._known = count
+        return count
+
+    def names(self):
+        return sorted(self._rows)
+
+    def __contains__(self, name):
+        return name in self._rows
+
+    def __len__(self):
+        return len(self._rows)
+
+    def entries(self):
+        return [
+            {
+                "name": name,
+                "version": row["version"].decode("utf-8"),
+                "archive_filename": row["archive_filename"].decode("utf-8"),
+                "sizes": {
+                    section: int(row[f"{section}_size"])
+                    for section in model_format.SECTION_NAMES
+                },
+            }
+            for name, row in sorted(self._rows.items())
+        ]
+
+    def open_model(self, name):
+        row = self._rows.get(name)
+        if row is None and self.refresh() and name in self._rows:
+            row = self._rows[name]
+        if row is None:
+            raise KeyError(f"Brak modelu '{name}' w bibliotece '{self.path}'.")
+        return LibraryModel(self, row)
+
+    def _append_data(self, chunks, size, what):
+        offset = self._data.shape[0]
+        self._data.resize((offset + size,))
+        position = offset
+        for chunk in chunks:
+            if position + len(chunk) > offset + size:
+                raise model_format.ModelFormatError(f"Sekcja {what} dłuższa niż {size} bajtów.")
+            self._data.write_direct(
+                numpy.frombuffer(chunk, dtype="uint8"),
+                dest_sel=numpy.s_[position : position + len(chunk)],
+            )
+            position += len(chunk)
+        if position != offset + size:
+            raise model_format.ModelFormatError(
+                f"Sekcja {what} ma {position - offset} bajtów zamiast {size}."
+            )
+        return offset
+
+    def add_model(self, source, name=None, version=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        # source - dowolny ModelHandle (np. model_backends.FileSetSource);
+        # nazwa i wersja domyślnie z info.json
+        if not self.writable:
+            raise model_format.ModelFormatError("Biblioteka otwarta tylko do odczytu.")
+        import model_schema
+
+        info_size = source.section_size("info")
+        model_format.check_read_budget(info_size, "info.json")
+        info_bytes = b"".join(source.iter_section("info", chunk_size))
+        info_json, errors = model_schema.parse_info(info_bytes)
+        if name is None:
+            if info_json is None or errors:
+                raise model_format.ModelFormatError(
+                    "Niepoprawny info.json: " + "; ".join(errors)
+                )
+            name = info_json["nazwa_modelu"]
+        if version is None:
+            version = (info_json or {}).get("wersja", "")
+        row = numpy.zeros((), dtype=LIBRARY_INDEX_DTYPE)
+        row["name"] = _fixed_bytes(name, LIBRARY_NAME_SIZE, "Nazwa modelu")
+        row["version"] = _fixed_bytes(version, LIBRARY_VERSION_SIZE, "Wersja")
+        row["archive_filename"] = _fixed_bytes(
+            source.archive_filename, LIBRARY_NAME_SIZE, "Nazwa archiwum"
+        )
+        for section in model_format.SECTION_NAMES:
+            size = source.section_size(section)
+            chunks = [info_bytes] if section == "info" else source.iter_section(section, chunk_size)
+            row[f"{section}_offset"] = self._append_data(chunks, size, section)
+            row[f"{section}_size"] = size
+        # Kolejność flush: najpierw dane, potem indeks
+        self._data.flush()
+        count = self._index.shape[0]
+        self._index.resize((count + 1,))
+        self._index[count] = row
+        self._index.flush()
+        self.refresh()
+        return count
+
+    def close(self):
+        self._h5f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,432 @@
+import argparse
+import getpass
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import socket
+import socketserver
+import stat
+import sys
+import tempfile
+import threading
+import time
+
+import model_crypto
+
+# Zarządzanie kluczami szyfrowanych plików .model (model_crypto).
+# scrypt jest celowo wolny (~0.1 s), więc przy tysiącach plików klucz główny
+# wyprowadzamy raz na grupę soli (parametry KDF zapisane w crypto.json) i
+# trzymamy w pamięci:
+#   KeyCache - klucze w pamięci z TTL i jawnym wipe() (zerowanie buforów)
+#   KeyRing  - skąd wziąć klucz: pamięć -> plik kluczy -> agent -> hasło (scrypt)
+#   plik kluczy - JSON {"version": 1, "keys": [{"kdf": {...}, "key": hex}]},
+#                 tylko dla właściciela (0600), jak klucze ssh
+#   agent    - proces trzymający klucze i odpowiadający na gnieździe UNIX
+#              (JSON w wierszu: {"op": "get", "kdf": {...}} -> {"key": hex|null})
+# Zmienne środowiskowe dla default_keyring() (verify_batch, model_server):
+#   CFAB_MODEL_KEYFILE, CFAB_MODEL_KEY_AGENT (ścieżka gniazda), CFAB_MODEL_KEY_TTL (s)
+# Użycie:
+#   python model_keys.py add KEYFILE MODEL      - dopisz klucz grupy soli pliku MODEL
+#   python model_keys.py agent SOCKET [--keyfile K] [--ask-password]
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_S = 15 * 60
+KEYFILE_VERSION = 1
+AGENT_TIMEOUT_S = 5.0
+MAX_AGENT_LINE = 64 * 1024
+
+
+def kdf_group(kdf):
+    # Identyfikator grupy soli: te same parametry KDF -> ten sam klucz główny
+    return json.dumps(kdf, sort_keys=True, separators=(",", ":"))
+
+
+class KeyCache:
+    # Klucz wpisu to grupa soli; obok klucza trzymamy odcisk hasła (HMAC z
+    # losowym sekretem procesu), żeby inne hasło dla tej grupy nie dostało
+    # cudzego klucza. Samo hasło nie jest przechowywane. Kopie bytes zwracane
+    # z get() nie podlegają wipe() - zeruje się tylko bufor pamięci podręcznej.
+    def __init__(self, ttl_s=DEFAULT_TTL_S):
+        self.ttl_s = ttl_s
+        self._secret = secrets.token_bytes(32)
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "wipes": 0}
+
+    def _fingerprint(self, password):
+        if password is None:
+            return None
+        if isinstance(password, str):
+            password = password.encode("utf-8")
+        return hmac.new(self._secret, password, hashlib.sha256).digest()
+
+    def get(self, kdf, password=None):
+        group = kdf_group(kdf)
+        with self._lock:
+            entry = self._entries.get(group)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            key, fingerprint, expires_at = entry
+            if self.ttl_s is not None and time.monotonic() >= expires_at:
+                self._drop(group)
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+            if password is not None and fingerprint not in (None, self._fingerprint(password)):
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            return bytes(key)
+
+    def put(self, kdf, key, password=None, replace=True):
+        # replace=False: nie nadpisuj żywego wpisu - klucz z błędnego hasła nie
+        # może wypchnąć klucza, który już otworzył pliki tej grupy
+        group = kdf_group(kdf)
+        now = time.monotonic()
+        expires_at = now + self.ttl_s if self.ttl_s is not None else None
+        with self._lock:
+            entry = self._entries.get(group)
+            if not replace and entry is not None and (entry[2] is None or now < entry[2]):
+                return
+            self._drop(group)
+            self._entries[group] = (bytearray(key), self._fingerprint(password), expires_at)
+
+    def find(self, password):
+        # Dowolna żywa grupa soli wyprowadzona z tego hasła -> (kdf, klucz)
+        fingerprint = self._fingerprint(password)
+        now = time.monotonic()
+        with self._lock:
+            for group, (key, entry_fingerprint, expires_at) in self._entries.items():
+                if entry_fingerprint == fingerprint and (expires_at is None or now < expires_at):
+                    self._stats["hits"] += 1
+                    return json.loads(group), bytes(key)
+        return None
+
+    def discard(self, kdf, password=None):
+        # Z hasłem: tylko wpis wyprowadzony z tego hasła
+        group = kdf_group(kdf)
+        with self._lock:
+            entry = self._entries.get(group)
+            if entry is not None and (
+                password is None or entry[1] == self._fingerprint(password)
+            ):
+                self._drop(group)
+
+    def wipe(self):
+        with self._lock:
+            for group in list(self._entries):
+                self._drop(group)
+            self._stats["wipes"] += 1
+
+    def _drop(self, group):
+        entry = self._entries.pop(group, None)
+        if entry is not None:
+            key = entry[0]
+            key[:] = bytes(len(key))
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["keys"] = len(self._entries)
+        return stats
+
+
+def _check_keyfile_permissions(path):
+    st = os.stat(path)
+    if os.name == "posix" and st.st_mode & (stat.S_IRWXG | stat.S_IRWXO):
+        raise model_crypto.ModelCryptoError(
+            f"Plik kluczy '{path}' jest dostępny dla innych użytkowników "
+            f"(uprawnienia {stat.S_IMODE(st.st_mode):o}) - ustaw 600."
+        )
+
+
+def load_keyfile(path):
+    _check_keyfile_permissions(path)
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise model_crypto.ModelCryptoError(f"Uszkodzony plik kluczy '{path}': {e}")
+    if not isinstance(data, dict) or data.get("version") != KEYFILE_VERSION:
+        raise model_crypto.ModelCryptoError(f"Nieobsługiwany plik kluczy '{path}'.")
+    keys = {}
+    for record in data.get("keys", []):
+        try:
+            keys[kdf_group(record["kdf"])] = bytes.fromhex(record["key"])
+        except (KeyError, TypeError, ValueError) as e:
+            raise model_crypto.ModelCryptoError(f"Niepoprawny wpis w pliku kluczy '{path}': {e}")
+    return keys
+
+
+def add_to_keyfile(path, kdf, key):
+    # Zapis przez plik tymczasowy (0600) + os.replace - bez chwili z kluczem na widoku
+    records = {}
+    if os.path.exists(path):
+        records = load_keyfile(path)
+    records[kdf_group(kdf)] = key
+    data = {
+        "version": KEYFILE_VERSION,
+        "keys": [
+            {"kdf": json.loads(group), "key": value.hex()} for group, value in records.items()
+        ],
+    }
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".keys-")
+    try:
+        os.fchmod(fd, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def agent_request(socket_path, request, timeout=AGENT_TIMEOUT_S):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as f:
+            line = f.readline(MAX_AGENT_LINE)
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError:
+        raise model_crypto.ModelCryptoError("Niepoprawna odpowiedź agenta kluczy.")
+
+
+def agent_get_key(socket_path, kdf, timeout=AGENT_TIMEOUT_S):
+    response = agent_request(socket_path, {"op": "get", "kdf": kdf}, timeout)
+    if response.get("error"):
+        raise model_crypto.ModelCryptoError(f"Agent kluczy: {response['error']}")
+    key = response.get("key")
+    return bytes.fromhex(key) if key else None
+
+
+class KeyRing:
+    def __init__(self, cache=None, keyfile=None, agent_socket=None, password=None):
+        # password - hasło sesji (np. podane raz w verify_batch/agencie); keyfile
+        # i agent pytane tylko, gdy wywołujący nie podał własnego hasła
+        self.cache = cache if cache is not None else KeyCache()
+        self.keyfile = keyfile
+        self.agent_socket = agent_socket
+        self.password = password
+        self._keyfile_keys = None
+        self._keyfile_stamp = None
+        self._lock = threading.Lock()
+        self.kdf_runs = 0
+
+    def _keyfile_key(self, kdf):
+        if not self.keyfile:
+            return None
+        # Plik wczytany ponownie po zmianie (add_to_keyfile podmienia go przez
+        # os.replace) - dopisany klucz działa bez restartu usługi
+        try:
+            st = os.stat(self.keyfile)
+        except FileNotFoundError:
+            self._keyfile_keys, self._keyfile_stamp = None, None
+            return None
+        stamp = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+        if self._keyfile_keys is None or stamp != self._keyfile_stamp:
+            self._keyfile_keys = load_keyfile(self.keyfile)
+            self._keyfile_stamp = stamp
+        return self._keyfile_keys.get(kdf_group(kdf))
+
+    def _agent_key(self, kdf):
+        if not self.agent_socket:
+            return None
+        try:
+            return agent_get_key(self.agent_socket, kdf)
+        except OSError as e:
+            logger.warning("Agent kluczy %s niedostępny: %s", self.agent_socket, e)
+            return None
+
+    def master_key(self, kdf, password=None):
+        key = self.cache.get(kdf, password)
+        if key is not None:
+            return key
+        # Blokada: wiele wątków z tą samą grupą soli -> jeden scrypt, nie N
+        with self._lock:
+            key = self.cache.get(kdf, password)
+            if key is not None:
+                return key
+            if password is None:
+                key = self._keyfile_key(kdf) or self._agent_key(kdf)
+                password = None if key is not None else self.password
+            if key is None and password:
+                key = model_crypto.derive_master_key(password, kdf)
+                self.kdf_runs += 1
+            if key is not None:
+                self.cache.put(kdf, key, password, replace=False)
+            return key
+
+    def writer_key(self, password):
+        # Nowe pliki z tym samym hasłem trafiają do istniejącej grupy soli -
+        # potem cała partia weryfikuje się z jednym scrypt
+        found = self.cache.find(password)
+        if found is not None:
+            return found
+        kdf = model_crypto.new_kdf_params()
+        return kdf, self.master_key(kdf, password)
+
+    def discard(self, kdf, password=None):
+        self.cache.discard(kdf, password)
+
+    def open(self, path, password=None, workers=model_crypto.DEFAULT_WORKERS):
+        return model_crypto.EncryptedZipModel(
+            path, password=password, workers=workers, keyring=self
+        )
+
+    def wipe(self):
+        self.cache.wipe()
+        self._keyfile_keys = None
+        self._keyfile_stamp = None
+        self.password = None
+
+    def stats(self):
+        stats = self.cache.stats()
+        stats["kdf_runs"] = self.kdf_runs
+        return stats
+
+
+_default_keyring = None
+_default_keyring_lock = threading.Lock()
+
+
+def default_keyring():
+    global _default_keyring
+    with _default_keyring_lock:
+        if _default_keyring is None:
+            ttl_s = float(os.environ.get("CFAB_MODEL_KEY_TTL", DEFAULT_TTL_S))
+            _default_keyring = KeyRing(
+                KeyCache(ttl_s),
+                keyfile=os.environ.get("CFAB_MODEL_KEYFILE"),
+                agent_socket=os.environ.get("CFAB_MODEL_KEY_AGENT"),
+            )
+        return _default_keyring
+
+
+class _AgentHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline(MAX_AGENT_LINE)
+        try:
+            request = json.loads(line)
+            op = request.get("op")
+            if op == "get":
+                key = self.server.keyring.master_key(request["kdf"])
+                response = {"key": key.hex() if key is not None else None}
+            elif op == "wipe":
+                self.server.keyring.cache.wipe()
+                response = {"ok": True}
+            elif op == "stats":
+                response = self.server.keyring.stats()
+            else:
+                response = {"error": f"Nieznana operacja: {op!r}"}
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            response = {"error": str(e)}
+        self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+
+class KeyAgent(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, keyring):
+        self.keyring = keyring
+        self.socket_path = socket_path
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        super().__init__(socket_path, _AgentHandler)
+
+    def server_bind(self):
+        # Gniazdo tylko dla właściciela: bind() w prywatnym katalogu (0700),
+        # chmod 600 i dopiero wtedy rename na docelową ścieżkę - bez chwili z
+        # uprawnieniami z umask i bez przełączania os.umask całego procesu
+        directory = tempfile.mkdtemp(
+            prefix=".key-agent-", dir=os.path.dirname(os.path.abspath(self.socket_path))
+        )
+        tmp_path = os.path.join(directory, "socket")
+        try:
+            self.socket.bind(tmp_path)
+            os.chmod(tmp_path, 0o600)
+            os.rename(tmp_path, self.socket_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            os.rmdir(directory)
+        self.server_address = self.socket_path
+
+    def start_in_thread(self):
+        thread = threading.Thread(target=self.serve_forever, name="model-key-agent", daemon=True)
+        thread.start()
+        return thread
+
+    def server_close(self):
+        super().server_close()
+        self.keyring.wipe()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+def cmd_add(args):
+    header, _ = model_crypto.read_crypto_header(args.model)
+    password = getpass.getpass("Hasło: ")
+    keyring = KeyRing(KeyCache(None))
+    with keyring.open(args.model, password) as model:
+        kdf = model.kdf
+    add_to_keyfile(args.keyfile, kdf, keyring.master_key(kdf, password))
+    keyring.wipe()
+    print(f"Dodano klucz grupy soli {header['kdf'].get('salt')} do {args.keyfile}")
+    return 0
+
+
+def cmd_agent(args):
+    password = getpass.getpass("Hasło: ") if args.ask_password else None
+    keyring = KeyRing(KeyCache(args.ttl), keyfile=args.keyfile, password=password)
+    agent = KeyAgent(args.socket, keyring)
+    logger.info("Agent kluczy nasłuchuje na %s", args.socket)
+    try:
+        agent.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        agent.server_close()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Klucze szyfrowanych plików .model.")
+    parser.add_argument("--log-level", default="INFO")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    add_parser = subparsers.add_parser("add", help="Dopisz klucz pliku .model do pliku kluczy")
+    add_parser.add_argument("keyfile")
+    add_parser.add_argument("model")
+    add_parser.set_defaults(func=cmd_add)
+
+    agent_parser = subparsers.add_parser("agent", help="Uruchom agenta kluczy")
+    agent_parser.add_argument("socket")
+    agent_parser.add_argument("--keyfile")
+    agent_parser.add_argument("--ask-password", action="store_true")
+    agent_parser.add_argument("--ttl", type=float, default=DEFAULT_TTL_S)
+    agent_parser.set_defaults(func=cmd_agent)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        level=args.log_level.upper(),
+        format="%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s",
+    )
+    try:
+        return args.func(args)
+    except (model_crypto.ModelCryptoError, OSError) as e:
+        logger.error("%s", e)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+# Nieblokujące logowanie dla narzędzi .model: wątek roboczy wrzuca rekord do
+# kolejki (QueueHandler), a zapis na dysk i konsolę robi osobny wątek
+# QueueListener. Plik logu jest rotowany (RotatingFileHandler).
+# Konfiguracja przez zmienne środowiskowe (lub argumenty setup_logging):
+#   CFAB_MODEL_LOG_LEVEL     - poziom, domyślnie INFO
+#   CFAB_MODEL_LOG_MAX_BYTES - rozmiar pliku przed rotacją, domyślnie 10 MiB
+#   CFAB_MODEL_LOG_BACKUPS   - liczba starych plików, domyślnie 5
+#   CFAB_MODEL_LOG_CONSOLE   - "0" wyłącza kopię logów na stdout
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s"
+DEFAULT_LEVEL = "INFO"
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUPS = 5
+
+_listener = None
+_queue_handler = None
+_atexit_registered = False
+
+
+def setup_logging(
+    log_file_path,
+    level=None,
+    max_bytes=None,
+    backup_count=None,
+    console=None,
+):
+    # Ponowne wywołanie przy działającym logowaniu zwraca istniejący listener -
+    # bez drugiego QueueHandlera (zdublowane rekordy)
+    global _listener, _queue_handler, _atexit_registered
+    if _listener is not None:
+        return _listener
+    level = (level or os.environ.get("CFAB_MODEL_LOG_LEVEL") or DEFAULT_LEVEL).upper()
+    max_bytes = int(
+        max_bytes or os.environ.get("CFAB_MODEL_LOG_MAX_BYTES") or DEFAULT_MAX_BYTES
+    )
+    backup_count = int(
+        backup_count
+        if backup_count is not None
+        else os.environ.get("CFAB_MODEL_LOG_BACKUPS", DEFAULT_BACKUPS)
+    )
+    if console is None:
+        console = os.environ.get("CFAB_MODEL_LOG_CONSOLE", "1") != "0"
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [
+        logging.handlers.RotatingFileHandler(
+            log_file_path,
+            maxBytes=max_bytes,
+            backupCount=backup_count,
+            encoding="utf-8",
+        )
+    ]
+    if console:
+        handlers.append(logging.StreamHandler(sys.stdout))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(level)
+    _queue_handler = logging.handlers.QueueHandler(log_queue)
+    root.addHandler(_queue_handler)
+    _listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+    _listener.start()
+    if not _atexit_registered:
+        atexit.register(shutdown_logging)
+        _atexit_registered = True
+    return _listener
+
+
+def shutdown_logging():
+    # Opróżnia kolejkę i zamyka pliki - wywoływane też przy wyjściu z procesu.
+    # QueueHandler znika z root loggera, inaczej późniejsze rekordy trafiałyby do
+    # kolejki, której nikt już nie czyta.
+    global _listener, _queue_handler
+    listener, _listener = _listener, None
+    handler, _queue_handler = _queue_handler, None
+    if handler is not None:
+        logging.getLogger().removeHandler(handler)
+    if listener is None:
+        return
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
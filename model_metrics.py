@@ -0,0 +1,241 @@
+import json
+import os
+import threading
+import time
+
+# Pomiary faz operacji na plikach .model (create, verify, load_info).
+# Operacja to ciąg faz: op.phase("nazwa") zamyka poprzednią fazę i otwiera
+# kolejną, op.add_bytes(n) dolicza bajty do bieżącej fazy, op.finish(failed)
+# zamyka całość. Czas mierzony jest przez perf_counter_ns.
+# Wyniki trafiają do:
+#   - logu JSON (jeden wiersz na operację, dopisywany),
+#   - pliku tekstowego Prometheusa (liczniki skumulowane w procesie,
+#     podmieniany atomowo - format textfile collectora node_exportera).
+#     Każdy proces (np. pracownicy puli verify_batch) pisze własny plik
+#     model_metrics_<pid>.prom z etykietą pid; sumy całego zadania to
+#     sum without (pid) (...). Proces potomny po fork zaczyna od zera.
+# Domyślnie wyłączone: start_operation() zwraca wtedy wspólny obiekt, którego
+# metody nic nie robią. Włączenie: configure(...) albo zmienna środowiskowa
+# CFAB_MODEL_METRICS_DIR (pliki model_metrics.jsonl i model_metrics_<pid>.prom).
+
+JSON_LOG_NAME = "model_metrics.jsonl"
+PROM_NAME = "model_metrics_{pid}.prom"  # {pid} w ścieżce - numer procesu
+PROM_PREFIX = "cfab_model"
+
+# Wywoływany z nazwą fazy przy każdym phase(), także gdy pomiary są wyłączone
+# (np. migawki pamięci model_profile na granicach faz)
+_phase_hook = None
+
+
+def set_phase_hook(hook):
+    global _phase_hook
+    _phase_hook = hook
+
+
+class _NoopOperation:
+    __slots__ = ()
+
+    def phase(self, name):
+        if _phase_hook is not None:
+            _phase_hook(name)
+
+    def add_bytes(self, count):
+        pass
+
+    def finish(self, failed=False):
+        return None
+
+
+_NOOP = _NoopOperation()
+
+
+class Operation:
+    __slots__ = (
+        "_registry",
+        "operation",
+        "path",
+        "failed",
+        "phases",
+        "_start_ns",
+        "_phase_name",
+        "_phase_start_ns",
+        "_phase_bytes",
+        "_finished",
+    )
+
+    def __init__(self, registry, operation, path):
+        self._registry = registry
+        self.operation = operation
+        self.path = path
+        self.failed = False
+        self.phases = []
+        self._start_ns = time.perf_counter_ns()
+        self._phase_name = None
+        self._phase_start_ns = self._start_ns
+        self._phase_bytes = 0
+        self._finished = False
+
+    def _close_phase(self, now_ns):
+        if self._phase_name is not None:
+            self.phases.append(
+                (self._phase_name, now_ns - self._phase_start_ns, self._phase_bytes)
+            )
+        self._phase_name = None
+        self._phase_bytes = 0
+        self._phase_start_ns = now_ns
+
+    def phase(self, name):
+        if _phase_hook is not None:
+            _phase_hook(name)
+        self._close_phase(time.perf_counter_ns())
+        self._phase_name = name
+
+    def add_bytes(self, count):
+        self._phase_bytes += count
+
+    def finish(self, failed=False):
+        if self._finished:
+            return None
+        self._finished = True
+        self.failed = failed
+        now_ns = time.perf_counter_ns()
+        self._close_phase(now_ns)
+        record = {
+            "ts": time.time(),
+            "operation": self.operation,
+            "path": self.path,
+            "status": "error" if self.failed else "ok",
+            "total_ms": round((now_ns - self._start_ns) / 1e6, 3),
+            "phases": [
+                {"name": name, "ms": round(ns / 1e6, 3), "bytes": count}
+                for name, ns, count in self.phases
+            ],
+        }
+        self._registry.record(self, now_ns - self._start_ns, record)
+        return record
+
+
+class MetricsRegistry:
+    def __init__(self, json_log_path=None, prom_path=None):
+        self.json_log_path = json_log_path
+        self.prom_path = prom_path
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._operations = {}  # (operacja, status) -> (liczba, suma ns)
+        self._phases = {}  # (operacja, faza) -> [liczba, suma ns, suma bajtów]
+
+    def start_operation(self, operation, path=None):
+        return Operation(self, operation, path)
+
+    def record(self, op, total_ns, record):
+        with self._lock:
+            if os.getpid() != self._pid:
+                # Proces potomny (fork) dziedziczy liczniki rodzica - nie są jego
+                self._pid = os.getpid()
+                self._operations = {}
+                self._phases = {}
+            key = (op.operation, record["status"])
+            count, ns = self._operations.get(key, (0, 0))
+            self._operations[key] = (count + 1, ns + total_ns)
+            for name, phase_ns, phase_bytes in op.phases:
+                totals = self._phases.setdefault((op.operation, name), [0, 0, 0])
+                totals[0] += 1
+                totals[1] += phase_ns
+                totals[2] += phase_bytes
+            if self.json_log_path:
+                with open(self.json_log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            if self.prom_path:
+                self._write_prom_locked()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "operations": {
+                    f"{op}/{status}": {"count": count, "seconds": ns / 1e9}
+                    for (op, status), (count, ns) in self._operations.items()
+                },
+                "phases": {
+                    f"{op}/{phase}": {"count": count, "seconds": ns / 1e9, "bytes": size}
+                    for (op, phase), (count, ns, size) in self._phases.items()
+                },
+            }
+
+    def _write_prom_locked(self):
+        pid_label = f'pid="{self._pid}"'
+        lines = [
+            f"# HELP {PROM_PREFIX}_operations_total Liczba operacji na plikach .model.",
+            f"# TYPE {PROM_PREFIX}_operations_total counter",
+        ]
+        for (op, status), (count, _) in sorted(self._operations.items()):
+            labels = f'operation="{op}",status="{status}",{pid_label}'
+            lines.append(f"{PROM_PREFIX}_operations_total{{{labels}}} {count}")
+        lines += [
+            f"# HELP {PROM_PREFIX}_operation_seconds_total Łączny czas operacji.",
+            f"# TYPE {PROM_PREFIX}_operation_seconds_total counter",
+        ]
+        for (op, status), (_, ns) in sorted(self._operations.items()):
+            labels = f'operation="{op}",status="{status}",{pid_label}'
+            lines.append(f"{PROM_PREFIX}_operation_seconds_total{{{labels}}} {ns / 1e9:.9f}")
+        lines += [
+            f"# HELP {PROM_PREFIX}_phase_seconds_total Łączny czas faz operacji.",
+            f"# TYPE {PROM_PREFIX}_phase_seconds_total counter",
+        ]
+        for (op, phase), (_, ns, _) in sorted(self._phases.items()):
+            labels = f'operation="{op}",phase="{phase}",{pid_label}'
+            lines.append(f"{PROM_PREFIX}_phase_seconds_total{{{labels}}} {ns / 1e9:.9f}")
+        lines += [
+            f"# HELP {PROM_PREFIX}_phase_bytes_total Bajty przetworzone w fazach operacji.",
+            f"# TYPE {PROM_PREFIX}_phase_bytes_total counter",
+        ]
+        for (op, phase), (_, _, size) in sorted(self._phases.items()):
+            labels = f'operation="{op}",phase="{phase}",{pid_label}'
+            lines.append(f"{PROM_PREFIX}_phase_bytes_total{{{labels}}} {size}")
+        # Zapis do pliku tymczasowego i os.replace - collector nie zobaczy połowy
+        # pliku; .tmp nie pasuje do wzorca *.prom collectora
+        prom_path = self.prom_path.replace("{pid}", str(self._pid))
+        tmp_path = f"{prom_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, prom_path)
+
+
+_registry = None
+
+
+def configure(json_log_path=None, prom_path=None):
+    # Bez ścieżek pomiary są wyłączone
+    global _registry
+    if json_log_path or prom_path:
+        _registry = MetricsRegistry(json_log_path, prom_path)
+    else:
+        _registry = None
+    return _registry
+
+
+def configure_from_env():
+    directory = os.environ.get("CFAB_MODEL_METRICS_DIR")
+    if not directory:
+        return configure()
+    os.makedirs(directory, exist_ok=True)
+    return configure(
+        os.path.join(directory, JSON_LOG_NAME), os.path.join(directory, PROM_NAME)
+    )
+
+
+def enabled():
+    return _registry is not None
+
+
+def get_registry():
+    return _registry
+
+
+def start_operation(operation, path=None):
+    registry = _registry
+    if registry is None:
+        return _NOOP
+    return registry.start_operation(operation, path)
+
+
+configure_from_env()
@@ -0,0 +1,334 @@
+import collections
+import os
+import struct
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import model_atomic
+import model_backends
+import model_format
+
+# Pakowanie katalogu źródłowego wprost do pliku .model (wariant ZIP), bez
+# osobnego budowania archiwum .zip i kopiowania go w drugim przebiegu.
+# Archiwum wewnętrzne (ZIP) powstaje w locie: pliki czytamy po kolei blokami
+# (--block-size), bloki kompresujemy równolegle w puli wątków (zlib zwalnia
+# GIL), a wynik w kolejności trafia strumieniowo do członka archiwum w .model,
+# razem z tablicą członków (katalogiem centralnym) na końcu - każdy bajt
+# danych jest czytany raz i zapisywany raz.
+# Blok to niezależny strumień raw deflate zakończony Z_SYNC_FLUSH (ostatni -
+# Z_FINISH), więc sklejone bloki są poprawnym strumieniem deflate (jak pigz).
+# Plik z jednego bloku ma znane CRC i rozmiary przed zapisem nagłówka
+# lokalnego; dłuższy dostaje deskryptor danych (bit 3) po danych.
+# Typy już skompresowane (jpg, zip, mp4...) są zapisywane bez kompresji
+# (ZIP_STORED), podobnie jednoblokowe pliki, którym deflate nic nie daje.
+# zstd nie jest używane: zipfile (weryfikatory, model_verify) czyta tylko
+# store/deflate/bzip2/lzma.
+# Plik .model powstaje atomowo (model_atomic) z rezerwacją miejsca na rozmiar
+# bez kompresji - górne oszacowanie, nadmiar jest obcinany po zapisie.
+
+BLOCK_SIZE = 1024 * 1024
+DEFAULT_LEVEL = 6
+DEFAULT_WORKERS = os.cpu_count() or 1
+STORED_SUFFIXES = frozenset(
+    ".7z .avi .bz2 .docx .flac .gif .gz .heic .jpeg .jpg .lz4 .mkv .mov .mp3 .mp4 "
+    ".ogg .png .rar .webm .webp .xlsx .xz .zip .zst".split()
+)
+# Bajtów nagłówków ZIP na członka ponad nazwę (lokalny + deskryptor + centralny,
+# z rozszerzeniami zip64) - do oszacowania, czy archiwum przekroczy 4 GiB
+MEMBER_OVERHEAD = 30 + 24 + 46 + 2 * 32
+DATA_DESCRIPTOR = struct.Struct("<4sLLL")
+DATA_DESCRIPTOR64 = struct.Struct("<4sLQQ")
+
+
+def collect_files(folder):
+    # Pliki (bez katalogów i dowiązań do katalogów) w stałej kolejności
+    folder = os.path.abspath(folder)
+    if not os.path.isdir(folder):
+        raise model_format.ModelFormatError(f"'{folder}' nie jest katalogiem.")
+    files = []
+    for root, dirs, names in os.walk(folder):
+        dirs.sort()
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            if os.path.isfile(path):
+                files.append((path, os.path.relpath(path, folder).replace(os.sep, "/")))
+    return files
+
+
+def archive_name(folder):
+    return os.path.basename(os.path.normpath(os.path.abspath(folder))) + ".zip"
+
+
+def estimated_archive_size(files):
+    members = sum(
+        os.path.getsize(path) + len(arcname.encode("utf-8")) + MEMBER_OVERHEAD
+        for path, arcname in files
+    )
+    return members + zipfile.sizeEndCentDir64 + zipfile.sizeEndCentDir
+
+
+def _compress_block(job):
+    # (metoda, dane, ostatni blok) -> skompresowany blok; jednoblokowe pliki
+    # deflate, które nie zyskują na kompresji, wracają jako ZIP_STORED
+    method, data, last, single, level = job
+    if method == zipfile.ZIP_STORED:
+        return method, data
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    payload = compressor.compress(data) + compressor.flush(
+        zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH
+    )
+    if single and len(payload) >= len(data):
+        return zipfile.ZIP_STORED, data
+    return method, payload
+
+
+def _encode_name(zinfo):
+    try:
+        return zinfo.filename.encode("ascii"), zinfo.flag_bits
+    except UnicodeEncodeError:
+        return zinfo.filename.encode("utf-8"), zinfo.flag_bits | 0x800
+
+
+class StreamingZipWriter:
+    # Minimalny zapis ZIP do strumienia bez seek (członek ZIP w .model):
+    # nagłówek lokalny, dane, ewentualnie deskryptor; katalog centralny w close()
+    def __init__(self, out):
+        self._out = out
+        self.position = 0
+        self.members = []
+
+    def _write(self, data):
+        self._out.write(data)
+        self.position += len(data)
+
+    def start_member(self, zinfo, zip64, descriptor):
+        zinfo.header_offset = self.position
+        if descriptor:
+            zinfo.flag_bits |= 0x08
+        self._write(zinfo.FileHeader(zip64))
+
+    def write_data(self, data):
+        self._write(data)
+
+    def end_member(self, zinfo, zip64):
+        if zinfo.flag_bits & 0x08:
+            descriptor = DATA_DESCRIPTOR64 if zip64 else DATA_DESCRIPTOR
+            self._write(
+                descriptor.pack(b"PK\x07\x08", zinfo.CRC, zinfo.compress_size, zinfo.file_size)
+            )
+        self.members.append(zinfo)
+
+    def close(self):
+        # Katalog centralny i rekord końcowy - jak zipfile.ZipFile._write_end_record
+        start = self.position
+        for zinfo in self.members:
+            dt = zinfo.date_time
+            dosdate = (dt[0] - 1980) << 9 | dt[1] << 5 | dt[2]
+            dostime = dt[3] << 11 | dt[4] << 5 | (dt[5] // 2)
+            extra = []
+            file_size, compress_size = zinfo.file_size, zinfo.compress_size
+            if file_size > zipfile.ZIP64_LIMIT or compress_size > zipfile.ZIP64_LIMIT:
+                extra += [file_size, compress_size]
+                file_size = compress_size = 0xFFFFFFFF
+            header_offset = zinfo.header_offset
+            if header_offset > zipfile.ZIP64_LIMIT:
+                extra.append(header_offset)
+                header_offset = 0xFFFFFFFF
+            extra_data = b""
+            min_version = 0
+            if extra:
+                extra_data = struct.pack(f"<HH{len(extra)}Q", 1, 8 * len(extra), *extra)
+                min_version = zipfile.ZIP64_VERSION
+            filename, flag_bits = _encode_name(zinfo)
+            self._write(
+                struct.pack(
+                    zipfile.structCentralDir,
+                    zipfile.stringCentralDir,
+                    max(min_version, zinfo.create_version),
+                    zinfo.create_system,
+                    max(min_version, zinfo.extract_version),
+                    zinfo.reserved,
+                    flag_bits,
+                    zinfo.compress_type,
+                    dostime,
+                    dosdate,
+                    zinfo.CRC,
+                    compress_size,
+                    file_size,
+                    len(filename),
+                    len(extra_data),
+                    0,
+                    0,
+                    zinfo.internal_attr,
+                    zinfo.external_attr,
+                    header_offset,
+                )
+                + filename
+                + extra_data
+            )
+        end = self.position
+        count = len(self.members)
+        size_cd = end - start
+        offset_cd = start
+        if (
+            count >= zipfile.ZIP_FILECOUNT_LIMIT
+            or offset_cd > zipfile.ZIP64_LIMIT
+            or size_cd > zipfile.ZIP64_LIMIT
+        ):
+            self._write(
+                struct.pack(
+                    zipfile.structEndArchive64,
+                    zipfile.stringEndArchive64,
+                    44,
+                    45,
+                    45,
+                    0,
+                    0,
+                    count,
+                    count,
+                    size_cd,
+                    offset_cd,
+                )
+            )
+            self._write(
+                struct.pack(
+                    zipfile.structEndArchive64Locator,
+                    zipfile.stringEndArchive64Locator,
+                    0,
+                    end,
+                    1,
+                )
+            )
+            count = min(count, 0xFFFF)
+            size_cd = min(size_cd, 0xFFFFFFFF)
+            offset_cd = min(offset_cd, 0xFFFFFFFF)
+        self._write(
+            struct.pack(
+                zipfile.structEndArchive,
+                zipfile.stringEndArchive,
+                0,
+                0,
+                count,
+                count,
+                size_cd,
+                offset_cd,
+                0,
+            )
+        )
+
+
+def _iter_blocks(files, level, block_size, stats):
+    # Jeden odczyt każdego pliku; zadania dla puli: (plik, zadanie kompresji)
+    for path, arcname in files:
+        zinfo = zipfile.ZipInfo.from_file(path, arcname, strict_timestamps=False)
+        suffix = os.path.splitext(arcname)[1].lower()
+        method = zipfile.ZIP_STORED if suffix in STORED_SUFFIXES else zipfile.ZIP_DEFLATED
+        size = zinfo.file_size
+        with open(path, "rb") as f:
+            read = 0
+            index = 0
+            while True:
+                data = f.read(block_size)
+                read += len(data)
+                last = len(data) < block_size or read >= size
+                if last and read != size:
+                    raise model_format.ModelFormatError(
+                        f"Plik '{path}' zmienił rozmiar podczas pakowania."
+                    )
+                single = index == 0 and last
+                yield zinfo, index, data, last, (method, data, last, single, level)
+                index += 1
+                if last:
+                    break
+        stats["files"] += 1
+        stats["bytes_in"] += size
+
+
+def _map_ordered(executor, items, window):
+    # Jak executor.map, ale z ograniczonym oknem zadań w locie (pamięć)
+    pending = collections.deque()
+    try:
+        for item in items:
+            *meta, job = item
+            pending.append((meta, executor.submit(_compress_block, job)))
+            if len(pending) >= window:
+                meta, future = pending.popleft()
+                yield meta, future.result()
+        while pending:
+            meta, future = pending.popleft()
+            yield meta, future.result()
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+
+def write_archive(
+    out, files, level=DEFAULT_LEVEL, block_size=BLOCK_SIZE, workers=DEFAULT_WORKERS
+):
+    # Archiwum ZIP z plików (collect_files) do dowolnego obiektu z write()
+    stats = {"files": 0, "bytes_in": 0, "stored": 0, "deflated": 0}
+    writer = StreamingZipWriter(out)
+    zip64 = False
+    with ThreadPoolExecutor(max(1, workers), thread_name_prefix="model-pack") as executor:
+        blocks = _iter_blocks(files, level, block_size, stats)
+        for (zinfo, index, data, last), (method, payload) in _map_ordered(
+            executor, blocks, max(1, workers) * 2
+        ):
+            if index == 0:
+                # Jak zipfile: zip64 z zapasem, gdy plik jest blisko 4 GiB
+                zip64 = zinfo.file_size * 1.05 > zipfile.ZIP64_LIMIT
+                zinfo.compress_type = method
+                zinfo.CRC = zlib.crc32(data)
+                zinfo.compress_size = len(payload)
+                writer.start_member(zinfo, zip64, descriptor=not last)
+            else:
+                zinfo.CRC = zlib.crc32(data, zinfo.CRC)
+                zinfo.compress_size += len(payload)
+            writer.write_data(payload)
+            if last:
+                writer.end_member(zinfo, zip64)
+                stats["stored" if method == zipfile.ZIP_STORED else "deflated"] += 1
+    writer.close()
+    stats["bytes_out"] = writer.position
+    return stats
+
+
+def pack_directory(
+    output_path,
+    preview_path,
+    info_path,
+    folder,
+    archive_filename=None,
+    level=DEFAULT_LEVEL,
+    block_size=BLOCK_SIZE,
+    workers=DEFAULT_WORKERS,
+    batch=None,
+):
+    # Plik .model (ZIP_STORED, jak model_backends.write_zip) z archiwum
+    # budowanym w locie z katalogu; zwraca statystyki pakowania.
+    # batch - model_atomic.SyncBatch (odłożony fsync i podmiana)
+    files = collect_files(folder)
+    if archive_filename is None:
+        archive_filename = archive_name(folder)
+    archive_size = estimated_archive_size(files)
+    size = (
+        archive_size
+        + os.path.getsize(preview_path)
+        + os.path.getsize(info_path)
+        + model_backends.OUTPUT_OVERHEAD
+    )
+    with model_atomic.AtomicOutput(output_path, size, batch) as output, zipfile.ZipFile(
+        output.file, "w", zipfile.ZIP_STORED
+    ) as model_zip:
+        for name, path in (("preview", preview_path), ("info", info_path)):
+            model_zip.write(path, model_backends.SECTION_ARCNAMES[name])
+        zinfo = zipfile.ZipInfo(archive_filename)
+        zinfo.compress_type = zipfile.ZIP_STORED
+        # Rozmiar nieznany z góry - zipfile poprawi nagłówek po zapisie (seek);
+        # zip64 wymuszamy, jeśli archiwum mogłoby przekroczyć 4 GiB
+        force_zip64 = archive_size >= zipfile.ZIP64_LIMIT
+        with model_zip.open(zinfo, "w", force_zip64=force_zip64) as member:
+            stats = write_archive(member, files, level, block_size, workers)
+    stats["archive_filename"] = archive_filename
+    return stats
@@ -0,0 +1,308 @@
+import argparse
+import functools
+import io
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+import model_metrics
+
+# Opcjonalne profilowanie operacji create/verify: cProfile + tracemalloc.
+# Włączenie: zmienna CFAB_MODEL_PROFILE ("1"/"all", "cpu" albo "mem") lub
+# flaga --profile w punktach wejścia (create_model.py, verify_batch.py).
+# Każda operacja zapisuje obok model_creator.log (albo w CFAB_MODEL_PROFILE_DIR):
+#   profile_<operacja>_<czas>_<pid>_<nr>.prof - surowe statystyki cProfile
+#   profile_<operacja>_<czas>_<pid>_<nr>.json - podsumowanie: czas, najdroższe
+#       funkcje, szczyt pamięci i miejsca alokacji z chwili największego zużycia
+# Migawki pamięci robione są na granicach faz model_metrics (hook), więc np.
+# wczytanie całego archiwum do pamięci widać z nazwą fazy i linią kodu.
+# Porównanie dwóch przebiegów: python model_profile.py diff A.json B.json
+
+MODES = ("cpu", "mem", "all")
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 20
+TRACEMALLOC_FRAMES = 1
+DEFAULT_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+_mode = None
+_directory = DEFAULT_DIRECTORY
+_active = None
+_active_lock = threading.Lock()
+_sequence = itertools.count()
+
+
+def parse_mode(value):
+    if not value or value == "0":
+        return None
+    value = value.lower()
+    if value in ("1", "true", "yes"):
+        return "all"
+    if value not in MODES:
+        raise ValueError(f"Nieznany tryb profilowania: {value} (dostępne: {', '.join(MODES)})")
+    return value
+
+
+def configure(mode=None, directory=None):
+    global _mode, _directory
+    _mode = parse_mode(mode) if isinstance(mode, str) else mode
+    _directory = directory or os.environ.get("CFAB_MODEL_PROFILE_DIR") or DEFAULT_DIRECTORY
+    return _mode
+
+
+def configure_from_env(directory=None):
+    return configure(os.environ.get("CFAB_MODEL_PROFILE"), directory)
+
+
+def enabled():
+    return _mode is not None
+
+
+class _NoopCapture:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopCapture()
+
+
+def _frame_key(frame):
+    return f"{frame.filename}:{frame.lineno}"
+
+
+def _function_key(func):
+    filename, lineno, name = func
+    return f"{os.path.basename(filename)}:{lineno}({name})"
+
+
+class Capture:
+    def __init__(self, operation, path, mode, directory):
+        self.operation = operation
+        self.path = path
+        self.mode = mode
+        self.directory = directory
+        self._profiler = None
+        self._started_tracemalloc = False
+        self._snapshot = None
+        self._snapshot_size = -1
+        self._snapshot_before = None
+        self._start = None
+        self.output_paths = None
+
+    def checkpoint(self, next_phase):
+        # Migawka (stan przed fazą next_phase) tylko gdy bieżące zużycie
+        # przekracza poprzednią migawkę
+        if not tracemalloc.is_tracing():
+            return
+        current, _ = tracemalloc.get_traced_memory()
+        if current > self._snapshot_size:
+            self._snapshot = tracemalloc.take_snapshot()
+            self._snapshot_size = current
+            self._snapshot_before = next_phase
+
+    def __enter__(self):
+        if self.mode in ("mem", "all"):
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+                self._started_tracemalloc = True
+            tracemalloc.reset_peak()
+            model_metrics.set_phase_hook(self.checkpoint)
+        if self.mode in ("cpu", "all"):
+            import cProfile  # Ładowane dopiero przy profilowaniu - szybszy start CLI
+
+            self._profiler = cProfile.Profile()
+        self._start = time.perf_counter()
+        if self._profiler is not None:
+            self._profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._profiler is not None:
+            self._profiler.disable()
+        wall_s = time.perf_counter() - self._start
+        summary = {
+            "operation": self.operation,
+            "path": self.path,
+            "mode": self.mode,
+            "pid": os.getpid(),
+            "ts": time.time(),
+            "wall_s": round(wall_s, 6),
+            "error": None if exc is None else f"{exc_type.__name__}: {exc}",
+        }
+        if self.mode in ("mem", "all"):
+            model_metrics.set_phase_hook(None)
+            self.checkpoint("end")
+            current, peak = tracemalloc.get_traced_memory()
+            summary["memory"] = {
+                "peak_bytes": peak,
+                "end_bytes": current,
+                "snapshot_before_phase": self._snapshot_before,
+                "top_allocations": self._top_allocations(),
+            }
+            self._snapshot = None
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+        try:
+            self._write(summary)
+        except OSError:
+            pass  # Profilowanie nie może przerwać właściwej operacji
+        return False
+
+    def _top_allocations(self):
+        if self._snapshot is None:
+            return []
+        snapshot = self._snapshot.filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            )
+        )
+        return [
+            {"site": _frame_key(stat.traceback[0]), "bytes": stat.size, "count": stat.count}
+            for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+        ]
+
+    def _top_functions(self):
+        import pstats
+
+        stats = pstats.Stats(self._profiler, stream=io.StringIO())
+        rows = []
+        for func, (cc, nc, tt, ct, _) in stats.stats.items():
+            rows.append(
+                {
+                    "function": _function_key(func),
+                    "ncalls": nc,
+                    "tottime_s": round(tt, 6),
+                    "cumtime_s": round(ct, 6),
+                }
+            )
+        rows.sort(key=lambda row: row["cumtime_s"], reverse=True)
+        return rows[:TOP_FUNCTIONS]
+
+    def _write(self, summary):
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d_%H%M%S")
+        base = os.path.join(
+            self.directory,
+            f"profile_{self.operation}_{stamp}_{os.getpid()}_{next(_sequence):04d}",
+        )
+        paths = {"summary": base + ".json"}
+        if self._profiler is not None:
+            summary["top_functions"] = self._top_functions()
+            paths["pstats"] = base + ".prof"
+            self._profiler.dump_stats(paths["pstats"])
+        with open(paths["summary"], "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=4, ensure_ascii=False)
+        self.output_paths = paths
+
+
+def capture(operation, path=None):
+    # Zagnieżdżone operacje (np. weryfikacja po zapisie) profilowane są w ramach
+    # zewnętrznej - cProfile nie pozwala na dwa aktywne profilery naraz
+    global _active
+    if _mode is None:
+        return _NOOP
+    with _active_lock:
+        if _active is not None:
+            return _NOOP
+        _active = Capture(operation, path, _mode, _directory)
+        return _ActiveCapture(_active)
+
+
+class _ActiveCapture:
+    def __init__(self, capture):
+        self._capture = capture
+
+    def __enter__(self):
+        return self._capture.__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        global _active
+        try:
+            return self._capture.__exit__(exc_type, exc, tb)
+        finally:
+            with _active_lock:
+                _active = None
+
+
+def profiled(operation):
+    # Dekorator dla bezargumentowych slotów GUI. Sygnatura wrappera to tylko
+    # (self): PyQt przekazuje argument "checked" sygnału clicked każdemu
+    # slotowi, który przyjmuje *args.
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self):
+            with capture(operation):
+                return func(self)
+
+        return wrapper
+
+    return decorator
+
+
+def load_summary(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def diff_summaries(before, after, top=15):
+    result = {
+        "operation": [before.get("operation"), after.get("operation")],
+        "wall_s": [before.get("wall_s"), after.get("wall_s")],
+    }
+    mem_before = before.get("memory") or {}
+    mem_after = after.get("memory") or {}
+    if mem_before or mem_after:
+        result["peak_bytes"] = [mem_before.get("peak_bytes"), mem_after.get("peak_bytes")]
+        sites_before = {s["site"]: s["bytes"] for s in mem_before.get("top_allocations", [])}
+        sites_after = {s["site"]: s["bytes"] for s in mem_after.get("top_allocations", [])}
+        deltas = [
+            (site, sites_after.get(site, 0) - sites_before.get(site, 0))
+            for site in set(sites_before) | set(sites_after)
+        ]
+        deltas.sort(key=lambda item: abs(item[1]), reverse=True)
+        result["allocation_deltas"] = [
+            {"site": site, "delta_bytes": delta} for site, delta in deltas[:top] if delta
+        ]
+    funcs_before = {f["function"]: f["cumtime_s"] for f in before.get("top_functions", [])}
+    funcs_after = {f["function"]: f["cumtime_s"] for f in after.get("top_functions", [])}
+    if funcs_before or funcs_after:
+        deltas = [
+            (name, funcs_after.get(name, 0.0) - funcs_before.get(name, 0.0))
+            for name in set(funcs_before) | set(funcs_after)
+        ]
+        deltas.sort(key=lambda item: abs(item[1]), reverse=True)
+        result["cumtime_deltas"] = [
+            {"function": name, "delta_s": round(delta, 6)} for name, delta in deltas[:top]
+        ]
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Narzędzia do profili operacji .model.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    diff_parser = subparsers.add_parser("diff", help="Porównaj dwa podsumowania profilu")
+    diff_parser.add_argument("before")
+    diff_parser.add_argument("after")
+    diff_parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args(argv)
+    if args.command == "diff":
+        report = diff_summaries(
+            load_summary(args.before), load_summary(args.after), args.top
+        )
+        print(json.dumps(report, indent=4, ensure_ascii=False))
+    return 0
+
+
+configure_from_env()
+
+if __name__ == "__main__":
+    sys.exit(main())
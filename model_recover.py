@@ -0,0 +1,262 @@
+import argparse
+import itertools
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+
+import model_format
+from model_backends import ZIP64_EOCD, ZIP64_LOCATOR, ZIP_EOCD, ZIP_MAX_COMMENT
+
+# Odzyskiwanie pliku .model (z indeksem) z uszkodzonym prefiksem lub indeksem JSON.
+# Plik jest mapowany (mmap) i przeszukiwany metodami find/rfind - bez pętli po
+# bajtach, więc nawet wielogigabajtowe pliki skanujemy w ułamku sekundy:
+#   - preview: pierwszy znacznik JPEG SOI za prefiksem (indeks JSON to ASCII,
+#     więc nie zawiera bajtów 0xFF),
+#   - archiwum: ZIP liczony wstecz od EOCD (offset katalogu centralnego jest
+#     względny wobec początku archiwum), a RAR po sygnaturze "Rar!",
+#   - info.json: wszystko między ostatnim JPEG EOI a archiwum (UTF-8 nigdy nie
+#     zawiera bajtu 0xFF, więc EOI nie może leżeć wewnątrz info.json).
+# Odbudowany indeks jest zapisywany w miejscu starego nagłówka (dopełniony
+# spacjami do tej samej długości) albo do nowego pliku (--out).
+
+logger = logging.getLogger(__name__)
+
+JPEG_SOI = b"\xff\xd8\xff"
+JPEG_EOI = b"\xff\xd9"
+RAR_MAGIC = b"Rar!\x1a\x07"
+ZIP_LOCAL_MAGIC = b"PK\x03\x04"
+ZIP_EOCD_MAGIC = b"PK\x05\x06"
+ZIP64_LOCATOR_MAGIC = b"PK\x06\x07"
+ZIP64_EOCD_MAGIC = b"PK\x06\x06"
+# Sekcje zaczynają się najdalej tuż za najdłuższym możliwym nagłówkiem
+HEADER_SEARCH_LIMIT = model_format.INDEX_LEN_PREFIX_SIZE + model_format.MAX_INDEX_LEN + 1
+# Preview i info.json są małe w porównaniu z archiwum: sygnatur archiwum bez
+# EOCD szukamy tylko w tym oknie za SOI, a nie w całym wielogigabajtowym pliku
+DEFAULT_SCAN_WINDOW = 256 * 1024 * 1024
+FILENAME_PATTERN = re.compile(rb'"filename"\s*:\s*"([^"\\/]{1,255})"')
+
+
+def find_zip_start(mm, search_from):
+    # Początek osadzonego ZIP z EOCD na końcu pliku; None, gdy brak EOCD
+    file_size = len(mm)
+    eocd = mm.rfind(ZIP_EOCD_MAGIC, max(search_from, file_size - ZIP_EOCD.size - ZIP_MAX_COMMENT))
+    if eocd < 0 or eocd + ZIP_EOCD.size > file_size:
+        return None
+    fields = ZIP_EOCD.unpack_from(mm, eocd)
+    size_cd, offset_cd = fields[5], fields[6]
+    directory_end = eocd
+    locator = eocd - ZIP64_LOCATOR.size
+    if locator >= search_from and mm[locator : locator + 4] == ZIP64_LOCATOR_MAGIC:
+        record = locator - ZIP64_EOCD.size
+        if record >= search_from and mm[record : record + 4] == ZIP64_EOCD_MAGIC:
+            zip64 = ZIP64_EOCD.unpack_from(mm, record)
+            size_cd, offset_cd = zip64[8], zip64[9]
+            directory_end = record
+    start = directory_end - size_cd - offset_cd
+    if start < search_from or mm[start : start + 4] not in (ZIP_LOCAL_MAGIC, ZIP_EOCD_MAGIC):
+        return None
+    return start
+
+
+def split_preview_info(mm, soi, archive_start):
+    # Zwraca (koniec preview, info.json) albo None, gdy między JPEG a archiwum
+    # nie ma poprawnego obiektu JSON
+    eoi = mm.rfind(JPEG_EOI, soi, archive_start)
+    if eoi < 0:
+        return None
+    preview_end = eoi + len(JPEG_EOI)
+    while preview_end < archive_start and mm[preview_end] == 0:
+        preview_end += 1  # Dopełnienie NUL za EOI należy do preview
+    info_size = archive_start - preview_end
+    if info_size <= 0 or info_size > model_format.get_read_budget():
+        return None
+    info_bytes = mm[preview_end:archive_start]
+    try:
+        info = json.loads(info_bytes.decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        return None
+    if not isinstance(info, dict):
+        return None
+    return preview_end, info_bytes
+
+
+def guess_archive_filename(mm, soi, path, kind):
+    # Nazwa archiwum z resztek starego indeksu, jeśli przetrwała
+    match = FILENAME_PATTERN.search(mm[model_format.INDEX_LEN_PREFIX_SIZE : soi])
+    if match:
+        try:
+            return match.group(1).decode("utf-8")
+        except UnicodeDecodeError:
+            pass
+    return f"{os.path.splitext(os.path.basename(path))[0]}.{kind}"
+
+
+def iter_archive_candidates(mm, soi, scan_end):
+    # Kolejne pozycje sygnatur RAR/ZIP rosnąco; każde find zatrzymuje się na
+    # pierwszym trafieniu, więc zwykle skanujemy tylko preview i info.json
+    next_hits = {}
+    for magic, kind in ((RAR_MAGIC, "rar"), (ZIP_LOCAL_MAGIC, "zip")):
+        position = mm.find(magic, soi, scan_end)
+        if position >= 0:
+            next_hits[magic] = (position, kind)
+    while next_hits:
+        magic = min(next_hits, key=lambda m: next_hits[m][0])
+        position, kind = next_hits[magic]
+        yield position, kind
+        position = mm.find(magic, position + 1, scan_end)
+        if position >= 0:
+            next_hits[magic] = (position, kind)
+        else:
+            del next_hits[magic]
+
+
+def scan_sections(path, scan_window=DEFAULT_SCAN_WINDOW):
+    # Zwraca (indeks, długość obszaru nagłówka) odtworzone z sygnatur sekcji
+    with open(path, "rb") as f:
+        file_size = os.fstat(f.fileno()).st_size
+        if file_size <= model_format.INDEX_LEN_PREFIX_SIZE:
+            raise model_format.ModelFormatError("Plik jest za krótki, by zawierać sekcje.")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            soi = mm.find(
+                JPEG_SOI,
+                model_format.INDEX_LEN_PREFIX_SIZE,
+                min(file_size, HEADER_SEARCH_LIMIT + len(JPEG_SOI)),
+            )
+            if soi < 0:
+                raise model_format.ModelFormatError(
+                    "Nie znaleziono znacznika JPEG SOI za nagłówkiem."
+                )
+            candidates = iter_archive_candidates(mm, soi, min(file_size, soi + scan_window))
+            zip_start = find_zip_start(mm, soi)
+            if zip_start is not None:
+                # EOCD wyznacza początek ZIP dokładnie - sprawdzany jako pierwszy
+                candidates = itertools.chain([(zip_start, "zip")], candidates)
+            for archive_start, kind in candidates:
+                split = split_preview_info(mm, soi, archive_start)
+                if split is None:
+                    continue
+                preview_end, info_bytes = split
+                filename = guess_archive_filename(mm, soi, path, kind)
+                break
+            else:
+                raise model_format.ModelFormatError(
+                    "Nie znaleziono archiwum ZIP/RAR poprzedzonego poprawnym info.json."
+                )
+    index_data = {
+        "preview": {"offset": soi, "size": preview_end - soi},
+        "info": {"offset": preview_end, "size": len(info_bytes)},
+        "archive": {
+            "filename": filename,
+            "offset": archive_start,
+            "size": file_size - archive_start,
+        },
+    }
+    return index_data, soi
+
+
+def encode_index(index_data, header_len):
+    # Indeks musi zmieścić się dokładnie w starym obszarze nagłówka
+    index_len = header_len - model_format.INDEX_LEN_PREFIX_SIZE
+    if index_len > model_format.MAX_INDEX_LEN:
+        return None
+    for kwargs in ({"indent": 4}, {"separators": (",", ":")}):
+        json_bytes = json.dumps(index_data, **kwargs).encode("utf-8")
+        if len(json_bytes) <= index_len:
+            return struct.pack(model_format.INDEX_LEN_FORMAT, index_len) + json_bytes.ljust(
+                index_len, b" "
+            )
+    return None
+
+
+def rewrite_header(path, index_data, header_len):
+    header = encode_index(index_data, header_len)
+    if header is None:
+        raise model_format.ModelFormatError(
+            "Odbudowany indeks nie mieści się w miejscu starego nagłówka - użyj --out."
+        )
+    with open(path, "r+b") as f:
+        f.write(header)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def write_recovered(path, output_path, index_data):
+    # Nowy plik z indeksem zbudowanym od zera; sekcje kopiowane strumieniowo
+    sizes = [index_data[name]["size"] for name in model_format.SECTION_NAMES]
+    new_index, index_json_bytes = model_format.build_index(
+        sizes[0], sizes[1], index_data["archive"]["filename"], sizes[2]
+    )
+    with open(path, "rb") as f_in, open(output_path, "wb") as f_out:
+        f_out.write(struct.pack(model_format.INDEX_LEN_FORMAT, len(index_json_bytes)))
+        f_out.write(index_json_bytes)
+        for name in model_format.SECTION_NAMES:
+            f_in.seek(index_data[name]["offset"])
+            model_format.copy_range(f_in, f_out, index_data[name]["size"])
+    return new_index
+
+
+def recover_file(path, output_path=None, dry_run=False, scan_window=DEFAULT_SCAN_WINDOW):
+    start = time.perf_counter()
+    index_data, header_len = scan_sections(path, scan_window)
+    scan_s = time.perf_counter() - start
+    if dry_run:
+        action = "none"
+    elif output_path:
+        index_data = write_recovered(path, output_path, index_data)
+        action = "written"
+    else:
+        rewrite_header(path, index_data, header_len)
+        action = "rewritten"
+    logger.info("Odzyskano indeks %s (%s) w %.3f s", path, action, scan_s)
+    return {
+        "path": path,
+        "action": action,
+        "output": output_path,
+        "index": index_data,
+        "scan_s": round(scan_s, 4),
+        "elapsed_s": round(time.perf_counter() - start, 4),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Odzyskiwanie indeksu uszkodzonych plików .model przez skan sygnatur."
+    )
+    parser.add_argument("paths", nargs="+", help="Pliki .model do naprawy")
+    parser.add_argument("--out", help="Zapisz naprawiony plik tutaj zamiast nadpisywać nagłówek")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Tylko pokaż odtworzony indeks"
+    )
+    parser.add_argument(
+        "--scan-window",
+        type=int,
+        default=DEFAULT_SCAN_WINDOW,
+        help="Ile bajtów za początkiem preview przeszukiwać w poszukiwaniu archiwum",
+    )
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        level=args.log_level.upper(),
+        format="%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s",
+    )
+    if args.out and len(args.paths) > 1:
+        parser.error("--out wymaga dokładnie jednego pliku wejściowego")
+    failed = 0
+    for path in args.paths:
+        try:
+            report = recover_file(path, args.out, args.dry_run, args.scan_window)
+        except (model_format.ModelFormatError, OSError) as e:
+            failed += 1
+            logger.error("Nie udało się odzyskać %s: %s", path, e)
+            continue
+        print(json.dumps(report, indent=4, ensure_ascii=False))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+import json
+import re
+
+# Walidacja info.json według schematu. Schemat jest "kompilowany" raz przy
+# imporcie do listy prostych sprawdzeń (krotki typów, skompilowane wyrażenia),
+# a validate() przechodzi je wszystkie i zwraca pełną listę błędów - nie
+# zatrzymuje się na pierwszym.
+# Pola schematu:
+#   type     - typ lub krotka typów wartości
+#   required - klucz musi wystąpić
+#   nonempty - napis nie może być pusty (po strip)
+#   pattern  - wyrażenie regularne dla napisów (np. numer wersji)
+# Klucze spoza schematu są dozwolone.
+
+# Numer wersji: 1, 1.0, v2.3.1, 1.0-beta, 1.0 rc1
+VERSION_PATTERN = r"^v?\d+(\.\d+)*([-+ ]?[0-9A-Za-z.]+)?$"
+
+INFO_SCHEMA = {
+    "nazwa_modelu": {"type": str, "required": True, "nonempty": True},
+    "wersja": {"type": (str, int, float), "required": True, "pattern": VERSION_PATTERN},
+    "autor": {"type": str},
+    "opis": {"type": str},
+}
+
+TYPE_NAMES = {
+    str: "tekst",
+    int: "liczba całkowita",
+    float: "liczba",
+    bool: "wartość logiczna",
+}
+
+
+def _type_name(types):
+    return " lub ".join(TYPE_NAMES.get(t, t.__name__) for t in types)
+
+
+def _compile_field(key, spec):
+    types = spec["type"] if isinstance(spec["type"], tuple) else (spec["type"],)
+    pattern = re.compile(spec["pattern"]) if "pattern" in spec else None
+    nonempty = spec.get("nonempty", False)
+    expected = _type_name(types)
+
+    def check(value, errors):
+        # bool to podklasa int - true/false nie jest numerem wersji
+        if (isinstance(value, bool) and bool not in types) or not isinstance(value, types):
+            errors.append(f"Klucz '{key}' w info.json musi być typu: {expected}.")
+            return
+        if isinstance(value, str):
+            if nonempty and not value.strip():
+                errors.append(f"Klucz '{key}' w info.json nie może być pusty.")
+            elif pattern is not None and not pattern.match(value):
+                errors.append(f"Klucz '{key}' w info.json ma niepoprawny format: {value!r}.")
+
+    return check
+
+
+class InfoValidator:
+    __slots__ = ("required_keys", "_checks")
+
+    def __init__(self, schema):
+        self.required_keys = tuple(
+            key for key, spec in schema.items() if spec.get("required")
+        )
+        self._checks = tuple(
+            (key, _compile_field(key, spec)) for key, spec in schema.items()
+        )
+
+    def validate(self, info_json):
+        if not isinstance(info_json, dict):
+            return ["Główna struktura info.json nie jest obiektem."]
+        errors = [
+            f"Brak wymaganego klucza '{key}' w info.json."
+            for key in self.required_keys
+            if key not in info_json
+        ]
+        for key, check in self._checks:
+            if key in info_json:
+                check(info_json[key], errors)
+        return errors
+
+    def parse(self, info_bytes):
+        # Zwraca (info_json albo None, lista wszystkich błędów)
+        try:
+            info_json = json.loads(info_bytes.decode("utf-8"))
+        except UnicodeDecodeError:
+            return None, ["info.json ma nieprawidłowe kodowanie (oczekiwano UTF-8)."]
+        except json.JSONDecodeError as e:
+            return None, [f"info.json nie jest poprawnym JSON: {e}"]
+        errors = self.validate(info_json)
+        if not isinstance(info_json, dict):
+            return None, errors
+        return info_json, errors
+
+
+INFO_VALIDATOR = InfoValidator(INFO_SCHEMA)
+REQUIRED_INFO_KEYS = INFO_VALIDATOR.required_keys
+
+
+def validate_info(info_json):
+    return INFO_VALIDATOR.validate(info_json)
+
+
+def parse_info(info_bytes):
+    return INFO_VALIDATOR.parse(info_bytes)
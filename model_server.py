@@ -0,0 +1,469 @@
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import sys
+import time
+import unicodedata
+import urllib.parse
+import zipfile
+from email.utils import formatdate
+
+import model_format
+from pread_reader import PReadModelReader, get_default_pool, pread_exact
+
+# Lokalny serwer HTTP udostępniający sekcje plików .model (z indeksem, metafirst
+# i ZIP_STORED - pread_reader.read_header; pozostałe warianty dostają 415):
+#   GET/HEAD /models/<id>/preview | /info | /archive
+# <id> to nazwa pliku .model (bez rozszerzenia) w katalogu korpusu.
+# Obsługuje nagłówki Range/If-Range, ETag/If-None-Match oraz wysyłkę
+# bez kopiowania (sendfile) bezpośrednio z pliku .model.
+# Szyfrowane pliki ZIP (model_crypto) są odszyfrowywane w locie, z kluczem
+# z pliku kluczy lub agenta (CFAB_MODEL_KEYFILE / CFAB_MODEL_KEY_AGENT).
+
+logger = logging.getLogger(__name__)
+
+ROUTE_RE = re.compile(r"^/models/([^/]+)/(preview|info|archive)$")
+MODEL_ID_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*$")
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+MAX_HEADER_BYTES = 16 * 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+# Jak długo nieudane otwarcie modelu jest zwracane bez ponownej próby - klucz
+# może dojść później (model_keys.py add, uruchomiony agent) przy tym samym pliku
+FAILURE_RETRY_S = 10.0
+
+REASONS = {
+    200: "OK",
+    206: "Partial Content",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    415: "Unsupported Media Type",
+    416: "Range Not Satisfiable",
+    431: "Request Header Fields Too Large",
+    500: "Internal Server Error",
+}
+
+
+def content_disposition(filename):
+    # Nazwa z pliku .model jest niezaufana: bez znaków sterujących, cudzysłowów
+    # i ukośników; pełna nazwa UTF-8 w filename* (RFC 6266/8187), a w filename
+    # zastępnik ASCII dla starszych klientów
+    filename = os.path.basename(filename.replace("\\", "/"))
+    filename = "".join(c for c in filename if c.isprintable() and c not in '"\\')
+    filename = filename.strip() or "archive"
+    fallback = "".join(
+        c if c.isascii() and c != "%" else "_"
+        for c in unicodedata.normalize("NFKD", filename)
+        if not unicodedata.combining(c)
+    )
+    encoded = urllib.parse.quote(filename, safe="")
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{encoded}"
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header_value, size):
+    # Zwraca (start, end) włącznie albo None, jeśli nagłówek należy zignorować.
+    # Wiele zakresów naraz nie jest obsługiwane - wtedy odsyłamy całość (RFC 9110).
+    match = RANGE_RE.match(header_value.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        suffix_len = int(last)
+        if suffix_len == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - suffix_len), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def hash_section(path, offset, size):
+    digest = hashlib.blake2b(digest_size=16)
+    with get_default_pool().fd(path) as fd:
+        position, end = offset, offset + size
+        while position < end:
+            chunk = pread_exact(fd, min(HASH_CHUNK_SIZE, end - position), position)
+            if not chunk:
+                raise model_format.ModelFormatError(
+                    "Sekcja wykracza poza koniec pliku."
+                )
+            digest.update(chunk)
+            position += len(chunk)
+    return digest.hexdigest()
+
+
+class ModelEntry:
+    def __init__(self, path, stat_key, mtime, index_data, encrypted=None):
+        self.path = path
+        self.stat_key = stat_key
+        self.last_modified = formatdate(mtime, usegmt=True)
+        self.index_data = index_data
+        self.encrypted = encrypted  # model_crypto.EncryptedZipModel albo None
+        self.etags = {}  # nazwa sekcji -> asyncio.Future z ETagiem
+
+    def section_size(self, section):
+        if self.encrypted is not None:
+            return self.encrypted.section_size(section)
+        return model_format.section_bounds(self.index_data, section)[1]
+
+    def close(self):
+        if self.encrypted is not None:
+            self.encrypted.close()
+
+
+def open_encrypted(path):
+    # Szyfrowany ZIP (model_crypto): klucz z model_keys.default_keyring - plik
+    # kluczy lub agent (CFAB_MODEL_KEYFILE / CFAB_MODEL_KEY_AGENT), scrypt
+    # najwyżej raz na grupę soli. Zwraca None dla zwykłych plików.
+    with open(path, "rb") as f:
+        head = f.read(4)
+    if head != b"PK\x03\x04":
+        return None
+    import model_backends
+    import model_keys
+    import model_zipcache
+
+    # Katalog centralny z model_zipcache - przy niezmienionym pliku bez parsowania
+    try:
+        with model_zipcache.open_directory(path) as directory:
+            if model_backends.CRYPTO_ARCNAME not in directory:
+                return None
+    except zipfile.BadZipFile:
+        return None
+    return model_keys.default_keyring().open(path)
+
+
+def open_entry(path, stat_key, mtime):
+    # Blokujące otwarcie modelu (parsowanie ZIP, agent kluczy, scrypt) - w puli
+    # wątków, nie w pętli zdarzeń
+    get_default_pool().invalidate(path)
+    encrypted = open_encrypted(path)
+    if encrypted is not None:
+        index_data = encrypted.index()
+    else:
+        index_data = PReadModelReader(path).index()
+    return ModelEntry(path, stat_key, mtime, index_data, encrypted)
+
+
+class ModelCorpus:
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self._entries = {}
+        # model_id -> (stat_key, future) otwarcia w toku; współdzielone przez
+        # równoległe żądania o ten sam model
+        self._loading = {}
+        # model_id -> (stat_key, błąd, czas) - nieudane otwarcie (np. brak klucza)
+        # nie jest powtarzane przez FAILURE_RETRY_S albo do zmiany pliku
+        self._failures = {}
+
+    def path_for(self, model_id):
+        if not MODEL_ID_RE.match(model_id):
+            return None
+        return os.path.join(self.root, model_id + ".model")
+
+    def _drop(self, model_id):
+        entry = self._entries.pop(model_id, None)
+        if entry is not None:
+            entry.close()
+        self._failures.pop(model_id, None)
+
+    async def lookup(self, model_id):
+        path = self.path_for(model_id)
+        if path is None:
+            return None
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self._drop(model_id)
+            return None
+        stat_key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+        entry = self._entries.get(model_id)
+        if entry is not None and entry.stat_key == stat_key:
+            return entry
+        failure = self._failures.get(model_id)
+        if (
+            failure is not None
+            and failure[0] == stat_key
+            and time.monotonic() - failure[2] < FAILURE_RETRY_S
+        ):
+            raise failure[1].with_traceback(None)
+        loading = self._loading.get(model_id)
+        if loading is None or loading[0] != stat_key:
+            future = asyncio.get_running_loop().run_in_executor(
+                None, open_entry, path, stat_key, st.st_mtime
+            )
+            loading = (stat_key, future)
+            self._loading[model_id] = loading
+        try:
+            entry = await asyncio.shield(loading[1])
+        except (model_format.ModelFormatError, OSError) as e:
+            if self._loading.get(model_id) is loading:
+                del self._loading[model_id]
+                self._drop(model_id)
+                self._failures[model_id] = (stat_key, e, time.monotonic())
+            raise
+        if self._loading.get(model_id) is loading:
+            del self._loading[model_id]
+            self._drop(model_id)
+            self._entries[model_id] = entry
+        return entry
+
+    async def etag(self, entry, section):
+        # Hash sekcji liczony raz na wersję pliku, poza pętlą zdarzeń
+        if entry.encrypted is not None:
+            # Sól pliku jest losowa przy każdym zapisie - wyznacza wersję treści
+            # bez odszyfrowywania sekcji
+            return f'"{section}-{entry.encrypted.header["file_salt"]}"'
+        future = entry.etags.get(section)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            offset, size = model_format.section_bounds(entry.index_data, section)
+            future = loop.run_in_executor(
+                None, hash_section, entry.path, offset, size
+            )
+            entry.etags[section] = future
+        try:
+            digest = await asyncio.shield(future)
+        except Exception:
+            entry.etags.pop(section, None)
+            raise
+        return f'"{section}-{digest}"'
+
+
+class ModelServer:
+    def __init__(self, root):
+        self.corpus = ModelCorpus(root)
+        self.requests_served = 0
+
+    async def start(self, host="127.0.0.1", port=8080):
+        return await asyncio.start_server(
+            self.handle_connection, host, port, limit=MAX_HEADER_BYTES
+        )
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.IncompleteReadError:
+                    break
+                except asyncio.LimitOverrunError:
+                    await self._send_simple(writer, 431, keep_alive=False)
+                    break
+                request = self._parse_head(head)
+                if request is None:
+                    await self._send_simple(writer, 400, keep_alive=False)
+                    break
+                method, target, headers, keep_alive = request
+                body_len = headers.get("content-length", "0")
+                if body_len != "0":
+                    # Sekcje są tylko do odczytu - ciało żądania ignorujemy
+                    if not body_len.isdigit():
+                        await self._send_simple(writer, 400, keep_alive=False)
+                        break
+                    await reader.readexactly(int(body_len))
+                await self._handle_request(writer, method, target, headers, keep_alive)
+                self.requests_served += 1
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logger.error("Błąd obsługi połączenia: %s", e, exc_info=True)
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    def _parse_head(self, head):
+        try:
+            lines = head.decode("latin-1").split("\r\n")
+            method, target, version = lines[0].split(" ")
+        except ValueError:
+            return None
+        headers = {}
+        for line in lines[1:]:
+            if not line:
+                continue
+            name, sep, value = line.partition(":")
+            if not sep:
+                return None
+            headers[name.strip().lower()] = value.strip()
+        connection = headers.get("connection", "").lower()
+        if version == "HTTP/1.1":
+            keep_alive = connection != "close"
+        else:
+            keep_alive = connection == "keep-alive"
+        return method, target.split("?", 1)[0], headers, keep_alive
+
+    async def _handle_request(self, writer, method, target, headers, keep_alive):
+        if method not in ("GET", "HEAD"):
+            await self._send_simple(
+                writer, 405, keep_alive, extra={"Allow": "GET, HEAD"}
+            )
+            return
+        match = ROUTE_RE.match(target)
+        if not match:
+            await self._send_simple(writer, 404, keep_alive)
+            return
+        model_id, section = match.groups()
+        try:
+            entry = await self.corpus.lookup(model_id)
+            if entry is None:
+                await self._send_simple(writer, 404, keep_alive)
+                return
+            size = entry.section_size(section)
+            etag = await self.corpus.etag(entry, section)
+        except model_format.UnsupportedLayoutError as e:
+            # Poprawny model w wariancie bez sekcji wprost w pliku (HDF5, skompresowany ZIP)
+            logger.warning("Model '%s' nie może być udostępniony: %s", model_id, e)
+            await self._send_simple(writer, 415, keep_alive)
+            return
+        except (model_format.ModelFormatError, OSError) as e:
+            logger.error("Nie można odczytać modelu '%s': %s", model_id, e)
+            await self._send_simple(writer, 500, keep_alive)
+            return
+
+        response_headers = {
+            "ETag": etag,
+            "Last-Modified": entry.last_modified,
+            "Accept-Ranges": "bytes",
+            "Content-Type": model_format.SECTION_CONTENT_TYPES[section],
+        }
+        if section == "archive":
+            response_headers["Content-Disposition"] = content_disposition(
+                str(entry.index_data["archive"].get("filename", "archive"))
+            )
+
+        if_none_match = headers.get("if-none-match")
+        if if_none_match and (
+            if_none_match.strip() == "*"
+            or etag in [t.strip() for t in if_none_match.split(",")]
+        ):
+            await self._send_head(writer, 304, response_headers, None, keep_alive)
+            return
+
+        status = 200
+        start, length = 0, size
+        range_header = headers.get("range")
+        if_range = headers.get("if-range")
+        if range_header and (if_range is None or if_range == etag):
+            try:
+                byte_range = parse_range(range_header, size)
+            except RangeNotSatisfiable:
+                response_headers["Content-Range"] = f"bytes */{size}"
+                await self._send_simple(writer, 416, keep_alive, response_headers)
+                return
+            if byte_range is not None:
+                status = 206
+                start, end = byte_range
+                length = end - start + 1
+                response_headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+        await self._send_head(writer, status, response_headers, length, keep_alive)
+        if method == "HEAD" or length == 0:
+            return
+        loop = asyncio.get_running_loop()
+        if entry.encrypted is not None:
+            await self._send_decrypted(writer, entry.encrypted, section, start, length)
+            return
+        offset = model_format.section_bounds(entry.index_data, section)[0]
+        pool = get_default_pool()
+        pooled = pool.acquire(entry.path)
+        try:
+            # loop.sendfile używa os.sendfile (zero-copy), gdy transport na to pozwala;
+            # opakowanie nie zamyka deskryptora należącego do puli
+            with os.fdopen(pooled.fd, "rb", closefd=False) as f:
+                await loop.sendfile(writer.transport, f, offset + start, length)
+        finally:
+            pool.release(pooled)
+
+    async def _send_decrypted(self, writer, model, section, start, length):
+        # Bez sendfile: fragmenty odszyfrowywane poza pętlą zdarzeń, tylko te
+        # pokrywające żądany zakres (read_range)
+        loop = asyncio.get_running_loop()
+        position, end = start, start + length
+        while position < end:
+            # Do granicy fragmentu - każdy fragment odszyfrowany dokładnie raz
+            chunk_end = (position // model.chunk_size + 1) * model.chunk_size
+            size = min(chunk_end, end) - position
+            data = await loop.run_in_executor(
+                None, model.read_range, section, position, size
+            )
+            writer.write(data)
+            await writer.drain()
+            position += len(data)
+
+    async def _send_head(self, writer, status, headers, content_length, keep_alive):
+        lines = [f"HTTP/1.1 {status} {REASONS[status]}"]
+        for name, value in headers.items():
+            lines.append(f"{name}: {value}")
+        if content_length is not None:
+            lines.append(f"Content-Length: {content_length}")
+        lines.append("Connection: keep-alive" if keep_alive else "Connection: close")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+
+    async def _send_simple(self, writer, status, keep_alive, extra=None):
+        body = f"{status} {REASONS[status]}\n".encode("latin-1")
+        headers = dict(extra or {})
+        headers["Content-Type"] = "text/plain; charset=utf-8"
+        await self._send_head(writer, status, headers, len(body), keep_alive)
+        writer.write(body)
+        await writer.drain()
+
+
+async def serve(root, host, port):
+    server = ModelServer(root)
+    tcp_server = await server.start(host, port)
+    addresses = ", ".join(str(s.getsockname()) for s in tcp_server.sockets)
+    logger.info("Serwer modeli (%s) nasłuchuje na %s", server.corpus.root, addresses)
+    print(f"LISTENING {tcp_server.sockets[0].getsockname()[1]}", flush=True)
+    async with tcp_server:
+        await tcp_server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Serwer HTTP udostępniający sekcje plików .model."
+    )
+    parser.add_argument("root", help="Katalog z plikami .model")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--keyfile", help="Plik kluczy dla szyfrowanych plików (model_keys)")
+    parser.add_argument("--key-agent", help="Gniazdo agenta kluczy (model_keys agent)")
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args(argv)
+    if args.keyfile:
+        os.environ["CFAB_MODEL_KEYFILE"] = os.path.abspath(args.keyfile)
+    if args.key_agent:
+        os.environ["CFAB_MODEL_KEY_AGENT"] = os.path.abspath(args.key_agent)
+    logging.basicConfig(
+        level=args.log_level.upper(),
+        format="%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s",
+    )
+    try:
+        asyncio.run(serve(args.root, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,9 @@
+# Wspólne statystyki raportów (verify_batch, bench_*): opóźnienia p50/p99.
+
+
+def percentile(sorted_values, pct):
+    # Wartość najbliższa pct-temu percentylowi listy posortowanej rosnąco
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[k]
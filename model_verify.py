@@ -0,0 +1,196 @@
+import hashlib
+import io
+import json
+import os
+import time
+import zipfile
+import zlib
+
+import model_backends
+import model_format
+import model_metrics
+import model_profile
+import model_schema
+
+# Weryfikacja pliku .model bez GUI - ta sama logika co verifyModelFile
+# w create_model.py, ale dla dowolnego wariantu (przez open_model) i z wynikiem
+# w postaci słownika zamiast okien QMessageBox.
+#   "quick" - struktura pliku/indeksu, poprawność info.json
+#   "full"  - dodatkowo znaczniki JPEG w preview i pełny test archiwum
+#             (CRC wszystkich członków ZIP, lista plików RAR)
+
+LEVEL_QUICK = "quick"
+LEVEL_FULL = "full"
+LEVELS = (LEVEL_QUICK, LEVEL_FULL)
+REQUIRED_INFO_KEYS = model_schema.REQUIRED_INFO_KEYS
+JPEG_SOI = b"\xff\xd8"
+JPEG_EOI = b"\xff\xd9"
+RAR_MAGIC = b"Rar!\x1a\x07"
+ZIP_MAGICS = (b"PK\x03\x04", b"PK\x05\x06")
+ARCHIVE_BUFFER_SIZE = 64 * 1024
+# Błędy, którymi uszkodzony plik może się objawić przy odczycie - raportowane
+# jako wynik weryfikacji, a nie wyjątek (RuntimeError: np. zaszyfrowany lub
+# nieobsługiwany członek ZIP)
+READ_ERRORS = (
+    ValueError,
+    RuntimeError,
+    EOFError,
+    zipfile.BadZipFile,
+    zlib.error,
+    OSError,
+    KeyError,
+)
+PREVIEW_CHUNK_SIZE = 1024 * 1024
+TAIL_SIZE = 4096  # Tyle końcowych bajtów trzymamy, żeby znaleźć EOI za dopełnieniem NUL
+
+
+def content_hash(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def hash_section_stream(chunks):
+    # Hash sekcji czytanej kawałkami - ten sam wynik co content_hash(całość),
+    # ale w pamięci jest tylko bieżący kawałek oraz początek i koniec sekcji.
+    hasher = hashlib.blake2b(digest_size=16)
+    size = 0
+    head = None
+    tail = b""
+    for chunk in chunks:
+        hasher.update(chunk)
+        size += len(chunk)
+        if head is None:
+            head = chunk[: len(JPEG_SOI)]
+        tail = (tail + chunk[-TAIL_SIZE:])[-TAIL_SIZE:]
+    return hasher.hexdigest(), size, head or b"", tail
+
+
+def level_covers(level, required_level):
+    return LEVELS.index(level) >= LEVELS.index(required_level)
+
+
+def check_info_json(info_bytes):
+    # Wszystkie błędy schematu naraz (model_schema), nie tylko pierwszy
+    return model_schema.parse_info(info_bytes)
+
+
+def check_archive(archive_file):
+    # Zwraca (rodzaj archiwum, odcisk zawartości, lista błędów). Odcisk to hash
+    # listy członków z ich CRC/rozmiarami - bez dodatkowego odczytu danych.
+    head = archive_file.read(8)
+    archive_file.seek(0)
+    if head[:4] in ZIP_MAGICS:
+        model_backends.check_zip_directory(archive_file, "Archiwum")
+        try:
+            with zipfile.ZipFile(archive_file, "r") as inner_zip:
+                bad_member = inner_zip.testzip()
+                members = [
+                    (i.filename, i.CRC, i.file_size) for i in inner_zip.infolist()
+                ]
+        except zipfile.BadZipFile as e:
+            return "zip", None, [f"Archiwum nie jest prawidłowym ZIP: {e}"]
+        if bad_member is not None:
+            return "zip", None, [f"Błędna suma CRC członka archiwum: {bad_member}"]
+        return "zip", content_hash(json.dumps(members).encode("utf-8")), []
+    if head.startswith(RAR_MAGIC):
+        try:
+            import rarfile  # Tylko gdy faktycznie trafimy na archiwum RAR
+        except ImportError:
+            return "rar", None, [
+                "Brak modułu rarfile - nie można zweryfikować archiwum RAR."
+            ]
+        try:
+            with rarfile.RarFile(archive_file, "r") as inner_rar:
+                members = [
+                    (i.filename, i.CRC, i.file_size) for i in inner_rar.infolist()
+                ]
+        except rarfile.Error as e:
+            return "rar", None, [f"Archiwum nie jest prawidłowym RAR: {e}"]
+        return "rar", content_hash(json.dumps(members).encode("utf-8")), []
+    return None, None, ["Plik archiwum nie jest prawidłowym ZIP ani RAR."]
+
+
+def open_model(path):
+    try:
+        return model_backends.open_model(path)
+    except model_backends.EncryptedModelError:
+        # Szyfrowany ZIP: klucz z model_keys (pamięć procesu, plik kluczy, agent),
+        # scrypt najwyżej raz na grupę soli. Import leniwy - cryptography tylko tu.
+        import model_keys
+
+        return model_keys.default_keyring().open(path)
+
+
+def verify_model(path, level=LEVEL_FULL):
+    if level not in LEVELS:
+        raise ValueError(f"Nieznany poziom weryfikacji: {level}")
+    with model_profile.capture("verify", path):
+        return _verify_model(path, level)
+
+
+def _verify_model(path, level):
+    start = time.perf_counter()
+    result = {
+        "path": path,
+        "level": level,
+        "ok": False,
+        "errors": [],
+        "bytes_read": 0,
+        "section_hashes": {},
+    }
+    errors = result["errors"]
+    section_hashes = result["section_hashes"]
+    metrics_op = model_metrics.start_operation("verify", path)
+    try:
+        metrics_op.phase("open")
+        result["size"] = os.path.getsize(path)
+        with open_model(path) as model:
+            result["variant"] = model.variant
+            # Wariant z indeksem: czytnik sam odrzuca sekcje wychodzące poza plik (fstat)
+            metrics_op.phase("read_info")
+            info_bytes = model.read_section("info")
+            result["bytes_read"] += len(info_bytes)
+            metrics_op.add_bytes(len(info_bytes))
+            section_hashes["info"] = content_hash(info_bytes)
+            info_json, info_errors = check_info_json(info_bytes)
+            errors.extend(info_errors)
+            if info_json is not None:
+                result["model"] = {
+                    key: info_json.get(key) for key in REQUIRED_INFO_KEYS
+                }
+
+            if level_covers(level, LEVEL_FULL):
+                metrics_op.phase("read_preview")
+                preview_hash, preview_size, head, tail = hash_section_stream(
+                    model.iter_section("preview", PREVIEW_CHUNK_SIZE)
+                )
+                result["bytes_read"] += preview_size
+                metrics_op.add_bytes(preview_size)
+                section_hashes["preview"] = preview_hash
+                if not (
+                    head.startswith(JPEG_SOI) and tail.rstrip(b"\x00").endswith(JPEG_EOI)
+                ):
+                    errors.append("preview.jpg nie jest poprawnym plikiem JPEG.")
+
+                metrics_op.phase("check_archive")
+                with model.open_section("archive") as raw_archive:
+                    archive_file = io.BufferedReader(raw_archive, ARCHIVE_BUFFER_SIZE)
+                    kind, fingerprint, archive_errors = check_archive(archive_file)
+                    result["archive_kind"] = kind
+                    if fingerprint is not None:
+                        section_hashes["archive"] = fingerprint
+                    errors.extend(archive_errors)
+                    archive_bytes = getattr(
+                        raw_archive, "bytes_read", model.section_size("archive")
+                    )
+                    result["bytes_read"] += archive_bytes
+                    metrics_op.add_bytes(archive_bytes)
+            result["archive_filename"] = model.archive_filename
+    except READ_ERRORS as e:
+        errors.append(f"{type(e).__name__}: {e}")
+    except ImportError as e:
+        errors.append(f"Brak zależności dla wariantu pliku: {e}")
+    finally:
+        result["ok"] = not errors
+        result["elapsed_s"] = time.perf_counter() - start
+        metrics_op.finish(failed=not result["ok"])
+    return result
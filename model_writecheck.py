@@ -0,0 +1,134 @@
+import mmap
+import os
+import random
+
+import model_format
+from model_verify import content_hash
+from pread_reader import preadv_exact
+
+# Weryfikacja pliku .model przy zapisie, bez ponownego czytania całości.
+# WrittenSections zapisuje kolejne segmenty (nagłówek, sekcje) do pliku i przy
+# okazji zapamiętuje ich położenie, hash (blake2b, jak model_verify) i same
+# dane - to one są wzorcem. verify(path) sprawdza potem na dysku tylko:
+#   - rozmiar pliku,
+#   - segmenty nie większe niż SAMPLE_SIZE (nagłówek, indeks, info.json) w całości,
+#   - w większych: pierwsze i ostatnie okno plus `samples` losowych okien.
+# Odczyt idzie przez pread po wyrzuceniu stron pliku z pamięci podręcznej
+# (posix_fadvise DONTNEED - skuteczne po fsync, stąd model_atomic wywołuje
+# weryfikację po fsync, a przed podmianą) albo z O_DIRECT (direct=True), więc
+# porównujemy to, co faktycznie jest na nośniku, a nie strony w RAM.
+# Okna są wyrównane do DIRECT_ALIGN (wymóg O_DIRECT), bufor z mmap.
+
+SAMPLE_SIZE = 64 * 1024
+DEFAULT_SAMPLES = 8
+DIRECT_ALIGN = 4096
+
+
+class WriteCheckError(model_format.ModelFormatError):
+    # Plik na dysku różni się od zapisanych danych
+    pass
+
+
+def drop_cache(fd):
+    # Bez posix_fadvise (Windows, macOS) - odczyt może przyjść z pamięci podręcznej
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        return True
+    return False
+
+
+def _open_for_check(path, direct):
+    if direct and hasattr(os, "O_DIRECT"):
+        try:
+            return os.open(path, os.O_RDONLY | os.O_DIRECT), True
+        except OSError:
+            # tmpfs i część sieciowych systemów plików nie obsługuje O_DIRECT
+            pass
+    return os.open(path, os.O_RDONLY), False
+
+
+def _read_aligned(fd, offset, size):
+    # Odczyt [offset, offset + size) oknem wyrównanym do DIRECT_ALIGN
+    start = offset - offset % DIRECT_ALIGN
+    end = offset + size
+    length = -(-(end - start) // DIRECT_ALIGN) * DIRECT_ALIGN
+    buffer = mmap.mmap(-1, length)
+    try:
+        # Krótki odczyt jest dokańczany - mniej danych tylko na końcu pliku
+        read = preadv_exact(fd, [buffer], start)
+        return buffer[offset - start : min(read, end - start)]
+    finally:
+        buffer.close()
+
+
+class WrittenSections:
+    def __init__(self, out):
+        self._out = out
+        self.position = 0
+        self.segments = []
+        self.section_hashes = {}
+        self.result = None
+
+    def write(self, name, data):
+        self._out.write(data)
+        self.segments.append((name, self.position, memoryview(data)))
+        self.section_hashes[name] = content_hash(data)
+        self.position += len(data)
+
+    def _windows(self, rng, samples, sample_size):
+        for name, offset, data in self.segments:
+            size = len(data)
+            if size <= sample_size:
+                if size:
+                    yield name, offset, data
+                continue
+            starts = {0, size - sample_size}
+            starts.update(rng.randrange(0, size - sample_size) for _ in range(samples))
+            for start in sorted(starts):
+                yield name, offset + start, data[start : start + sample_size]
+
+    def verify(
+        self, path, samples=DEFAULT_SAMPLES, sample_size=SAMPLE_SIZE, direct=False, seed=None
+    ):
+        # Zwraca wynik (jak model_verify) albo rzuca WriteCheckError
+        rng = random.Random(seed)
+        result = {
+            "path": path,
+            "ok": True,
+            "errors": [],
+            "bytes_read": 0,
+            "samples": 0,
+            "direct": False,
+            "cache_dropped": False,
+            "section_hashes": dict(self.section_hashes),
+        }
+        fd, result["direct"] = _open_for_check(path, direct)
+        try:
+            size = os.fstat(fd).st_size
+            if size != self.position:
+                result["errors"].append(
+                    f"Rozmiar pliku {size} B zamiast zapisanych {self.position} B."
+                )
+            if not result["direct"]:
+                result["cache_dropped"] = drop_cache(fd)
+            for name, offset, expected in self._windows(rng, samples, sample_size):
+                on_disk = _read_aligned(fd, offset, len(expected))
+                result["bytes_read"] += len(on_disk)
+                result["samples"] += 1
+                if on_disk != expected:
+                    result["errors"].append(
+                        f"{name}: dane na dysku różnią się od zapisanych "
+                        f"(przesunięcie {offset}, {len(expected)} B)."
+                    )
+            if not result["direct"]:
+                # Sprawdzone strony nie muszą zostawać w pamięci podręcznej
+                drop_cache(fd)
+        finally:
+            os.close(fd)
+        result["ok"] = not result["errors"]
+        self.result = result
+        if not result["ok"]:
+            raise WriteCheckError(
+                "Weryfikacja po zapisie nie powiodła się: " + " ".join(result["errors"])
+            )
+        return result
@@ -0,0 +1,301 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zipfile
+import zlib
+
+import model_backends
+import model_format
+from pread_reader import open_range
+
+# Trwała pamięć katalogów centralnych plików .model w wariancie ZIP (SQLite).
+# zipfile.ZipFile przy każdym otwarciu szuka EOCD i parsuje cały katalog
+# centralny; przy bibliotekach setek tysięcy plików, otwieranych wciąż od nowa
+# przez usługi, to dominuje. Tu dla każdego pliku zapisujemy raz listę członków:
+# nazwa, offset danych (już za nagłówkiem lokalnym), rozmiary, CRC-32, metoda.
+# Rekord jest ważny dla (st_dev, st_ino, st_size, st_mtime_ns) - jak w
+# verify_cache - więc otwarcie niezmienionego pliku to jeden stat i jedno
+# zapytanie, a sekcje ZIP_STORED czytamy wprost od offsetu przez pread
+# (pread_reader), bez zipfile. Członków skompresowanych lub szyfrowanych
+# ZipCrypto nadal rozpakowuje zipfile.
+# CRC-32 sprawdzamy przy pełnym odczycie członka (iter/read), tak jak zipfile;
+# open_member/open_section to surowy widok zakresu, bez CRC (jak ZipModel).
+# model_backends.open_model korzysta z pamięci, gdy ustawiono
+# CFAB_MODEL_ZIP_CACHE (ścieżka bazy); weryfikatory GUI (new.py, new_timer.py)
+# zawsze - domyślnie z bazą w ~/.cache. Jedno połączenie na bazę w procesie.
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "cfab_model", "zip_directory.sqlite"
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS zip_directory (
+    path TEXT PRIMARY KEY,
+    dev INTEGER NOT NULL,
+    ino INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    members TEXT NOT NULL,
+    cached_at REAL NOT NULL
+)
+"""
+
+
+def stat_key(path):
+    st = os.stat(path)
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+class ZipMember:
+    __slots__ = (
+        "name",
+        "data_offset",
+        "compress_size",
+        "file_size",
+        "crc",
+        "compress_type",
+        "flag_bits",
+    )
+
+    def __init__(self, name, data_offset, compress_size, file_size, crc, compress_type, flag_bits):
+        self.name = name
+        self.data_offset = data_offset
+        self.compress_size = compress_size
+        self.file_size = file_size
+        self.crc = crc
+        self.compress_type = compress_type
+        self.flag_bits = flag_bits
+
+    @property
+    def stored(self):
+        return self.compress_type == zipfile.ZIP_STORED and not self.flag_bits & 0x1
+
+    def as_row(self):
+        return [getattr(self, field) for field in self.__slots__]
+
+
+def scan_directory(path):
+    # Pełne parsowanie przez zipfile (z kontrolą rozmiaru katalogu) - tylko przy
+    # braku lub nieaktualności rekordu
+    with open(path, "rb") as f:
+        model_backends.check_zip_directory(f, path)
+    with zipfile.ZipFile(path, "r") as model_zip:
+        members = []
+        for zinfo in model_zip.infolist():
+            members.append(
+                ZipMember(
+                    zinfo.filename,
+                    model_backends.zip_member_data_offset(path, zinfo),
+                    zinfo.compress_size,
+                    zinfo.file_size,
+                    zinfo.CRC,
+                    zinfo.compress_type,
+                    zinfo.flag_bits,
+                )
+            )
+    return members
+
+
+class ZipDirectory:
+    # Katalog jednego pliku ZIP (z pamięci albo świeżo sparsowany)
+    def __init__(self, path, members, cached=False):
+        self.path = path
+        self.cached = cached
+        self._members = {member.name: member for member in members}
+
+    def names(self):
+        return list(self._members)
+
+    def __contains__(self, name):
+        return name in self._members
+
+    def member(self, name):
+        try:
+            return self._members[name]
+        except KeyError:
+            raise KeyError(f"Brak członka '{name}' w pliku ZIP '{self.path}'.") from None
+
+    def section_index(self):
+        # Indeks sekcji z offsetami absolutnymi (jak w układzie z indeksem) -
+        # tylko gdy wszystkie trzy sekcje leżą w pliku wprost (ZIP_STORED)
+        archive_name = model_backends.zip_archive_name(self.names(), self.path)
+        index_data = {}
+        for name in model_format.SECTION_NAMES:
+            arcname = model_backends.SECTION_ARCNAMES.get(name, archive_name)
+            member = self.member(arcname)
+            if not member.stored:
+                raise model_format.UnsupportedLayoutError(
+                    f"Członek '{arcname}' w '{self.path}' jest skompresowany - "
+                    f"sekcji nie można czytać wprost z pliku."
+                )
+            index_data[name] = {"offset": member.data_offset, "size": member.file_size}
+        index_data["archive"]["filename"] = archive_name
+        return index_data
+
+    def open_member(self, name):
+        member = self.member(name)
+        if member.stored:
+            return open_range(self.path, member.data_offset, member.file_size)
+        # ZipExtFile trzyma własną referencję do pliku - ZipFile można zamknąć
+        with zipfile.ZipFile(self.path, "r") as model_zip:
+            return model_zip.open(name)
+
+    def iter_member(self, name, chunk_size=model_backends.CHUNK_SIZE):
+        member = self.member(name)
+        crc = 0
+        read = 0
+        with self.open_member(name) as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                if member.stored:
+                    crc = zlib.crc32(chunk, crc)
+                read += len(chunk)
+                yield chunk
+        # Dla skompresowanych CRC sprawdza już ZipExtFile
+        if member.stored and (crc != member.crc or read != member.file_size):
+            raise zipfile.BadZipFile(f"Błędne CRC-32 członka '{name}' w '{self.path}'.")
+
+    def read_member(self, name, budget=None):
+        model_format.check_read_budget(self.member(name).file_size, f"Członek '{name}'", budget)
+        return b"".join(self.iter_member(name))
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class CachedZipModel(model_backends.ModelHandle):
+    # Ten sam wariant co model_backends.ZipModel, ale bez zipfile przy otwarciu
+    variant = "zip"
+
+    def __init__(self, directory):
+        self.path = directory.path
+        self.directory = directory
+        self.archive_filename = model_backends.zip_archive_name(directory.names(), self.path)
+
+    def _arcname(self, name):
+        return model_backends.SECTION_ARCNAMES.get(name, self.archive_filename)
+
+    def section_size(self, name):
+        return self.directory.member(self._arcname(name)).file_size
+
+    def iter_section(self, name, chunk_size=model_backends.CHUNK_SIZE):
+        return self.directory.iter_member(self._arcname(name), chunk_size)
+
+    def open_section(self, name):
+        return self.directory.open_member(self._arcname(name))
+
+
+class ZipDirectoryCache:
+    def __init__(self, db_path=None):
+        self.db_path = db_path or DEFAULT_CACHE_PATH
+        directory = os.path.dirname(os.path.abspath(self.db_path))
+        os.makedirs(directory, exist_ok=True)
+        # Jedno połączenie na proces, współdzielone przez wątki (model_server)
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self.stats = {"lookups": 0, "hits": 0, "stale": 0, "misses": 0}
+
+    def lookup(self, path, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT dev, ino, size, mtime_ns, members FROM zip_directory WHERE path = ?",
+                (path,),
+            ).fetchone()
+        if row is None:
+            return None, False
+        if tuple(row[:4]) != key:
+            return None, True
+        return [ZipMember(*fields) for fields in json.loads(row[4])], False
+
+    def store(self, path, key, members):
+        # Zatwierdzane od razu (WAL, synchronous=NORMAL - bez fsync na transakcję),
+        # żeby rekord widziały inne procesy korzystające z tej samej bazy
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO zip_directory VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    path,
+                    *key,
+                    json.dumps([member.as_row() for member in members]),
+                    time.time(),
+                ),
+            )
+            self._conn.commit()
+
+    def directory(self, path):
+        path = os.path.abspath(path)
+        key = stat_key(path)
+        members, stale = self.lookup(path, key)
+        if members is not None:
+            self._count("hits")
+            return ZipDirectory(path, members, cached=True)
+        self._count("stale" if stale else "misses")
+        members = scan_directory(path)
+        # Plik zmieniony w trakcie parsowania - wynik tylko dla tego otwarcia
+        if stat_key(path) == key:
+            self.store(path, key, members)
+        return ZipDirectory(path, members)
+
+    def _count(self, outcome):
+        # Instancja jest współdzielona przez wątki (model_server) - liczniki pod blokadą
+        with self._lock:
+            self.stats["lookups"] += 1
+            self.stats[outcome] += 1
+
+    def open(self, path):
+        return CachedZipModel(self.directory(path))
+
+    def forget(self, path):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM zip_directory WHERE path = ?", (os.path.abspath(path),)
+            )
+            self._conn.commit()
+
+    def report(self):
+        with self._lock:
+            report = dict(self.stats)
+        lookups = report["lookups"]
+        report["hit_ratio"] = round(report["hits"] / lookups, 4) if lookups else 0.0
+        return report
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(db_path=None):
+    db_path = os.path.abspath(
+        db_path or os.environ.get("CFAB_MODEL_ZIP_CACHE") or DEFAULT_CACHE_PATH
+    )
+    with _caches_lock:
+        cache = _caches.get(db_path)
+        if cache is None:
+            cache = _caches[db_path] = ZipDirectoryCache(db_path)
+        return cache
+
+
+def open_directory(path, db_path=None):
+    return get_cache(db_path).directory(path)
+
+
+def open_cached(path, db_path=None):
+    return get_cache(db_path).open(path)
@@ -3,6 +3,7 @@ import os
 import zipfile
 import rarfile
 import json
+import model_zipcache
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel,
     QFileDialog, QMessageBox, QLineEdit
@@ -151,9 +152,10 @@ class ModelCreator(QWidget):
 
         try:
             self.status_label.setText("Weryfikacja pliku .model...")
-            with zipfile.ZipFile(self.output_path, 'r') as model_zip:
+            # Katalog centralny z trwałej pamięci (model_zipcache), ważnej wg stat pliku
+            with model_zipcache.open_directory(self.output_path) as model_zip:
                 required_files = ["preview.jpg", "info.json"]
-                found_files = model_zip.namelist()
+                found_files = model_zip.names()
 
                 # Sprawdzenie, czy wymagane pliki istnieją
                 missing_files = [f for f in required_files if f not in found_files]
@@ -164,11 +166,10 @@ class ModelCreator(QWidget):
 
                 # Sprawdzenie i odczyt info.json
                 try:
-                    with model_zip.open("info.json") as info_file:
-                        info_content = info_file.read().decode('utf-8')
-                        info_data = json.loads(info_content)
-                        # Można dodać dodatkowe walidacje zawartości info.json
-                        # print(f"Odczytano info.json: {info_data}")
+                    info_content = model_zip.read_member("info.json").decode('utf-8')
+                    info_data = json.loads(info_content)
+                    # Można dodać dodatkowe walidacje zawartości info.json
+                    # print(f"Odczytano info.json: {info_data}")
                 except json.JSONDecodeError:
                     self.status_label.setText("Weryfikacja nieudana: Plik info.json nie jest poprawnym JSON.")
                     QMessageBox.warning(self, "Weryfikacja", f"Plik info.json nie jest poprawnym formatem JSON.")
@@ -3,6 +3,10 @@ import os
 import zipfile
 import rarfile
 import json
+
+import model_backends
+import model_crypto
+import model_keys
 from PyQt6.QtWidgets import (
     QApplication,
     QWidget,
@@ -87,6 +91,11 @@ class ModelCreator(QWidget):
         self.verify_button.clicked.connect(self.verifyModelFile)
         main_layout.addWidget(self.verify_button)
 
+        # Klucze sesji (model_keys) - hasło podaje się raz na grupę plików
+        self.wipe_keys_button = QPushButton("Zapomnij hasła sesji")
+        self.wipe_keys_button.clicked.connect(self.wipeSessionKeys)
+        main_layout.addWidget(self.wipe_keys_button)
+
         # Label statusu
         self.status_label = QLabel("")
         self.status_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
@@ -161,20 +170,17 @@ class ModelCreator(QWidget):
 
         try:
             self.status_label.setText("Tworzenie zaszyfrowanego pliku .model...")
-            with zipfile.ZipFile(
-                self.output_path, "w", zipfile.ZIP_STORED
-            ) as model_zip:
-                model_zip.setpassword(password.encode("utf-8"))  # Ustawienie hasła
-
-                # Dodawanie pliku preview
-                model_zip.write(self.preview_path, arcname="preview.jpg")
-
-                # Dodawanie pliku info
-                model_zip.write(self.info_path, arcname="info.json")
-
-                # Dodawanie pliku archiwum
-                archive_filename = os.path.basename(self.archive_path)
-                model_zip.write(self.archive_path, arcname=archive_filename)
+            # zipfile ignoruje setpassword przy zapisie - sekcje szyfruje
+            # model_crypto (AES-GCM we fragmentach, ZIP_STORED)
+            source = model_backends.FileSetSource(
+                self.preview_path, self.info_path, self.archive_path
+            )
+            # Klucz z pamięci sesji: kolejne pliki z tym samym hasłem dzielą sól
+            # KDF, więc scrypt liczy się raz na sesję, a nie raz na plik
+            kdf, master_key = model_keys.default_keyring().writer_key(password)
+            model_crypto.write_encrypted_zip(
+                self.output_path, source, master_key=master_key, kdf=kdf
+            )
 
             self.status_label.setText("Zaszyfrowany plik .model utworzony pomyślnie!")
             QMessageBox.information(
@@ -191,19 +197,22 @@ class ModelCreator(QWidget):
                 f"Wystąpił błąd podczas tworzenia zaszyfrowanego pliku .model:\n{e}",
             )
 
-    def verifyModelFile(self):
-        if not self.output_path:
-            QMessageBox.critical(
-                self, "Błąd", "Proszę wybrać plik .model do weryfikacji."
-            )
-            return
+    def wipeSessionKeys(self):
+        model_keys.default_keyring().wipe()
+        self.status_label.setText("Klucze sesji zostały usunięte z pamięci.")
 
-        if not os.path.exists(self.output_path):
-            QMessageBox.critical(
-                self, "Błąd", f"Plik '{self.output_path}' nie istnieje."
-            )
-            return
+    def closeEvent(self, event):
+        model_keys.default_keyring().wipe()
+        super().closeEvent(event)
 
+    def openEncryptedModel(self):
+        # Najpierw klucz z pamięci sesji, pliku kluczy lub agenta - o hasło
+        # pytamy tylko, gdy żadne źródło nie zna klucza dla soli tego pliku
+        keyring = model_keys.default_keyring()
+        try:
+            return keyring.open(self.output_path)
+        except model_crypto.InvalidPasswordError:
+            pass
         password, ok = QInputDialog.getText(
             self,
             "Hasło do odszyfrowania",
@@ -214,39 +223,36 @@ class ModelCreator(QWidget):
             QMessageBox.critical(
                 self, "Błąd", "Hasło jest wymagane i nie zostało poprawnie wprowadzone."
             )
+            return None
+        return keyring.open(self.output_path, password)
+
+    def verifyModelFile(self):
+        if not self.output_path:
+            QMessageBox.critical(
+                self, "Błąd", "Proszę wybrać plik .model do weryfikacji."
+            )
+            return
+
+        if not os.path.exists(self.output_path):
+            QMessageBox.critical(
+                self, "Błąd", f"Plik '{self.output_path}' nie istnieje."
+            )
             return
 
         try:
             self.status_label.setText("Weryfikacja zaszyfrowanego pliku .model...")
-            with zipfile.ZipFile(self.output_path, "r") as model_zip:
-                model_zip.setpassword(
-                    password.encode("utf-8")
-                )  # Ustawienie hasła do odszyfrowania
-
-                required_files = ["preview.jpg", "info.json"]
-                found_files = model_zip.namelist()
-
-                # Sprawdzenie, czy wymagane pliki istnieją
-                missing_files = [f for f in required_files if f not in found_files]
-                if missing_files:
-                    self.status_label.setText(
-                        f"Weryfikacja nieudana: Brakuje wymaganych plików: {', '.join(missing_files)}"
-                    )
-                    QMessageBox.warning(
-                        self,
-                        "Weryfikacja",
-                        f"Plik '{self.output_path}' nie zawiera wszystkich wymaganych plików: {', '.join(missing_files)}",
-                    )
-                    return
-
+            model = self.openEncryptedModel()
+            if model is None:
+                return
+            # Preview i info.json odszyfrowujemy bez dotykania archiwum; archiwum
+            # sprawdzamy w całości (tag każdego fragmentu) równolegle w puli wątków
+            with model:
                 # Sprawdzenie i odczyt info.json
                 try:
-                    with model_zip.open("info.json") as info_file:
-                        info_content = info_file.read().decode("utf-8")
-                        info_data = json.loads(info_content)
-                        # Można dodać dodatkowe walidacje zawartości info.json
-                        # print(f"Odczytano info.json: {info_data}")
-                except json.JSONDecodeError:
+                    info_content = model.read_section("info").decode("utf-8")
+                    info_data = json.loads(info_content)
+                    # Można dodać dodatkowe walidacje zawartości info.json
+                except (UnicodeDecodeError, json.JSONDecodeError):
                     self.status_label.setText(
                         "Weryfikacja nieudana: Plik info.json nie jest poprawnym JSON."
                     )
@@ -256,31 +262,11 @@ class ModelCreator(QWidget):
                         f"Plik info.json nie jest poprawnym formatem JSON.",
                     )
                     return
-                except Exception as e:
-                    self.status_label.setText(
-                        f"Weryfikacja nieudana: Błąd podczas odczytu info.json: {e}"
-                    )
-                    QMessageBox.warning(
-                        self,
-                        "Weryfikacja",
-                        f"Wystąpił błąd podczas odczytu pliku info.json:\n{e}",
-                    )
-                    return
-
-                # Sprawdzenie obecności pliku archiwum
-                archive_files = [f for f in found_files if f not in required_files]
-                if len(archive_files) != 1:
-                    self.status_label.setText(
-                        "Weryfikacja nieudana: Oczekiwano dokładnie jednego pliku archiwum."
-                    )
-                    QMessageBox.warning(
-                        self,
-                        "Weryfikacja",
-                        f"Oczekiwano dokładnie jednego pliku archiwum wewnątrz '{self.output_path}'. Znaleziono {len(archive_files)}.",
-                    )
-                    return
 
-                archive_filename_in_zip = archive_files[0]
+                model.read_section("preview")
+                for _ in model.iter_section("archive"):
+                    pass
+                archive_filename_in_zip = model.archive_filename
 
                 self.status_label.setText(
                     "Weryfikacja pliku .model zakończona pomyślnie!"
@@ -300,8 +286,7 @@ class ModelCreator(QWidget):
                 "Błąd",
                 f"Plik '{self.output_path}' jest uszkodzony lub nie jest prawidłowym archiwum ZIP.",
             )
-        except RuntimeError as e:
-            # Może być rzucane, jeśli hasło jest nieprawidłowe
+        except model_crypto.InvalidPasswordError as e:
             self.status_label.setText(f"Weryfikacja nieudana: Nieprawidłowe hasło. {e}")
             QMessageBox.critical(
                 self, "Błąd", f"Nieprawidłowe hasło do odszyfrowania pliku .model.\n{e}"
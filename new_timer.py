@@ -1,9 +1,18 @@
 import sys
 import os
+import tempfile
 import zipfile
 import rarfile
 import json
 import time
+
+import model_atomic
+import model_backends
+import model_crypto
+import model_format
+import model_keys
+import model_pack
+import model_zipcache
 from PyQt6.QtWidgets import (
     QApplication,
     QWidget,
@@ -64,6 +73,9 @@ class ModelCreator(QWidget):
         archive_layout.addWidget(self.archive_label)
         archive_layout.addWidget(self.archive_path_edit)
         archive_layout.addWidget(self.archive_button)
+        self.archive_folder_button = QPushButton("Folder...")
+        self.archive_folder_button.clicked.connect(self.selectArchiveFolder)
+        archive_layout.addWidget(self.archive_folder_button)
         main_layout.addLayout(archive_layout)
 
         # Layout dla zapisu pliku wyjściowego
@@ -80,8 +92,12 @@ class ModelCreator(QWidget):
 
         # Layout dla opcji szyfrowania
         encrypt_layout = QHBoxLayout()
-        self.encrypt_checkbox = QPushButton("Szyfruj archiwum (ZipCrypto)")
+        self.encrypt_checkbox = QPushButton("Szyfruj archiwum (AES-GCM)")
+        self.encrypt_checkbox.clicked.connect(self.toggleEncryption)
         encrypt_layout.addWidget(self.encrypt_checkbox)
+        self.wipe_keys_button = QPushButton("Zapomnij hasła sesji")
+        self.wipe_keys_button.clicked.connect(self.wipeSessionKeys)
+        encrypt_layout.addWidget(self.wipe_keys_button)
         main_layout.addLayout(encrypt_layout)
 
         # Przycisk tworzenia i weryfikacji
@@ -107,6 +123,7 @@ class ModelCreator(QWidget):
         self.preview_path = ""
         self.info_path = ""
         self.archive_path = ""
+        self.archive_folder = ""
         self.output_path = ""
         self.is_encrypted = False
 
@@ -135,8 +152,19 @@ class ModelCreator(QWidget):
         )
         if fname:
             self.archive_path = fname
+            self.archive_folder = ""
             self.archive_path_edit.setText(fname)
 
+    def selectArchiveFolder(self):
+        # Archiwum zostanie zbudowane z katalogu w locie przy tworzeniu pliku .model
+        folder = QFileDialog.getExistingDirectory(self, "Wybierz folder źródłowy archiwum")
+        if folder:
+            self.archive_folder = folder
+            self.archive_path = ""
+            self.archive_path_edit.setText(
+                f"{folder} -> {model_pack.archive_name(folder)}"
+            )
+
     def saveOutputFile(self):
         fname, _ = QFileDialog.getSaveFileName(
             self, "Zapisz plik .model", "", "Pliki .model (*.model)"
@@ -150,18 +178,23 @@ class ModelCreator(QWidget):
     def toggleEncryption(self):
         self.is_encrypted = not self.is_encrypted
         if self.is_encrypted:
-            self.encrypt_checkbox.setText("Archiwum szyfrowane (ZipCrypto)")
+            self.encrypt_checkbox.setText("Archiwum szyfrowane (AES-GCM)")
         else:
-            self.encrypt_checkbox.setText("Szyfruj archiwum (ZipCrypto)")
+            self.encrypt_checkbox.setText("Szyfruj archiwum (AES-GCM)")
 
     def createModelFile(self):
         if not all(
-            [self.preview_path, self.info_path, self.archive_path, self.output_path]
+            [
+                self.preview_path,
+                self.info_path,
+                self.archive_path or self.archive_folder,
+                self.output_path,
+            ]
         ):
             QMessageBox.critical(
                 self,
                 "Błąd",
-                "Proszę wybrać wszystkie wymagane pliki (preview.jpg, info.json, archiwum) i plik wyjściowy.",
+                "Proszę wybrać wszystkie wymagane pliki (preview.jpg, info.json, archiwum lub folder) i plik wyjściowy.",
             )
             return
 
@@ -185,22 +218,26 @@ class ModelCreator(QWidget):
         self.status_label.setText("Tworzenie pliku .model...")
         self.time_label.setText("")
 
+        pack_summary = ""
         try:
-            with zipfile.ZipFile(
-                self.output_path, "w", zipfile.ZIP_STORED
-            ) as model_zip:
-                if password:
-                    model_zip.setpassword(password.encode("utf-8"))
-
-                # Dodawanie pliku preview
-                model_zip.write(self.preview_path, arcname="preview.jpg")
-
-                # Dodawanie pliku info
-                model_zip.write(self.info_path, arcname="info.json")
-
-                # Dodawanie pliku archiwum
-                archive_filename = os.path.basename(self.archive_path)
-                model_zip.write(self.archive_path, arcname=archive_filename)
+            if self.archive_folder:
+                stats = self.packArchiveFolder(password)
+                pack_summary = (
+                    f"\nSpakowano {stats['files']} plików do '{model_pack.archive_name(self.archive_folder)}' "
+                    f"({stats['stored']} bez kompresji)."
+                )
+            elif password:
+                source = model_backends.FileSetSource(
+                    self.preview_path, self.info_path, self.archive_path
+                )
+                # zipfile ignoruje setpassword przy zapisie - sekcje szyfruje model_crypto
+                # Ta sama sól KDF dla kolejnych plików z tym hasłem - jeden scrypt na sesję
+                self.writeEncrypted(source, password)
+            else:
+                source = model_backends.FileSetSource(
+                    self.preview_path, self.info_path, self.archive_path
+                )
+                model_backends.write_model(self.output_path, "zip", source)
 
             end_time = time.time()
             elapsed_time = end_time - start_time
@@ -209,7 +246,7 @@ class ModelCreator(QWidget):
             QMessageBox.information(
                 self,
                 "Sukces",
-                f"Plik '{self.output_path}' został utworzony pomyślnie.\nCzas utworzenia: {elapsed_time:.4f} s",
+                f"Plik '{self.output_path}' został utworzony pomyślnie.{pack_summary}\nCzas utworzenia: {elapsed_time:.4f} s",
             )
 
         except Exception as e:
@@ -223,6 +260,39 @@ class ModelCreator(QWidget):
                 f"Wystąpił błąd podczas tworzenia pliku .model:\n{e}\nCzas próby: {elapsed_time:.4f} s",
             )
 
+    def packArchiveFolder(self, password):
+        # Archiwum z folderu budowane w locie (model_pack): równoległa kompresja,
+        # jeden przebieg prosto do pliku .model
+        if not password:
+            return model_pack.pack_directory(
+                self.output_path, self.preview_path, self.info_path, self.archive_folder
+            )
+        # Szyfrowanie potrzebuje rozmiaru sekcji z góry (AAD), więc archiwum trafia
+        # najpierw do pliku tymczasowego obok pliku wyjściowego
+        output_dir = os.path.dirname(os.path.abspath(self.output_path))
+        with tempfile.TemporaryDirectory(dir=output_dir) as tmp:
+            archive_path = os.path.join(tmp, model_pack.archive_name(self.archive_folder))
+            with open(archive_path, "wb") as f:
+                stats = model_pack.write_archive(
+                    f, model_pack.collect_files(self.archive_folder)
+                )
+            source = model_backends.FileSetSource(
+                self.preview_path, self.info_path, archive_path
+            )
+            self.writeEncrypted(source, password)
+        return stats
+
+    def writeEncrypted(self, source, password):
+        # Zapis atomowy (model_atomic): plik tymczasowy obok wyniku, podmiana po fsync
+        kdf, master_key = model_keys.default_keyring().writer_key(password)
+        size = sum(source.section_size(name) for name in model_format.SECTION_NAMES)
+        with model_atomic.AtomicOutput(
+            self.output_path, size + model_backends.OUTPUT_OVERHEAD
+        ) as output:
+            model_crypto.write_encrypted_zip(
+                output.file, source, master_key=master_key, kdf=kdf
+            )
+
     def verifyModelFile(self):
         if not self.output_path:
             QMessageBox.critical(
@@ -236,51 +306,22 @@ class ModelCreator(QWidget):
             )
             return
 
-        password = None
-        try:
-            with zipfile.ZipFile(self.output_path, "r") as model_zip:
-                # Sprawdzenie, czy archiwum wymaga hasła (próba odczytania listy plików)
-                try:
-                    model_zip.namelist()
-                except RuntimeError:
-                    # Jeśli namelist() rzuci RuntimeError, prawdopodobnie hasło jest wymagane
-                    password, ok = QInputDialog.getText(
-                        self,
-                        "Hasło do odszyfrowania",
-                        "Wprowadź hasło dla archiwum:",
-                        QLineEdit.Echo.Password,
-                    )
-                    if not ok or not password:
-                        QMessageBox.critical(
-                            self,
-                            "Błąd",
-                            "Hasło jest wymagane do odszyfrowania i nie zostało poprawnie wprowadzone.",
-                        )
-                        return
-        except zipfile.BadZipFile:
-            QMessageBox.critical(
-                self,
-                "Błąd",
-                f"Plik '{self.output_path}' jest uszkodzony lub nie jest prawidłowym archiwum ZIP.",
-            )
-            return
-        except Exception as e:
-            QMessageBox.critical(
-                self, "Błąd", f"Wystąpił błąd podczas próby otwarcia pliku:\n{e}"
-            )
-            return
-
         start_time = time.time()
         self.status_label.setText("Weryfikacja pliku .model...")
         self.time_label.setText("")
 
         try:
-            with zipfile.ZipFile(self.output_path, "r") as model_zip:
-                if password:
-                    model_zip.setpassword(password.encode("utf-8"))
+            # Katalog centralny z trwałej pamięci (model_zipcache), ważnej wg stat
+            # pliku - zipfile parsuje go tylko przy pierwszym otwarciu
+            with model_zipcache.open_directory(self.output_path) as model_zip:
+                # Szyfrowany plik rozpoznajemy po nagłówku crypto.json (model_crypto)
+                # - z tego samego katalogu centralnego, bez osobnego parsowania
+                if model_backends.CRYPTO_ARCNAME in model_zip:
+                    self.verifyEncryptedModelFile()
+                    return
 
                 required_files = ["preview.jpg", "info.json"]
-                found_files = model_zip.namelist()
+                found_files = model_zip.names()
 
                 # Sprawdzenie, czy wymagane pliki istnieją
                 missing_files = [f for f in required_files if f not in found_files]
@@ -297,11 +338,10 @@ class ModelCreator(QWidget):
 
                 # Sprawdzenie i odczyt info.json
                 try:
-                    with model_zip.open("info.json") as info_file:
-                        info_content = info_file.read().decode("utf-8")
-                        info_data = json.loads(info_content)
-                        # Można dodać dodatkowe walidacje zawartości info.json
-                        # print(f"Odczytano info.json: {info_data}")
+                    info_content = model_zip.read_member("info.json").decode("utf-8")
+                    info_data = json.loads(info_content)
+                    # Można dodać dodatkowe walidacje zawartości info.json
+                    # print(f"Odczytano info.json: {info_data}")
                 except json.JSONDecodeError:
                     self.status_label.setText(
                         "Weryfikacja nieudana: Plik info.json nie jest poprawnym JSON."
@@ -362,9 +402,78 @@ class ModelCreator(QWidget):
                 "Błąd",
                 f"Plik '{self.output_path}' jest uszkodzony lub nie jest prawidłowym archiwum ZIP.\nCzas próby: {elapsed_time:.4f} s",
             )
-        except RuntimeError as e:
+        except Exception as e:
             end_time = time.time()
             elapsed_time = end_time - start_time
+            self.status_label.setText(f"Weryfikacja nieudana: Błąd: {e}")
+            self.time_label.setText(f"Czas próby: {elapsed_time:.4f} s")
+            QMessageBox.critical(
+                self,
+                "Błąd",
+                f"Wystąpił błąd podczas weryfikacji pliku .model:\n{e}\nCzas próby: {elapsed_time:.4f} s",
+            )
+
+
+    def openEncryptedModel(self):
+        # Najpierw klucz z pamięci sesji, pliku kluczy lub agenta - o hasło
+        # pytamy tylko, gdy żadne źródło nie zna klucza dla soli tego pliku
+        keyring = model_keys.default_keyring()
+        try:
+            return keyring.open(self.output_path)
+        except model_crypto.InvalidPasswordError:
+            pass
+        password, ok = QInputDialog.getText(
+            self,
+            "Hasło do odszyfrowania",
+            "Wprowadź hasło dla archiwum:",
+            QLineEdit.Echo.Password,
+        )
+        if not ok or not password:
+            QMessageBox.critical(
+                self,
+                "Błąd",
+                "Hasło jest wymagane do odszyfrowania i nie zostało poprawnie wprowadzone.",
+            )
+            return None
+        return keyring.open(self.output_path, password)
+
+    def wipeSessionKeys(self):
+        model_keys.default_keyring().wipe()
+        self.status_label.setText("Klucze sesji zostały usunięte z pamięci.")
+
+    def closeEvent(self, event):
+        model_keys.default_keyring().wipe()
+        super().closeEvent(event)
+
+    def verifyEncryptedModelFile(self):
+        # Preview i info.json odszyfrowujemy bez dotykania archiwum; archiwum
+        # sprawdzamy w całości (tag każdego fragmentu) równolegle w puli wątków
+        start_time = time.time()
+        self.status_label.setText("Weryfikacja zaszyfrowanego pliku .model...")
+        self.time_label.setText("")
+        try:
+            model = self.openEncryptedModel()
+            if model is None:
+                return
+            with model:
+                info_content = model.read_section("info").decode("utf-8")
+                json.loads(info_content)
+                model.read_section("preview")
+                for _ in model.iter_section("archive"):
+                    pass
+                archive_filename_in_zip = model.archive_filename
+
+            end_time = time.time()
+            elapsed_time = end_time - start_time
+            self.status_label.setText("Weryfikacja pliku .model zakończona pomyślnie!")
+            self.time_label.setText(f"Czas weryfikacji: {elapsed_time:.4f} s")
+            QMessageBox.information(
+                self,
+                "Sukces",
+                f"Plik '{self.output_path}' został odszyfrowany i zweryfikowany pomyślnie. Zawiera preview.jpg, info.json i plik archiwum '{archive_filename_in_zip}'.\nCzas weryfikacji: {elapsed_time:.4f} s",
+            )
+        except model_crypto.InvalidPasswordError as e:
+            elapsed_time = time.time() - start_time
             self.status_label.setText(f"Weryfikacja nieudana: Nieprawidłowe hasło. {e}")
             self.time_label.setText(f"Czas próby: {elapsed_time:.4f} s")
             QMessageBox.critical(
@@ -372,9 +481,17 @@ class ModelCreator(QWidget):
                 "Błąd",
                 f"Nieprawidłowe hasło do odszyfrowania pliku .model.\n{e}\nCzas próby: {elapsed_time:.4f} s",
             )
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            elapsed_time = time.time() - start_time
+            self.status_label.setText(
+                "Weryfikacja nieudana: Plik info.json nie jest poprawnym JSON."
+            )
+            self.time_label.setText(f"Czas próby: {elapsed_time:.4f} s")
+            QMessageBox.warning(
+                self, "Weryfikacja", "Plik info.json nie jest poprawnym formatem JSON."
+            )
         except Exception as e:
-            end_time = time.time()
-            elapsed_time = end_time - start_time
+            elapsed_time = time.time() - start_time
             self.status_label.setText(f"Weryfikacja nieudana: Błąd: {e}")
             self.time_label.setText(f"Czas próby: {elapsed_time:.4f} s")
             QMessageBox.critical(
@@ -383,7 +500,6 @@ class ModelCreator(QWidget):
                 f"Wystąpił błąd podczas weryfikacji pliku .model:\n{e}\nCzas próby: {elapsed_time:.4f} s",
             )
 
-
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = ModelCreator()
@@ -0,0 +1,358 @@
+import os
+import struct
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import model_format
+
+# Czytnik plików .model oparty o os.pread/os.preadv - bez seek, więc jedną
+# instancję mogą bezpiecznie współdzielić wątki. Obsługuje warianty, których
+# sekcje leżą w pliku wprost: z indeksem, metafirst i ZIP_STORED (read_header).
+# Deskryptory plików trzyma procesowa pula LRU (FdPool) z limitem otwartych
+# plików; kolejne odczyty tego samego modelu nie płacą za open/close.
+
+DEFAULT_MAX_OPEN = 256
+HEADER_PROBE_SIZE = 4096
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+class _PooledFd:
+    __slots__ = ("key", "fd", "identity", "refs", "evicted")
+
+    def __init__(self, key, fd, identity):
+        self.key = key
+        self.fd = fd
+        self.identity = identity
+        self.refs = 0
+        self.evicted = False
+
+
+class FdPool:
+    def __init__(self, max_open=DEFAULT_MAX_OPEN, check_stale=True):
+        if max_open < 1:
+            raise ValueError("max_open musi być >= 1")
+        self.max_open = max_open
+        # Jedno os.stat na pobranie wykrywa plik podmieniony (np. os.replace)
+        # pod tą samą ścieżką - nadal taniej niż open+close.
+        self.check_stale = check_stale
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._stats = {
+            "opens": 0,
+            "opens_avoided": 0,
+            "evictions": 0,
+            "stale_reopens": 0,
+        }
+
+    def acquire(self, path):
+        key = os.path.abspath(path)
+        identity = None
+        if self.check_stale:
+            st = os.stat(key)
+            identity = (st.st_dev, st.st_ino)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and identity is not None and entry.identity != identity:
+                self._stats["stale_reopens"] += 1
+                self._retire(entry)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry.refs += 1
+                self._stats["opens_avoided"] += 1
+                return entry
+        fd = os.open(key, os.O_RDONLY | getattr(os, "O_CLOEXEC", 0))
+        if identity is None:
+            st = os.fstat(fd)
+            identity = (st.st_dev, st.st_ino)
+        with self._lock:
+            self._stats["opens"] += 1
+            existing = self._entries.get(key)
+            if existing is not None and existing.identity == identity:
+                # Inny wątek otworzył ten sam plik w międzyczasie
+                os.close(fd)
+                self._entries.move_to_end(key)
+                existing.refs += 1
+                return existing
+            if existing is not None:
+                self._retire(existing)
+            entry = _PooledFd(key, fd, identity)
+            entry.refs = 1
+            self._entries[key] = entry
+            self._evict_locked()
+            return entry
+
+    def release(self, entry):
+        with self._lock:
+            entry.refs -= 1
+            if entry.evicted and entry.refs == 0:
+                os.close(entry.fd)
+
+    @contextmanager
+    def fd(self, path):
+        entry = self.acquire(path)
+        try:
+            yield entry.fd
+        finally:
+            self.release(entry)
+
+    def _retire(self, entry):
+        # Wywoływane pod blokadą: deskryptor w użyciu zamykamy dopiero po release()
+        if self._entries.get(entry.key) is entry:
+            del self._entries[entry.key]
+        entry.evicted = True
+        if entry.refs == 0:
+            os.close(entry.fd)
+
+    def _evict_locked(self):
+        if len(self._entries) <= self.max_open:
+            return
+        for entry in list(self._entries.values()):
+            if len(self._entries) <= self.max_open:
+                break
+            if entry.refs == 0:
+                self._retire(entry)
+                self._stats["evictions"] += 1
+
+    def set_max_open(self, max_open):
+        if max_open < 1:
+            raise ValueError("max_open musi być >= 1")
+        with self._lock:
+            self.max_open = max_open
+            self._evict_locked()
+
+    def invalidate(self, path):
+        with self._lock:
+            entry = self._entries.get(os.path.abspath(path))
+            if entry is not None:
+                self._retire(entry)
+
+    def close_all(self):
+        with self._lock:
+            for entry in list(self._entries.values()):
+                self._retire(entry)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["open_now"] = len(self._entries)
+            stats["max_open"] = self.max_open
+        return stats
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_pool():
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            max_open = int(os.environ.get("CFAB_MODEL_MAX_OPEN_FDS", DEFAULT_MAX_OPEN))
+            _default_pool = FdPool(max_open)
+        return _default_pool
+
+
+def configure_pool(max_open):
+    get_default_pool().set_max_open(max_open)
+
+
+def pool_stats():
+    return get_default_pool().stats()
+
+
+def pread_exact(fd, size, offset):
+    data = os.pread(fd, size, offset)
+    if len(data) == size:
+        return data
+    # pread może zwrócić mniej niż żądano - dokończ odczyt
+    parts = [data]
+    read = len(data)
+    while read < size:
+        chunk = os.pread(fd, size - read, offset + read)
+        if not chunk:
+            break
+        parts.append(chunk)
+        read += len(chunk)
+    return b"".join(parts)
+
+
+def preadv_exact(fd, buffers, offset):
+    # Jak pread_exact dla preadv: krótki odczyt (limit 0x7ffff000 B na wywołanie
+    # w Linuksie, NFS, sygnał) jest dokańczany; mniej niż całość tylko na EOF
+    views = [memoryview(buffer).cast("B") for buffer in buffers]
+    read = 0
+    while views:
+        n = os.preadv(fd, views, offset + read)
+        if not n:
+            break
+        read += n
+        while views and n >= len(views[0]):
+            n -= len(views[0])
+            views.pop(0)
+        if n:
+            views[0] = views[0][n:]
+    return read
+
+
+def read_header(fd, path):
+    # (indeks, długość nagłówka) dla wariantów z sekcjami leżącymi wprost w pliku:
+    # z indeksem, metafirst i ZIP_STORED (offsety z model_zipcache, bez nagłówka -
+    # długość None). Wariant rozpoznaje model_backends po sygnaturze; plik bez
+    # znanej sygnatury idzie do parsera układu z indeksem, który zgłosi błąd.
+    import model_backends  # model_backends importuje ten moduł
+
+    head = os.pread(fd, HEADER_PROBE_SIZE, 0)
+    file_size = os.fstat(fd).st_size
+    backend = model_backends.sniff_head(head)
+    variant = backend.name if backend is not None else "indexed"
+    if variant == "zip":
+        import model_zipcache
+
+        with model_zipcache.open_directory(path) as directory:
+            index_data = directory.section_index()
+        model_format.check_index_bounds(index_data, file_size)
+        return index_data, None
+    if variant == "metafirst":
+        if len(head) < model_format.METAFIRST_BLOCK_SIZE:
+            head += pread_exact(
+                fd, model_format.METAFIRST_BLOCK_SIZE - len(head), len(head)
+            )
+        index = model_format.parse_metafirst_block(head, file_size).index
+        return index.to_dict(), index.header_len
+    if variant != "indexed":
+        raise model_format.UnsupportedLayoutError(
+            f"Sekcji pliku '{path}' (wariant {variant}) nie można czytać wprost z pliku."
+        )
+    if len(head) < model_format.INDEX_LEN_PREFIX_SIZE:
+        raise model_format.ModelFormatError(
+            "Nie można odczytać długości nagłówka (za krótki plik)."
+        )
+    index_len = struct.unpack_from(model_format.INDEX_LEN_FORMAT, head)[0]
+    header_len = model_format.INDEX_LEN_PREFIX_SIZE + index_len
+    if len(head) < header_len:
+        head += pread_exact(fd, header_len - len(head), len(head))
+    if len(head) < header_len:
+        raise model_format.ModelFormatError(
+            f"Oczekiwano {index_len} bajtów indeksu JSON, odczytano "
+            f"{len(head) - model_format.INDEX_LEN_PREFIX_SIZE}."
+        )
+    index_data = model_format.parse_index_bytes(
+        head[model_format.INDEX_LEN_PREFIX_SIZE : header_len]
+    )
+    # Rozmiary z indeksu są niezaufane - odrzuć sekcje wychodzące poza plik
+    model_format.check_index_bounds(index_data, file_size)
+    return index_data, header_len
+
+
+class PooledSectionFile(model_format.SectionFile):
+    # Widok sekcji trzymający deskryptor z puli do chwili close()
+    def __init__(self, pool, path, offset, size):
+        self._pool = pool
+        self._entry = None
+        self._entry = pool.acquire(path)
+        super().__init__(self._entry.fd, offset, size)
+
+    def close(self):
+        entry, self._entry = self._entry, None
+        if entry is not None:
+            self._pool.release(entry)
+        super().close()
+
+
+def open_range(path, offset, size, pool=None):
+    return PooledSectionFile(pool or get_default_pool(), path, offset, size)
+
+
+class PReadModelReader:
+    def __init__(self, path, pool=None):
+        self.path = path
+        self.pool = pool or get_default_pool()
+        self._index = None
+        self._header_len = None
+        self._lock = threading.Lock()
+
+    def pread(self, size, offset):
+        with self.pool.fd(self.path) as fd:
+            return pread_exact(fd, size, offset)
+
+    def index(self):
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._load_index()
+        return self._index
+
+    def header_len(self):
+        self.index()
+        return self._header_len
+
+    def _load_index(self):
+        with self.pool.fd(self.path) as fd:
+            self._index, self._header_len = read_header(fd, self.path)
+
+    def read_section(self, name, budget=None):
+        offset, size = model_format.section_bounds(self.index(), name)
+        model_format.check_read_budget(size, f"Sekcja '{name}'", budget)
+        data = self.pread(size, offset)
+        if len(data) != size:
+            raise model_format.ModelFormatError(
+                f"Błąd odczytu sekcji '{name}': oczekiwano {size}, odczytano {len(data)}."
+            )
+        return data
+
+    def read_sections(self, names, budget=None):
+        # Sekcje leżące obok siebie (np. preview + info) czytane jednym preadv
+        index_data = self.index()
+        bounds = sorted(
+            (model_format.section_bounds(index_data, name) + (name,) for name in names)
+        )
+        model_format.check_read_budget(
+            sum(size for _, size, _ in bounds), f"Sekcje {', '.join(names)}", budget
+        )
+        result = {}
+        with self.pool.fd(self.path) as fd:
+            run = []
+            for offset, size, name in bounds + [(None, None, None)]:
+                if run and (offset is None or offset != run[-1][0] + run[-1][1]):
+                    self._preadv_run(fd, run, result)
+                    run = []
+                if offset is not None:
+                    run.append((offset, size, name))
+        return result
+
+    def _preadv_run(self, fd, run, result):
+        buffers = [bytearray(size) for _, size, _ in run]
+        total = sum(len(b) for b in buffers)
+        if hasattr(os, "preadv"):
+            read = preadv_exact(fd, buffers, run[0][0])
+        else:
+            data = pread_exact(fd, total, run[0][0])
+            read, position = len(data), 0
+            for buffer in buffers:
+                buffer[:] = data[position : position + len(buffer)]
+                position += len(buffer)
+        if read != total:
+            raise model_format.ModelFormatError(
+                f"Błąd odczytu sekcji {', '.join(n for _, _, n in run)}: "
+                f"oczekiwano {total}, odczytano {read}."
+            )
+        for (_, _, name), buffer in zip(run, buffers):
+            result[name] = bytes(buffer)
+
+    def open_section(self, name):
+        offset, size = model_format.section_bounds(self.index(), name)
+        return open_range(self.path, offset, size, self.pool)
+
+    def iter_section(self, name, chunk_size=STREAM_CHUNK_SIZE):
+        offset, size = model_format.section_bounds(self.index(), name)
+        position, end = offset, offset + size
+        while position < end:
+            chunk = self.pread(min(chunk_size, end - position), position)
+            if not chunk:
+                raise model_format.ModelFormatError(
+                    f"Nieoczekiwany koniec sekcji '{name}'."
+                )
+            yield chunk
+            position += len(chunk)
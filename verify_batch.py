@@ -0,0 +1,305 @@
+import argparse
+import getpass
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import model_profile
+import model_verify
+from model_convert import iter_model_files
+from model_stats import percentile
+from verify_cache import (
+    ACTION_QUICK,
+    ACTION_SKIP,
+    ACTION_VERIFY,
+    ON_HIT_CHOICES,
+    VerificationCache,
+)
+
+# Równoległa weryfikacja wszystkich plików .model w drzewie katalogów.
+# Wyniki są dopisywane do pliku JSONL na bieżąco (jeden wiersz na plik), więc
+# po awarii lub Ctrl-C ponowne uruchomienie pomija pliki już zweryfikowane.
+# Na końcu: pliki/s, MB/s oraz opóźnienia p50/p99 na plik.
+# Z --cache niezmienione pliki (wg stat) są pomijane lub tylko szybko sprawdzane.
+
+logger = logging.getLogger(__name__)
+
+
+def load_completed(results_path):
+    # Wczytaj ukończone ścieżki; ucięty ostatni wiersz (awaria w trakcie zapisu) jest usuwany
+    completed = set()
+    if not os.path.exists(results_path):
+        return completed
+    valid_len = 0
+    with open(results_path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                completed.add(json.loads(line)["path"])
+            except (ValueError, KeyError):
+                break
+            valid_len += len(line)
+    if valid_len != os.path.getsize(results_path):
+        logger.warning(
+            "Obcinanie niekompletnego końca pliku wyników %s do %d bajtów.",
+            results_path,
+            valid_len,
+        )
+        with open(results_path, "r+b") as f:
+            f.truncate(valid_len)
+    return completed
+
+
+def error_result(path, level, error):
+    # Wyjątek spoza verify_model (np. zabity proces roboczy, MemoryError) - plik
+    # zapisany jako nieudany zamiast przerwania całej partii
+    return {
+        "path": path,
+        "level": level,
+        "ok": False,
+        "errors": [f"Weryfikacja przerwana: {type(error).__name__}: {error}"],
+        "bytes_read": 0,
+        "section_hashes": {},
+    }
+
+
+def summarize(results, elapsed, skipped):
+    # Wyniki z error_result nie mają czasu weryfikacji
+    latencies = sorted(r["elapsed_s"] for r in results if "elapsed_s" in r)
+    total_bytes = sum(r.get("bytes_read", 0) for r in results)
+    return {
+        "verified": len(results),
+        "failed": sum(1 for r in results if not r["ok"]),
+        "resumed_skipped": skipped,
+        "elapsed_s": round(elapsed, 3),
+        "files_per_s": round(len(results) / elapsed, 1) if elapsed else 0.0,
+        "mb_per_s": round(total_bytes / elapsed / 1e6, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def verify_tree(
+    root,
+    results_path,
+    level=model_verify.LEVEL_FULL,
+    workers=None,
+    verify=None,
+    cache=None,
+):
+    verify = verify or model_verify.verify_model
+    completed = load_completed(results_path)
+    pending_paths = [p for p in iter_model_files(root) if p not in completed]
+    skipped = len(completed)
+    results = []
+    start = time.perf_counter()
+    max_in_flight = (workers or os.cpu_count() or 1) * 4
+    interrupted = False
+
+    # Pula poza blokiem with: jej __exit__ czekałby na trwające weryfikacje
+    # także po Ctrl-C
+    own_children = set(multiprocessing.active_children())
+    pool = ProcessPoolExecutor(max_workers=workers)
+    with open(results_path, "a", encoding="utf-8") as out:
+        paths = iter(pending_paths)
+        retry = []  # Pliki, których szybkie sprawdzenie nie zgodziło się z pamięcią
+        in_flight = {}
+
+        def record_result(result, key=None):
+            results.append(result)
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            if cache is not None and key is not None:
+                cache.store(result["path"], key, result)
+            if not result["ok"]:
+                logger.error(
+                    "Weryfikacja nieudana: %s: %s",
+                    result["path"],
+                    "; ".join(result["errors"]),
+                )
+
+        try:
+            while True:
+                while len(in_flight) < max_in_flight:
+                    if retry:
+                        path, key = retry.pop()
+                        job = (path, ACTION_VERIFY, None, key)
+                        in_flight[pool.submit(verify, path, level)] = job
+                        continue
+                    path = next(paths, None)
+                    if path is None:
+                        break
+                    if cache is None:
+                        job = (path, ACTION_VERIFY, None, None)
+                        in_flight[pool.submit(verify, path, level)] = job
+                        continue
+                    try:
+                        action, run_level, record, key = cache.plan(path, level)
+                    except OSError:
+                        action, run_level, key = ACTION_VERIFY, level, None
+                    if action == ACTION_SKIP:
+                        record_result(cache.cached_result(path, record))
+                        continue
+                    job = (path, action, record, key)
+                    in_flight[pool.submit(verify, path, run_level)] = job
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path, action, record, key = in_flight.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        record_result(error_result(path, level, e))
+                        continue
+                    if action == ACTION_QUICK:
+                        if cache.quick_matches(record, result):
+                            result["cached"] = True
+                            record_result(result)
+                        else:
+                            retry.append((path, key))
+                        continue
+                    record_result(result, key)
+                out.flush()
+        except KeyboardInterrupt:
+            interrupted = True
+            logger.warning("Przerwano - wyniki zapisane, kolejne uruchomienie wznowi pracę.")
+            for future in in_flight:
+                future.cancel()
+        finally:
+            pool.shutdown(wait=not interrupted, cancel_futures=interrupted)
+            if interrupted:
+                # Trwające weryfikacje przerywamy - inaczej wyjście z interpretera
+                # i tak czekałoby na procesy robocze
+                for process in set(multiprocessing.active_children()) - own_children:
+                    process.terminate()
+            if cache is not None:
+                cache.commit()
+
+    summary = summarize(results, time.perf_counter() - start, skipped)
+    summary["interrupted"] = interrupted
+    if cache is not None:
+        summary["cache"] = cache.report()
+    return summary
+
+
+def start_password_agent(password):
+    # Agent kluczy w wątku tego procesu: procesy robocze pytają go przez gniazdo,
+    # więc scrypt liczy się raz na grupę soli dla całej partii, a nie w każdym
+    # procesie. Hasło nie trafia do środowiska ani do procesów roboczych.
+    import model_keys
+
+    socket_dir = tempfile.mkdtemp(prefix="model-keys-")
+    keyring = model_keys.KeyRing(
+        model_keys.KeyCache(None),
+        keyfile=os.environ.get("CFAB_MODEL_KEYFILE"),
+        agent_socket=os.environ.get("CFAB_MODEL_KEY_AGENT"),
+        password=password,
+    )
+    agent = model_keys.KeyAgent(os.path.join(socket_dir, "agent.sock"), keyring)
+    agent.start_in_thread()
+    os.environ["CFAB_MODEL_KEY_AGENT"] = agent.socket_path
+    return agent
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Równoległa weryfikacja plików .model z wynikami w JSONL."
+    )
+    parser.add_argument("root", help="Katalog z plikami .model")
+    parser.add_argument(
+        "--results", default="verify_results.jsonl", help="Plik wyników JSONL"
+    )
+    parser.add_argument("--level", choices=model_verify.LEVELS, default=model_verify.LEVEL_FULL)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--restart", action="store_true", help="Zignoruj istniejące wyniki i zacznij od nowa"
+    )
+    parser.add_argument("--cache", help="Baza SQLite z wynikami poprzednich weryfikacji")
+    parser.add_argument(
+        "--on-hit",
+        choices=ON_HIT_CHOICES,
+        default="quick",
+        help="Co zrobić z niezmienionym plikiem: pominąć lub sprawdzić szybko",
+    )
+    parser.add_argument(
+        "--full-reverify-days",
+        type=float,
+        default=30.0,
+        help="Po ilu dniach wymusić pełną weryfikację mimo trafienia (0 = nigdy)",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="all",
+        choices=model_profile.MODES,
+        help="Profil cProfile/tracemalloc każdej weryfikacji (pliki profile_verify_*)",
+    )
+    parser.add_argument(
+        "--keyfile", help="Plik kluczy dla szyfrowanych plików .model (model_keys)"
+    )
+    parser.add_argument("--key-agent", help="Gniazdo agenta kluczy (model_keys agent)")
+    parser.add_argument(
+        "--ask-password",
+        action="store_true",
+        help="Zapytaj raz o hasło szyfrowanych plików (scrypt raz na grupę soli)",
+    )
+    parser.add_argument(
+        "--zip-cache",
+        help="Baza SQLite z katalogami centralnymi plików ZIP (model_zipcache)",
+    )
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        level=args.log_level.upper(),
+        format="%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s",
+    )
+    if args.profile:
+        # Przez środowisko, żeby tryb dotarł też do procesów roboczych
+        os.environ["CFAB_MODEL_PROFILE"] = args.profile
+        model_profile.configure_from_env()
+    if args.restart and os.path.exists(args.results):
+        os.remove(args.results)
+
+    # Klucze trafiają do procesów roboczych przez środowisko (model_keys.default_keyring)
+    if args.keyfile:
+        os.environ["CFAB_MODEL_KEYFILE"] = os.path.abspath(args.keyfile)
+    if args.key_agent:
+        os.environ["CFAB_MODEL_KEY_AGENT"] = os.path.abspath(args.key_agent)
+    if args.zip_cache:
+        os.environ["CFAB_MODEL_ZIP_CACHE"] = os.path.abspath(args.zip_cache)
+    agent = None
+    if args.ask_password:
+        agent = start_password_agent(getpass.getpass("Hasło szyfrowanych plików: "))
+
+    cache = None
+    if args.cache:
+        max_age_s = args.full_reverify_days * 86400 if args.full_reverify_days > 0 else None
+        cache = VerificationCache(args.cache, max_age_s, args.on_hit)
+    try:
+        summary = verify_tree(
+            args.root, args.results, args.level, args.workers, cache=cache
+        )
+    finally:
+        if cache is not None:
+            cache.close()
+        if agent is not None:
+            summary_keys = agent.keyring.stats()
+            agent.shutdown()
+            agent.server_close()
+            os.rmdir(os.path.dirname(agent.socket_path))
+    if agent is not None:
+        summary["keys"] = summary_keys
+    print(json.dumps(summary, indent=4))
+    if summary["interrupted"]:
+        return 130
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
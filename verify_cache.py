@@ -0,0 +1,161 @@
+import json
+import os
+import sqlite3
+import time
+
+import model_verify
+
+# Trwała pamięć wyników weryfikacji plików .model (SQLite).
+# Rekord jest ważny dla (st_dev, st_ino, st_size, st_mtime_ns) pliku; zapisujemy
+# też hashe sekcji i poziom weryfikacji, który dał wynik. Przy kolejnym przebiegu
+# niezmieniony plik jest pomijany ("skip") albo sprawdzany tylko szybko ("quick"
+# - info.json porównywane z zapisanym hashem); po `max_age_s` wymuszana jest
+# ponowna pełna weryfikacja.
+
+ACTION_SKIP = "skip"
+ACTION_QUICK = "quick"
+ACTION_VERIFY = "verify"
+ON_HIT_CHOICES = (ACTION_SKIP, ACTION_QUICK)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS verify_cache (
+    path TEXT PRIMARY KEY,
+    dev INTEGER NOT NULL,
+    ino INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    level TEXT NOT NULL,
+    ok INTEGER NOT NULL,
+    section_hashes TEXT NOT NULL,
+    bytes_read INTEGER NOT NULL,
+    verified_at REAL NOT NULL
+)
+"""
+
+
+def stat_key(path):
+    st = os.stat(path)
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+class CacheRecord:
+    __slots__ = ("stat_key", "level", "ok", "section_hashes", "bytes_read", "verified_at")
+
+    def __init__(self, stat_key, level, ok, section_hashes, bytes_read, verified_at):
+        self.stat_key = stat_key
+        self.level = level
+        self.ok = ok
+        self.section_hashes = section_hashes
+        self.bytes_read = bytes_read
+        self.verified_at = verified_at
+
+
+class VerificationCache:
+    def __init__(self, db_path, max_age_s=None, on_hit=ACTION_QUICK):
+        if on_hit not in ON_HIT_CHOICES:
+            raise ValueError(f"Nieznana akcja dla trafienia: {on_hit}")
+        self.db_path = db_path
+        self.max_age_s = max_age_s
+        self.on_hit = on_hit
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+        self._pending = 0
+        self.stats = {
+            "lookups": 0,
+            "hits": 0,
+            "skipped": 0,
+            "quick_rechecks": 0,
+            "quick_mismatches": 0,
+            "expired": 0,
+            "bytes_saved": 0,
+        }
+
+    def get(self, path):
+        row = self._conn.execute(
+            "SELECT dev, ino, size, mtime_ns, level, ok, section_hashes, bytes_read, "
+            "verified_at FROM verify_cache WHERE path = ?",
+            (path,),
+        ).fetchone()
+        if row is None:
+            return None
+        return CacheRecord(
+            tuple(row[:4]), row[4], bool(row[5]), json.loads(row[6]), row[7], row[8]
+        )
+
+    def plan(self, path, level, now=None):
+        # Zwraca (akcja, poziom do uruchomienia, rekord, klucz stat)
+        self.stats["lookups"] += 1
+        key = stat_key(path)
+        record = self.get(path)
+        if record is None or record.stat_key != key or not record.ok:
+            return ACTION_VERIFY, level, record, key
+        if not model_verify.level_covers(record.level, level):
+            return ACTION_VERIFY, level, record, key
+        now = time.time() if now is None else now
+        if self.max_age_s is not None and now - record.verified_at > self.max_age_s:
+            self.stats["expired"] += 1
+            return ACTION_VERIFY, level, record, key
+        self.stats["hits"] += 1
+        if self.on_hit == ACTION_SKIP:
+            self.stats["skipped"] += 1
+            self.stats["bytes_saved"] += record.bytes_read
+            return ACTION_SKIP, None, record, key
+        self.stats["quick_rechecks"] += 1
+        return ACTION_QUICK, model_verify.LEVEL_QUICK, record, key
+
+    def quick_matches(self, record, quick_result):
+        matches = quick_result["ok"] and quick_result["section_hashes"].get(
+            "info"
+        ) == record.section_hashes.get("info")
+        if matches:
+            self.stats["bytes_saved"] += max(
+                0, record.bytes_read - quick_result["bytes_read"]
+            )
+        else:
+            self.stats["quick_mismatches"] += 1
+        return matches
+
+    def store(self, path, key, result):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO verify_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                path,
+                *key,
+                result["level"],
+                int(result["ok"]),
+                json.dumps(result.get("section_hashes", {})),
+                result.get("bytes_read", 0),
+                time.time(),
+            ),
+        )
+        self._pending += 1
+        if self._pending >= 1000:
+            self.commit()
+
+    def cached_result(self, path, record):
+        return {
+            "path": path,
+            "level": record.level,
+            "ok": record.ok,
+            "errors": [],
+            "bytes_read": 0,
+            "section_hashes": record.section_hashes,
+            "elapsed_s": 0.0,
+            "cached": True,
+        }
+
+    def report(self):
+        report = dict(self.stats)
+        lookups = report["lookups"]
+        report["hit_ratio"] = round(report["hits"] / lookups, 4) if lookups else 0.0
+        return report
+
+    def commit(self):
+        self._conn.commit()
+        self._pending = 0
+
+    def close(self):
+        self.commit()
+        self._conn.close()